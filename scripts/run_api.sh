@@ -11,6 +11,15 @@ source .venv/bin/activate
 export CROP=carrots
 export TARGET=antioxidants
 
+# Other crop/target models are served lazily from /predict/{crop}/{target};
+# bound memory use and drop idle models with:
+#   export MODEL_CACHE_MB=512
+#   export MODEL_IDLE_SECONDS=900
+# Prediction runs off the event loop; tune the pool and load shedding with:
+#   export PREDICT_EXECUTOR=thread   # or: process
+#   export PREDICT_WORKERS=4
+#   export PREDICT_MAX_QUEUE=256     # 503 + Retry-After beyond this
+
 echo "📊 Configuration:"
 echo "   Crop: $CROP"
 echo "   Target: $TARGET"
@@ -22,14 +22,14 @@ fi
 
 # Step 3: Clean and prepare data
 echo "🧹 Step 3/4: Cleaning and preparing data..."
-python -m src.data.clean_bi --crop carrots --target antioxidants
+python -m src.data.clean_bi --all
 
-# Step 4: Train PLS model
-echo "🤖 Step 4/4: Training PLS model..."
-python -m src.models.train_pls --crop carrots --target antioxidants
+# Step 4: Train PLS models for every crop and target
+echo "🤖 Step 4/4: Training PLS models..."
+python -m src.models.train_all --search path
 
 echo ""
-echo "🎉 Training complete! Model saved to models/"
+echo "🎉 Training complete! Models saved to models/"
 echo "   Next: make api"
 
 
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Micro-batching of concurrent single-spectrum predictions.
+
+Concurrent ``/predict`` calls for the same model are gathered into
+micro-batches, bounded by a maximum batch size and a maximum wait time,
+and scored with one vectorized ``predict`` call. Results are handed back
+to the waiting requests. If a batch fails, its spectra are scored one by
+one, so only the requests that fail on their own get the error.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.models.registry import DomainFlags, LoadedModel, ModelKey, domain_row, prediction_row
+
+
+Scorer = Callable[[LoadedModel, np.ndarray],
+                  Awaitable[Tuple[np.ndarray, np.ndarray, np.ndarray, Optional[DomainFlags]]]]
+
+
+class BatchStats:
+    """Counters for micro-batch sizes and queue delays."""
+
+    size_buckets = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+    delay_buckets_ms = (0.5, 1.0, 2.0, 5.0, 10.0, 25.0, 50.0, 100.0)
+
+    def __init__(self):
+        self.batches = 0
+        self.requests = 0
+        self.largest_batch = 0
+        self.delay_sum_ms = 0.0
+        self.max_delay_ms = 0.0
+        self.size_counts = [0] * (len(self.size_buckets) + 1)
+        self.delay_counts = [0] * (len(self.delay_buckets_ms) + 1)
+
+    @staticmethod
+    def _bucket(bounds, value) -> int:
+        for i, bound in enumerate(bounds):
+            if value <= bound:
+                return i
+        return len(bounds)
+
+    def record(self, batch_size: int, delays_ms: List[float]) -> None:
+        self.batches += 1
+        self.requests += batch_size
+        self.largest_batch = max(self.largest_batch, batch_size)
+        self.size_counts[self._bucket(self.size_buckets, batch_size)] += 1
+        for delay in delays_ms:
+            self.delay_sum_ms += delay
+            self.max_delay_ms = max(self.max_delay_ms, delay)
+            self.delay_counts[self._bucket(self.delay_buckets_ms, delay)] += 1
+
+    def as_dict(self) -> Dict[str, object]:
+        def labels(bounds):
+            return [f"<={b}" for b in bounds] + [f">{bounds[-1]}"]
+
+        return {
+            'batches': self.batches,
+            'requests': self.requests,
+            'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+            'largest_batch': self.largest_batch,
+            'mean_queue_delay_ms': self.delay_sum_ms / self.requests if self.requests else 0.0,
+            'max_queue_delay_ms': self.max_delay_ms,
+            'batch_size_histogram': dict(zip(labels(self.size_buckets), self.size_counts)),
+            'queue_delay_ms_histogram': dict(zip(labels(self.delay_buckets_ms), self.delay_counts))
+        }
+
+
+class MicroBatcher:
+    """
+    Coalesce single-spectrum predictions into vectorized micro-batches.
+
+    A batch for a model is flushed as soon as it holds ``max_batch_size``
+    spectra, or ``max_wait_ms`` after its first spectrum arrived.
+
+    Args:
+        max_batch_size: Largest number of spectra scored in one call
+        max_wait_ms: Longest time a spectrum waits for others to join
+        scorer: Coroutine function scoring a matrix for a model, e.g. in an
+            executor (defaults to calling ``predict_matrix`` on the loop)
+    """
+
+    def __init__(self, max_batch_size: int = 32, max_wait_ms: float = 2.0,
+                 scorer: Optional[Scorer] = None):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max_wait_ms
+        self.scorer = scorer
+        self.stats = BatchStats()
+        self._pending: Dict[ModelKey, List[Tuple[np.ndarray, asyncio.Future, float]]] = {}
+        self._models: Dict[ModelKey, LoadedModel] = {}
+        self._timers: Dict[ModelKey, asyncio.TimerHandle] = {}
+
+    async def submit(
+        self,
+        loaded: LoadedModel,
+        spectrum: np.ndarray
+    ) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """
+        Queue a validated spectrum and wait for its batch to be scored.
+
+        Args:
+            loaded: Model to predict with
+            spectrum: NIR spectrum, already validated against the model
+
+        Returns:
+            Tuple of (prediction and confidence interval, per target for
+            multi-target models, as from prediction_row; T²/Q domain
+            statistics or None)
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = loaded.key
+
+        # A reloaded model starts a new batch
+        if key in self._models and self._models[key] is not loaded:
+            self._flush(key)
+
+        pending = self._pending.setdefault(key, [])
+        self._models[key] = loaded
+        pending.append((spectrum, future, time.perf_counter()))
+
+        if len(pending) >= self.max_batch_size:
+            self._flush(key)
+        elif len(pending) == 1:
+            self._timers[key] = loop.call_later(self.max_wait_ms / 1000.0, self._flush, key)
+
+        return await future
+
+    def _flush(self, key: ModelKey) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+        batch = self._pending.pop(key, [])
+        loaded = self._models.pop(key, None)
+        if not batch:
+            return
+
+        now = time.perf_counter()
+        self.stats.record(len(batch), [(now - queued) * 1000.0 for _, _, queued in batch])
+
+        asyncio.ensure_future(self._score(loaded, batch))
+
+    async def _score(self, loaded: LoadedModel,
+                     batch: List[Tuple[np.ndarray, asyncio.Future, float]]) -> None:
+        try:
+            X = np.vstack([s for s, _, _ in batch])
+            if self.scorer is not None:
+                predictions, lower, upper, domain = await self.scorer(loaded, X)
+            else:
+                predictions, lower, upper, domain = loaded.predict_matrix(X)
+        except Exception as e:
+            if len(batch) > 1:
+                # One bad spectrum (e.g. of another length, for a model without
+                # a wavelength list) must not fail the others: retry one by one
+                await asyncio.gather(*(self._score(loaded, [item]) for item in batch))
+                return
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        targets = loaded.targets
+        for i, (_, future, _) in enumerate(batch):
+            if not future.done():
+                future.set_result((prediction_row(targets, predictions, lower, upper, i),
+                                   domain_row(domain, i)))
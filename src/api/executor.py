@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Run CPU-bound prediction work off the asyncio event loop.
+
+Model loading and NumPy/sklearn scoring run in a thread or process pool,
+so a slow request cannot stall ``/health`` or other in-flight requests.
+The number of requests in flight is bounded; beyond that the service
+sheds load instead of queueing without limit.
+
+In process mode each worker keeps its own model registry. Workers are
+started with the parent registry's memory budget and idle timeout, so
+``MODEL_CACHE_MB`` and ``MODEL_IDLE_SECONDS`` bound every process; a
+worker evicts idle and over-budget models whenever it looks one up.
+"""
+
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from src.models.registry import DomainFlags, default_registry
+
+
+class QueueFullError(Exception):
+    """Raised when too many requests are already in flight."""
+
+
+def init_worker(max_bytes: Optional[int], idle_seconds: Optional[float]) -> None:
+    """Process pool initializer: apply the parent's cache limits to the worker's registry."""
+    default_registry.max_bytes = max_bytes
+    default_registry.idle_seconds = idle_seconds
+
+
+def prepare_spectrum(
+    model_path: str,
+    wavelengths_path: Optional[str],
+    spectrum: Any,
+    wavelengths: Any = None
+) -> np.ndarray:
+    """Validate (and resample) one spectrum with the worker's model registry."""
+    return default_registry.load(model_path, wavelengths_path).prepare(spectrum, wavelengths)
+
+
+def score_matrix(
+    model_path: str,
+    wavelengths_path: Optional[str],
+    X: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Optional[DomainFlags]]:
+    """
+    Score validated spectra with the worker's model registry.
+
+    This is a module-level function so it can be sent to a process pool;
+    each worker process keeps its own registry of loaded models.
+    """
+    return default_registry.load(model_path, wavelengths_path).predict_matrix(X)
+
+
+def score_batch(
+    model_path: str,
+    wavelengths_path: Optional[str],
+    spectra: Any,
+    wavelengths: Any = None
+) -> Tuple[dict, Dict[str, float]]:
+    """Run a batch prediction with the worker's model registry; also returns its stage timings."""
+    timings: Dict[str, float] = {}
+    loaded = default_registry.load(model_path, wavelengths_path)
+    return loaded.predict_batch(spectra, wavelengths, timings), timings
+
+
+class PredictionExecutor:
+    """
+    Bounded thread or process pool for prediction work.
+
+    Args:
+        kind: ``"thread"`` or ``"process"``
+        workers: Number of worker threads/processes
+        max_queue: Largest number of requests admitted at once
+        retry_after: Seconds clients are asked to wait when the queue is full
+    """
+
+    def __init__(self, kind: str = "thread", workers: Optional[int] = None,
+                 max_queue: int = 256, retry_after: int = 1):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+
+        self.kind = kind
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.rejected = 0
+        self.registry_limits: Tuple[Optional[int], Optional[float]] = (None, None)
+        self._pool: Optional[Executor] = None
+
+    @property
+    def pool(self) -> Executor:
+        if self._pool is None:
+            if self.kind == "process":
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                                 initargs=self.registry_limits)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers,
+                                                thread_name_prefix="predict")
+        return self._pool
+
+    @contextmanager
+    def admit(self):
+        """
+        Reserve a slot for one request.
+
+        Raises:
+            QueueFullError: If ``max_queue`` requests are already in flight
+        """
+        if self.in_flight >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(f"Prediction queue is full ({self.max_queue} requests in flight)")
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run a function in the prediction pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, fn, *args)
+
+    async def run_local(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run blocking work that must stay in this process, such as model
+        lookups, without blocking the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        pool = self.pool if self.kind == "thread" else None
+        return await loop.run_in_executor(pool, fn, *args)
+
+    def limit_worker_registries(self, max_bytes: Optional[int],
+                                idle_seconds: Optional[float]) -> None:
+        """
+        Memory budget and idle timeout of the worker processes' registries.
+
+        Applies to processes started afterwards, so call it before the
+        first prediction.
+        """
+        self.registry_limits = (max_bytes, idle_seconds)
+
+    async def prepare(self, loaded, spectrum: Any, wavelengths: Any = None) -> np.ndarray:
+        """Validate (and resample) one spectrum for a loaded model, off the event loop."""
+        if self.kind == "thread":
+            return await self.run(loaded.prepare, spectrum, wavelengths)
+
+        wavelengths_path = str(loaded.wavelengths_path) if loaded.wavelengths_path else None
+        return await self.run(prepare_spectrum, str(loaded.model_path), wavelengths_path,
+                              spectrum, wavelengths)
+
+    async def score(self, loaded, X: np.ndarray
+                    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Optional[DomainFlags]]:
+        """Score a validated matrix of spectra for a loaded model."""
+        if self.kind == "thread":
+            return await self.run(loaded.predict_matrix, X)
+
+        wavelengths_path = str(loaded.wavelengths_path) if loaded.wavelengths_path else None
+        return await self.run(score_matrix, str(loaded.model_path), wavelengths_path, X)
+
+    async def predict_batch(self, loaded, spectra: Any, wavelengths: Any = None,
+                            timings: Optional[Dict[str, float]] = None) -> dict:
+        """
+        Run a batch prediction (validation, resampling and scoring) for a
+        loaded model, filling ``timings`` as LoadedModel.predict_batch does.
+        """
+        if self.kind == "thread":
+            return await self.run(loaded.predict_batch, spectra, wavelengths, timings)
+
+        wavelengths_path = str(loaded.wavelengths_path) if loaded.wavelengths_path else None
+        result, worker_timings = await self.run(score_batch, str(loaded.model_path),
+                                                wavelengths_path, spectra, wavelengths)
+        if timings is not None:
+            timings.update(worker_timings)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            'kind': self.kind,
+            'workers': self.workers,
+            'max_queue': self.max_queue,
+            'in_flight': self.in_flight,
+            'rejected': self.rejected
+        }
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -3,32 +3,123 @@
 FastAPI service for nutrient prediction from NIR spectra.
 
 This service provides endpoints for health checks and making predictions
-using trained PLS models.
+using trained PLS models. Every ``{crop}__{target}__*.joblib`` under
+``models/`` can be served from one process via ``/predict/{crop}/{target}``;
+models are loaded lazily and evicted by an LRU memory budget
+(``MODEL_CACHE_MB``) and an idle timeout (``MODEL_IDLE_SECONDS``). The
+default ``CROP``/``TARGET`` model behind ``/predict`` is optional; without
+it those endpoints answer 404.
+
+Concurrent single-spectrum predictions are coalesced into micro-batches
+of at most ``PREDICT_MAX_BATCH`` spectra, waiting at most
+``PREDICT_MAX_WAIT_MS`` for a batch to fill (see src.api.batching).
+
+Model loading, validation, resampling and scoring run in a
+``PREDICT_EXECUTOR`` (``thread`` or ``process``) pool of
+``PREDICT_WORKERS`` workers, off the event loop. Process workers apply the
+same model cache limits as the parent (see src.api.executor). At
+most ``PREDICT_MAX_QUEUE`` prediction requests are admitted at once; beyond
+that the API answers 503 with a ``Retry-After`` header.
+
+Prediction endpoints accept JSON as well as raw float32/float64,
+``.npy`` and Arrow IPC bodies (see src.api.wire). Spectra from devices
+with a different wavelength grid can carry their own wavelengths (JSON
+``wavelengths`` field or ``X-Spectrum-Wavelengths`` header) and are
+resampled onto the model's grid (see src.models.resample).
+
+A crop's multi-target (PLS2) model is served at ``/predict/{crop}/multi``
+and returns every nutrient it was trained for, from one matrix product,
+under ``targets``.
+
+``/metrics`` exposes request and error counts and per-stage latency
+histograms labeled by crop, target and model version, together with the
+micro-batching, executor and model cache statistics, in the Prometheus
+text format (see src.api.metrics).
 """
 
+import asyncio
 import json
 import os
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 
-import uvicorn
-from fastapi import FastAPI, HTTPException
+import numpy as np
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from pydantic import BaseModel, Field
 
-# Import our inference module
-from src.models.infer import predict_from_spectrum
+# Import our model registry, request coalescer, wire formats and metrics
+from src.api import wire
+from src.api.batching import MicroBatcher
+from src.api.executor import PredictionExecutor, QueueFullError
+from src.api.metrics import UNKNOWN_MODEL, APIMetrics, batching_families
+from src.models.registry import InvalidModelNameError, LoadedModel, default_registry as registry
 
 
 # Pydantic models for API
 class PredictionRequest(BaseModel):
     """Request model for prediction endpoint."""
     spectrum: List[float] = Field(..., description="NIR spectrum as list of float values")
+    wavelengths: Optional[List[float]] = Field(
+        None, description="Wavelengths the spectrum was measured at, if they differ from the model's"
+    )
+
+
+class TargetPrediction(BaseModel):
+    """Prediction of one nutrient by a multi-target model."""
+    prediction: float = Field(..., description="Predicted nutrient value")
+    confidence_interval: Dict[str, float] = Field(
+        ..., description="Prediction interval at the model's calibrated level (metadata.interval_level)"
+    )
 
 
 class PredictionResponse(BaseModel):
     """Response model for prediction endpoint."""
-    prediction: float = Field(..., description="Predicted nutrient value")
-    confidence_interval: Dict[str, float] = Field(..., description="80% confidence interval")
+    prediction: Optional[float] = Field(
+        None, description="Predicted nutrient value (None for multi-target models)"
+    )
+    confidence_interval: Optional[Dict[str, float]] = Field(
+        None, description="Prediction interval at the model's calibrated level "
+                          "(metadata.interval_level; None for multi-target models)"
+    )
+    targets: Optional[Dict[str, TargetPrediction]] = Field(
+        None, description="Prediction and interval of every nutrient of a multi-target model"
+    )
+    domain: Optional[Dict[str, Any]] = Field(
+        None, description="Hotelling T² and Q residual of the spectrum and whether they exceed the model's limits"
+    )
+    metadata: Dict[str, Any] = Field(..., description="Additional metadata")
+
+
+class BatchPredictionRequest(BaseModel):
+    """Request model for batch prediction endpoint."""
+    spectra: List[List[float]] = Field(..., description="NIR spectra, one list of float values per scan")
+    wavelengths: Optional[List[float]] = Field(
+        None, description="Wavelengths all spectra were measured at, if they differ from the model's"
+    )
+
+
+class BatchPredictionItem(BaseModel):
+    """Prediction result for one row of a batch."""
+    index: int = Field(..., description="Row index in the request")
+    prediction: Optional[float] = Field(None, description="Predicted nutrient value")
+    confidence_interval: Optional[Dict[str, float]] = Field(
+        None, description="Prediction interval at the model's calibrated level (metadata.interval_level)"
+    )
+    targets: Optional[Dict[str, TargetPrediction]] = Field(
+        None, description="Prediction and interval of every nutrient of a multi-target model"
+    )
+    domain: Optional[Dict[str, Any]] = Field(
+        None, description="Hotelling T² and Q residual of the spectrum and whether they exceed the model's limits"
+    )
+    error: Optional[str] = Field(None, description="Why this row could not be predicted")
+
+
+class BatchPredictionResponse(BaseModel):
+    """Response model for batch prediction endpoint."""
+    predictions: List[BatchPredictionItem] = Field(..., description="Per-row predictions")
     metadata: Dict[str, Any] = Field(..., description="Additional metadata")
 
 
@@ -49,114 +140,463 @@ model_path = None
 wavelengths_path = None
 crop = None
 target = None
+eviction_task = None
+executor = PredictionExecutor(
+    kind=os.getenv("PREDICT_EXECUTOR", "thread"),
+    workers=int(os.getenv("PREDICT_WORKERS", "0")) or None,
+    max_queue=int(os.getenv("PREDICT_MAX_QUEUE", "256")),
+    retry_after=int(os.getenv("PREDICT_RETRY_AFTER", "1"))
+)
+metrics = APIMetrics()
+
+
+async def timed_score(loaded: LoadedModel, X: np.ndarray):
+    """Score a micro-batch in the executor, recording the predict stage for every spectrum in it."""
+    start = time.perf_counter()
+    result = await executor.score(loaded, X)
+    metrics.observe_stage('predict', loaded.key, time.perf_counter() - start, count=len(X))
+    return result
+
+
+batcher = MicroBatcher(
+    max_batch_size=int(os.getenv("PREDICT_MAX_BATCH", "32")),
+    max_wait_ms=float(os.getenv("PREDICT_MAX_WAIT_MS", "2")),
+    scorer=timed_score
+)
+
+
+@app.exception_handler(QueueFullError)
+async def queue_full_handler(request: Request, exc: QueueFullError):
+    """Shed load with 503 and Retry-After when the prediction queue is full."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(executor.retry_after)}
+    )
+
+
+async def evict_idle_models(interval: float):
+    """Periodically drop idle models from the registry."""
+    while True:
+        await asyncio.sleep(interval)
+        for key in registry.evict_idle():
+            print(f"🧹 Evicted idle model: {'__'.join(key)}")
 
 
 @app.on_event("startup")
 async def startup_event():
     """Load model and configuration on startup."""
-    global model_path, wavelengths_path, crop, target
+    global model_path, wavelengths_path, crop, target, eviction_task
     
     # Get configuration from environment variables
     crop = os.getenv("CROP", "carrots")
     target = os.getenv("TARGET", "antioxidants")
+    cache_mb = os.getenv("MODEL_CACHE_MB")
+    idle_seconds = os.getenv("MODEL_IDLE_SECONDS")
+    
+    registry.max_bytes = int(float(cache_mb) * 1024 * 1024) if cache_mb else None
+    registry.idle_seconds = float(idle_seconds) if idle_seconds else None
+    executor.limit_worker_registries(registry.max_bytes, registry.idle_seconds)
     
     print(f"🚀 Starting NutrientScanner API")
     print(f"   Crop: {crop}")
     print(f"   Target: {target}")
+    print(f"   Model cache: {cache_mb or 'unlimited'} MB, "
+          f"idle timeout: {idle_seconds or 'none'} s")
+    print(f"   Micro-batching: up to {batcher.max_batch_size} spectra, "
+          f"{batcher.max_wait_ms} ms max wait")
+    print(f"   Executor: {executor.workers} {executor.kind} worker(s), "
+          f"max {executor.max_queue} requests in flight")
     
-    # Find model file
+    # Find model file; the default model is optional, as every model under
+    # models/ is also served by /predict/{crop}/{target}
     models_dir = Path("models")
     model_pattern = f"{crop}__{target}__*.joblib"
-    model_files = list(models_dir.glob(model_pattern))
-    
-    if not model_files:
-        print(f"❌ No model found matching pattern: {model_pattern}")
-        print(f"   Available models in {models_dir}:")
-        for model_file in models_dir.glob("*.joblib"):
-            print(f"   - {model_file.name}")
-        print("\n   Run: make train")
-        raise RuntimeError("No trained model found")
-    
-    # Use the most recent model
-    model_path = max(model_files, key=lambda x: x.stat().st_mtime)
-    print(f"✅ Loaded model: {model_path}")
-    
-    # Find wavelengths file
-    wavelengths_pattern = f"{crop}__wavelengths.json"
-    wavelengths_files = list(models_dir.glob(wavelengths_pattern))
-    
-    if not wavelengths_files:
-        # Try in data/clean directory
-        clean_dir = Path("data/clean")
-        wavelengths_files = list(clean_dir.glob(wavelengths_pattern))
-    
-    if wavelengths_files:
-        wavelengths_path = str(wavelengths_files[0])
-        print(f"✅ Loaded wavelengths: {wavelengths_path}")
+    model_files = [p for p in models_dir.glob(model_pattern) if not p.name.startswith('.')]
+    
+    if model_files:
+        # Use the most recent model and load it into the registry once
+        model_path = max(model_files, key=lambda x: x.stat().st_mtime)
+        
+        # Find wavelengths file
+        wavelengths_pattern = f"{crop}__wavelengths.json"
+        wavelengths_files = list(models_dir.glob(wavelengths_pattern))
+        
+        if not wavelengths_files:
+            # Try in data/clean directory
+            clean_dir = Path("data/clean")
+            wavelengths_files = list(clean_dir.glob(wavelengths_pattern))
+        
+        if wavelengths_files:
+            wavelengths_path = str(wavelengths_files[0])
+            print(f"✅ Loaded wavelengths: {wavelengths_path}")
+        else:
+            print(f"⚠️  No wavelengths file found for {crop}")
+            wavelengths_path = None
+        
+        registry.load(model_path, wavelengths_path)
+        print(f"✅ Loaded model: {model_path}")
     else:
-        print(f"⚠️  No wavelengths file found for {crop}")
-        wavelengths_path = None
+        model_path = wavelengths_path = None
+        print(f"⚠️  No default model found matching pattern: {model_pattern}")
+        print("   /predict and /predict/batch will answer 404; run: make train")
+    
+    available = registry.available()
+    print(f"📦 {len(available)} model(s) available under /predict/{{crop}}/{{target}}")
+    
+    if registry.idle_seconds:
+        eviction_task = asyncio.create_task(
+            evict_idle_models(min(registry.idle_seconds, 60.0))
+        )
     
     print("🎉 API ready to serve predictions!")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background tasks on shutdown."""
+    if eviction_task is not None:
+        eviction_task.cancel()
+    executor.shutdown()
+
+
+async def read_spectra(request: Request, loaded: LoadedModel, schema: type, field: str):
+    """
+    Read spectra and their optional wavelength axis from a request body.
+    
+    JSON bodies are validated with the given Pydantic schema; binary bodies
+    (see src.api.wire) are decoded into a 2D NumPy array without copying,
+    with wavelengths taken from the ``X-Spectrum-Wavelengths`` header.
+    
+    Returns:
+        Tuple of (spectra, wavelengths or None)
+    """
+    body = await request.body()
+    kind = wire.media_type(request.headers.get("content-type"))
+    
+    if kind == wire.JSON:
+        try:
+            parsed = schema(**json.loads(body))
+        except (ValueError, TypeError) as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        return getattr(parsed, field), parsed.wavelengths
+    
+    wavelengths = wire.decode_wavelengths(request.headers.get("x-spectrum-wavelengths"))
+    n_wavelengths = len(wavelengths) if wavelengths is not None else loaded.n_wavelengths
+    spectra = wire.decode_spectra(body, kind, n_wavelengths,
+                                  request.headers.get("x-spectrum-dtype"))
+    return spectra, wavelengths
+
+
+async def read_spectrum(request: Request, loaded: LoadedModel):
+    """Read a single spectrum and its optional wavelengths from a request body."""
+    spectra, wavelengths = await read_spectra(request, loaded, PredictionRequest, "spectrum")
+    if isinstance(spectra, np.ndarray):
+        if spectra.shape[0] != 1:
+            raise ValueError(f"Expected a single spectrum, got {spectra.shape[0]}; "
+                             "use the /batch endpoint for several spectra")
+        return spectra[0], wavelengths
+    return spectra, wavelengths
+
+
+async def predict_single(loaded: LoadedModel, spectrum, wavelengths=None) -> PredictionResponse:
+    """Validate (and resample) one spectrum in the executor and score it as part of a micro-batch."""
+    with metrics.stage('validate', loaded.key):
+        spectrum = np.asarray(spectrum, dtype=loaded.dtype)
+        aligned = await executor.prepare(loaded, spectrum, wavelengths)
+    
+    row, domain = await batcher.submit(loaded, aligned)
+    
+    return PredictionResponse(
+        **row,
+        domain=domain,
+        metadata=loaded.metadata(len(spectrum))
+    )
+
+
+class RequestRecord:
+    """
+    Model labels and spectrum count of a request, filled in as it is served.
+    
+    Labels start as UNKNOWN_MODEL and become the resolved model's key once
+    it is found, so crop/target names from the URL that match no model
+    never create metric series.
+    """
+    
+    def __init__(self):
+        self.labels: Tuple[str, str, str] = UNKNOWN_MODEL
+        self.n_spectra = 0
+
+
+@contextmanager
+def track_request(endpoint: str):
+    """Count a prediction request and its latency under its final HTTP status."""
+    start = time.perf_counter()
+    record = RequestRecord()
+    status = 200
+    try:
+        yield record
+    except HTTPException as e:
+        status = e.status_code
+        raise
+    except QueueFullError:
+        status = 503
+        raise
+    except Exception:
+        status = 500
+        raise
+    finally:
+        metrics.observe_request(endpoint, record.labels, status,
+                                time.perf_counter() - start, record.n_spectra)
+
+
+async def load_model(record: RequestRecord, get_model, *args) -> LoadedModel:
+    """Look up (and load if needed) a model, timing the model stage."""
+    start = time.perf_counter()
+    try:
+        loaded = await executor.run_local(get_model, *args)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except InvalidModelNameError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    record.labels = loaded.key
+    metrics.observe_stage('model', loaded.key, time.perf_counter() - start)
+    return loaded
+
+
+def json_response(record: RequestRecord, response: BaseModel) -> Response:
+    """Serialize a response model to JSON, timing the serialize stage."""
+    with metrics.stage('serialize', record.labels):
+        dump = getattr(response, "model_dump_json", None) or response.json
+        return Response(content=dump(), media_type="application/json")
+
+
+async def serve_single(request: Request, endpoint: str, get_model, *args) -> Response:
+    """Admit, look up the model, decode and predict one spectrum."""
+    with track_request(endpoint) as record, executor.admit():
+        loaded = await load_model(record, get_model, *args)
+        
+        try:
+            with metrics.stage('parse', record.labels):
+                spectrum, wavelengths = await read_spectrum(request, loaded)
+            record.n_spectra = 1
+            response = await predict_single(loaded, spectrum, wavelengths)
+            return json_response(record, response)
+            
+        except HTTPException:
+            raise
+        except wire.UnsupportedMediaTypeError as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+
+
+async def serve_batch(request: Request, endpoint: str, get_model, *args) -> Response:
+    """Admit, look up the model, decode and predict a batch of spectra."""
+    with track_request(endpoint) as record, executor.admit():
+        loaded = await load_model(record, get_model, *args)
+        
+        try:
+            with metrics.stage('parse', record.labels):
+                spectra, wavelengths = await read_spectra(request, loaded, BatchPredictionRequest, "spectra")
+            record.n_spectra = len(spectra)
+            
+            timings: Dict[str, float] = {}
+            result = await executor.predict_batch(loaded, spectra, wavelengths, timings)
+            for stage, seconds in timings.items():
+                metrics.observe_stage(stage, record.labels, seconds)
+            
+            return json_response(record, BatchPredictionResponse(**result))
+            
+        except HTTPException:
+            raise
+        except wire.UnsupportedMediaTypeError as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+
+
+def request_body_docs(schema: type) -> Dict[str, Any]:
+    """OpenAPI request body listing the JSON schema and binary formats."""
+    binary = {"schema": {"type": "string", "format": "binary"}}
+    json_schema = getattr(schema, "model_json_schema", None) or schema.schema
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                wire.JSON: {"schema": json_schema()},
+                **{kind: binary for kind in wire.BINARY_TYPES}
+            }
+        }
+    }
+
+
+def require_default_model() -> None:
+    """Answer 404 on the default endpoints when CROP/TARGET has no trained model."""
+    if model_path is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No default model for {crop}/{target}; use /predict/{{crop}}/{{target}}"
+        )
+
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint."""
     return HealthResponse(status="ok")
 
 
-@app.post("/predict", response_model=PredictionResponse)
-async def predict(request: PredictionRequest):
+@app.post("/predict", response_model=PredictionResponse,
+          openapi_extra=request_body_docs(PredictionRequest))
+async def predict(request: Request):
     """
     Predict nutrient value from NIR spectrum.
     
+    Accepts a JSON PredictionRequest or a binary body (raw float32/float64,
+    .npy or Arrow IPC) holding one spectrum.
+    
     Args:
-        request: PredictionRequest containing the NIR spectrum
+        request: Request whose body holds the NIR spectrum
         
     Returns:
         PredictionResponse with prediction and confidence interval
     """
-    if model_path is None:
-        raise HTTPException(status_code=500, detail="Model not loaded")
+    require_default_model()
     
-    try:
-        # Make prediction
-        result = predict_from_spectrum(
-            model_path=str(model_path),
-            spectrum=request.spectrum,
-            wavelengths_json=wavelengths_path
-        )
+    # Cached in the registry; reloaded only if the model file changed
+    return await serve_single(request, "predict", registry.load, model_path, wavelengths_path)
+
+
+@app.post("/predict/batch", response_model=BatchPredictionResponse,
+          openapi_extra=request_body_docs(BatchPredictionRequest))
+async def predict_batch(request: Request):
+    """
+    Predict nutrient values for a tray of NIR spectra in one model call.
+    
+    Accepts a JSON BatchPredictionRequest or a binary body (raw
+    float32/float64, .npy or Arrow IPC) holding one spectrum per row.
+    
+    Args:
+        request: Request whose body holds the NIR spectra
         
-        return PredictionResponse(
-            prediction=result['prediction'],
-            confidence_interval=result['confidence_interval'],
-            metadata=result['metadata']
-        )
+    Returns:
+        BatchPredictionResponse with per-row predictions or errors
+    """
+    require_default_model()
+    
+    return await serve_batch(request, "predict_batch", registry.load, model_path, wavelengths_path)
+
+
+@app.post("/predict/{crop_name}/{target_name}", response_model=PredictionResponse,
+          openapi_extra=request_body_docs(PredictionRequest))
+async def predict_for(crop_name: str, target_name: str, request: Request,
+                      version: Optional[str] = None):
+    """
+    Predict a nutrient value with the model for any crop/target pair.
+    
+    With ``multi`` as the target, the crop's multi-target model predicts
+    every nutrient it was trained for in one call.
+    
+    Args:
+        crop_name: Crop the spectrum was taken from
+        target_name: Nutrient to predict
+        request: Request whose body holds the NIR spectrum
+        version: Model version (defaults to the most recent model)
         
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+    Returns:
+        PredictionResponse with prediction and confidence interval
+    """
+    return await serve_single(request, "predict", registry.get, crop_name, target_name, version)
+
+
+@app.post("/predict/{crop_name}/{target_name}/batch", response_model=BatchPredictionResponse,
+          openapi_extra=request_body_docs(BatchPredictionRequest))
+async def predict_batch_for(crop_name: str, target_name: str, request: Request,
+                            version: Optional[str] = None):
+    """
+    Predict nutrient values for many spectra with the model for any crop/target pair.
+    
+    Args:
+        crop_name: Crop the spectra were taken from
+        target_name: Nutrient to predict
+        request: Request whose body holds the NIR spectra
+        version: Model version (defaults to the most recent model)
+        
+    Returns:
+        BatchPredictionResponse with per-row predictions or errors
+    """
+    return await serve_batch(request, "predict_batch", registry.get, crop_name, target_name, version)
+
+
+@app.get("/models")
+async def list_models():
+    """List the models available on disk and those currently loaded."""
+    return {
+        "available": [
+            {"crop": c, "target": t, "version": v} for c, t, v in registry.available()
+        ],
+        "loaded": [
+            {"crop": m.crop, "target": m.target, "version": m.version, "bytes": m.nbytes}
+            for m in registry.loaded()
+        ],
+        "max_bytes": registry.max_bytes,
+        "idle_seconds": registry.idle_seconds
+    }
+
+
+@app.get("/metrics/batching")
+async def batching_metrics():
+    """Configured micro-batch limits, observed batch sizes and queue delays."""
+    return {
+        "max_batch_size": batcher.max_batch_size,
+        "max_wait_ms": batcher.max_wait_ms,
+        **batcher.stats.as_dict(),
+        "executor": executor.stats()
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Request, error and stage latency metrics in the Prometheus text format."""
+    prefix = metrics.prefix
+    executor_stats = executor.stats()
+    loaded = registry.loaded()
+    extra = batching_families(batcher.stats, prefix) + [
+        (f"{prefix}_in_flight_requests", "gauge", "Prediction requests currently admitted",
+         [f"{prefix}_in_flight_requests {executor_stats['in_flight']}"]),
+        (f"{prefix}_rejected_requests_total", "counter", "Requests shed because the queue was full",
+         [f"{prefix}_rejected_requests_total {executor_stats['rejected']}"]),
+        (f"{prefix}_loaded_models", "gauge", "Models held in the registry",
+         [f"{prefix}_loaded_models {len(loaded)}"]),
+        (f"{prefix}_loaded_model_bytes", "gauge", "Estimated memory of the loaded models",
+         [f"{prefix}_loaded_model_bytes {sum(m.nbytes for m in loaded)}"]),
+    ]
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4")
 
 
 @app.get("/info")
 async def get_info():
-    """Get information about the loaded model and configuration."""
-    if model_path is None:
-        raise HTTPException(status_code=500, detail="Model not loaded")
-    
+    """Get information about the default model (None if absent) and configuration."""
     return {
         "crop": crop,
         "target": target,
-        "model_path": str(model_path),
+        "model_path": str(model_path) if model_path is not None else None,
         "wavelengths_path": wavelengths_path,
-        "model_name": model_path.name
+        "model_name": model_path.name if model_path is not None else None,
+        "loaded_models": [
+            {"crop": m.crop, "target": m.target, "version": m.version}
+            for m in registry.loaded()
+        ]
     }
 
 
 if __name__ == "__main__":
     # This allows running the API directly with: python -m src.api.main
+    import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000)
 
 
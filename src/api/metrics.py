@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Prometheus-style metrics for the prediction API.
+
+Counters and histograms are kept in plain Python structures keyed by
+label values and rendered in the Prometheus text exposition format by
+``/metrics``. Recording a value is a dictionary lookup, a bisect and a
+few additions under a lock, so metrics stay on in production.
+
+Prediction latency is broken into stages, each labeled by crop, target
+and model version:
+
+- ``parse``: reading and decoding the request body
+- ``validate``: checking spectra against the model's wavelengths (and resampling)
+- ``model``: model lookup, and loading when it isn't cached
+- ``predict``: scoring the spectra
+- ``serialize``: encoding the response
+
+Requests are labeled by the model they resolved to; those that match no
+model (e.g. a 404 for a made-up crop) share the ``unknown`` labels.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+STAGES = ('parse', 'validate', 'model', 'predict', 'serialize')
+
+# Latency buckets in seconds, from 100 µs to 5 s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+MODEL_LABELS = ('crop', 'target', 'version')
+
+# Labels of requests whose model couldn't be resolved (bounded cardinality)
+UNKNOWN_MODEL = ('unknown', 'unknown', 'unknown')
+
+Labels = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: Labels = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in sorted(values):
+            yield f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+
+
+class Histogram:
+    """
+    Bucketed distribution of observed values per label set.
+
+    Counts are kept per bucket and made cumulative when rendered.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts (+Inf last), sum, count]
+        self._series: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Labels, value: float, count: int = 1) -> None:
+        """Record ``count`` observations of ``value``."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += count
+            series[1] += value * count
+            series[2] += count
+
+    def count(self, labels: Labels) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            series = [(labels, list(counts), total, n) for labels, (counts, total, n) in self._series.items()]
+        for labels, counts, total, n in sorted(series):
+            yield from histogram_samples(self.name, self.label_names, labels,
+                                         self.buckets, counts, total, n)
+
+
+def histogram_samples(name: str, label_names: Sequence[str], labels: Sequence[str],
+                      buckets: Sequence[float], counts: Sequence[int],
+                      total: float, n: int) -> Iterator[str]:
+    """Render one histogram series from per-bucket (non-cumulative) counts."""
+    cumulative = 0
+    for bound, bucket_count in zip(list(buckets) + [float("inf")], counts):
+        cumulative += bucket_count
+        le = f'le="{_format_value(float(bound))}"'
+        yield f"{name}_bucket{_format_labels(label_names, labels, le)} {cumulative}"
+    yield f"{name}_sum{_format_labels(label_names, labels)} {_format_value(float(total))}"
+    yield f"{name}_count{_format_labels(label_names, labels)} {n}"
+
+
+def batching_families(stats, prefix: str) -> List[Tuple[str, str, str, List[str]]]:
+    """Micro-batch size and queue delay histograms from src.api.batching.BatchStats."""
+    size = f"{prefix}_batch_size"
+    delay = f"{prefix}_batch_queue_delay_seconds"
+    return [
+        (size, "histogram", "Spectra per micro-batch", list(histogram_samples(
+            size, (), (), stats.size_buckets, stats.size_counts, stats.requests, stats.batches
+        ))),
+        (delay, "histogram", "Time spectra waited for their micro-batch", list(histogram_samples(
+            delay, (), (), [b / 1000.0 for b in stats.delay_buckets_ms], stats.delay_counts,
+            stats.delay_sum_ms / 1000.0, stats.requests
+        )))
+    ]
+
+
+class APIMetrics:
+    """Request, error and per-stage latency metrics of the prediction API."""
+
+    def __init__(self, prefix: str = "nutrient"):
+        self.prefix = prefix
+        request_labels = ('endpoint',) + MODEL_LABELS
+        self.requests = Counter(f"{prefix}_requests_total",
+                                "Prediction requests by endpoint, model and HTTP status",
+                                request_labels + ('status',))
+        self.errors = Counter(f"{prefix}_request_errors_total",
+                              "Failed prediction requests by endpoint, model and HTTP status",
+                              request_labels + ('status',))
+        self.spectra = Counter(f"{prefix}_spectra_total",
+                               "Spectra received by endpoint and model", request_labels)
+        self.latency = Histogram(f"{prefix}_request_duration_seconds",
+                                 "End-to-end prediction request latency", request_labels)
+        self.stages = Histogram(f"{prefix}_stage_duration_seconds",
+                                "Prediction latency by stage", ('stage',) + MODEL_LABELS)
+        self.started = time.time()
+
+    def observe_stage(self, stage: str, model: Labels, seconds: float, count: int = 1) -> None:
+        self.stages.observe((stage,) + tuple(model), seconds, count)
+
+    @contextmanager
+    def stage(self, stage: str, model: Labels):
+        """Time the enclosed block as one observation of ``stage``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, model, time.perf_counter() - start)
+
+    def observe_request(self, endpoint: str, model: Labels, status: int,
+                        seconds: float, n_spectra: int = 0) -> None:
+        labels = (endpoint,) + tuple(model)
+        self.requests.inc(labels + (str(status),))
+        if status >= 400:
+            self.errors.inc(labels + (str(status),))
+        if n_spectra:
+            self.spectra.inc(labels, n_spectra)
+        self.latency.observe(labels, seconds)
+
+    def render(self, extra: Optional[List[Tuple[str, str, str, List[str]]]] = None) -> str:
+        """
+        Render all metrics in the Prometheus text format.
+
+        Args:
+            extra: Additional ``(name, kind, help, sample lines)`` families,
+                e.g. gauges read from other components at scrape time
+        """
+        lines = []
+        families = [(m.name, m.kind, m.help, list(m.samples()))
+                    for m in (self.requests, self.errors, self.spectra, self.latency, self.stages)]
+        families.append((f"{self.prefix}_start_time_seconds", "gauge",
+                         "Unix time the API process started",
+                         [f"{self.prefix}_start_time_seconds {self.started}"]))
+        for name, kind, help, samples in families + (extra or []):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
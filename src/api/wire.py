@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Decode spectra from binary and compact request bodies.
+
+Besides JSON, prediction endpoints accept:
+
+- ``application/octet-stream``: raw little-endian float32 (default) or
+  float64 values, row-major, one spectrum after another. The dtype is
+  chosen with the ``X-Spectrum-Dtype`` header.
+- ``application/x-npy``: a NumPy ``.npy`` array of shape (n_wavelengths,)
+  or (n_spectra, n_wavelengths).
+- ``application/vnd.apache.arrow.stream`` / ``.file``: an Arrow IPC table
+  with either one fixed-size-list column (one spectrum per row) or one
+  numeric column per wavelength.
+
+Raw and ``.npy`` bodies are viewed in place with ``np.frombuffer``, and
+fixed-size-list Arrow columns are exposed without copying. Binary bodies
+can declare the wavelengths they were measured at in the
+``X-Spectrum-Wavelengths`` header as comma-separated numbers.
+"""
+
+import io
+from typing import Optional
+
+import numpy as np
+
+
+JSON = "application/json"
+OCTET_STREAM = "application/octet-stream"
+NPY = "application/x-npy"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+ARROW_FILE = "application/vnd.apache.arrow.file"
+
+BINARY_TYPES = (OCTET_STREAM, NPY, ARROW_STREAM, ARROW_FILE)
+
+RAW_DTYPES = {
+    "float32": np.dtype("<f4"),
+    "float64": np.dtype("<f8"),
+}
+
+
+class UnsupportedMediaTypeError(ValueError):
+    """Raised when a request body has a content type we can't decode."""
+
+
+def media_type(content_type: Optional[str]) -> str:
+    """Strip parameters such as ``; charset=utf-8`` from a content type."""
+    return (content_type or JSON).split(';')[0].strip().lower()
+
+
+def _as_rows(values: np.ndarray, n_wavelengths: Optional[int]) -> np.ndarray:
+    """Reshape a flat array of values into one row per spectrum."""
+    if n_wavelengths is None:
+        return values.reshape(1, -1)
+    if n_wavelengths == 0 or len(values) % n_wavelengths:
+        raise ValueError(
+            f"Spectrum length ({len(values)}) doesn't match "
+            f"expected wavelengths ({n_wavelengths})"
+        )
+    return values.reshape(-1, n_wavelengths)
+
+
+def decode_raw(body: bytes, dtype: str = "float32",
+               n_wavelengths: Optional[int] = None) -> np.ndarray:
+    """Decode raw little-endian floats without copying."""
+    if dtype not in RAW_DTYPES:
+        raise ValueError(f"Unsupported spectrum dtype '{dtype}', use one of {list(RAW_DTYPES)}")
+
+    item_size = RAW_DTYPES[dtype].itemsize
+    if len(body) % item_size:
+        raise ValueError(f"Body length ({len(body)} bytes) is not a multiple of {item_size} bytes")
+
+    return _as_rows(np.frombuffer(body, dtype=RAW_DTYPES[dtype]), n_wavelengths)
+
+
+def decode_npy(body: bytes) -> np.ndarray:
+    """Decode a ``.npy`` body, viewing the data in place."""
+    stream = io.BytesIO(body)
+    try:
+        version = np.lib.format.read_magic(stream)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+    except ValueError as e:
+        raise ValueError(f"Invalid .npy body: {e}")
+
+    if dtype.hasobject or dtype.kind not in "fiu":
+        raise ValueError(f"Unsupported .npy dtype: {dtype}")
+    if len(shape) not in (1, 2):
+        raise ValueError(f".npy array must be 1D or 2D, got shape {shape}")
+
+    count = int(np.prod(shape))
+    values = np.frombuffer(body, dtype=dtype, count=count, offset=stream.tell())
+    values = values.reshape(shape, order='F' if fortran_order else 'C')
+
+    return values.reshape(1, -1) if values.ndim == 1 else values
+
+
+def decode_arrow(body: bytes, file_format: bool = False) -> np.ndarray:
+    """Decode an Arrow IPC stream or file into a 2D array."""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise UnsupportedMediaTypeError("Arrow bodies require pyarrow: pip install pyarrow")
+
+    try:
+        reader = pa.ipc.open_file(body) if file_format else pa.ipc.open_stream(body)
+        table = reader.read_all()
+    except (pa.ArrowInvalid, pa.ArrowIOError) as e:
+        # Truncated bodies fail with ArrowIOError (an OSError), not ArrowInvalid
+        raise ValueError(f"Invalid Arrow body: {e}")
+
+    if table.num_columns == 1 and pa.types.is_fixed_size_list(table.schema.field(0).type):
+        column = table.column(0).combine_chunks()
+        width = column.type.list_size
+        values = column.flatten().to_numpy(zero_copy_only=False)
+        return values.reshape(-1, width)
+
+    return np.column_stack([
+        table.column(i).to_numpy() for i in range(table.num_columns)
+    ]) if table.num_columns else np.empty((table.num_rows, 0))
+
+
+def decode_wavelengths(header: Optional[str]) -> Optional[np.ndarray]:
+    """Parse a comma-separated ``X-Spectrum-Wavelengths`` header."""
+    if not header:
+        return None
+    try:
+        return np.array([float(value) for value in header.split(',')])
+    except ValueError:
+        raise ValueError("X-Spectrum-Wavelengths must be comma-separated numbers")
+
+
+def decode_spectra(
+    body: bytes,
+    content_type: Optional[str],
+    n_wavelengths: Optional[int] = None,
+    dtype: Optional[str] = None
+) -> np.ndarray:
+    """
+    Decode a binary request body into a 2D array of spectra.
+
+    Args:
+        body: Raw request body
+        content_type: Request content type
+        n_wavelengths: Expected number of wavelengths, if known
+        dtype: Value type for raw bodies (``float32`` or ``float64``)
+
+    Returns:
+        Array of shape (n_spectra, n_wavelengths)
+
+    Raises:
+        UnsupportedMediaTypeError: If the content type is not supported
+        ValueError: If the body is malformed
+    """
+    kind = media_type(content_type)
+
+    if kind == OCTET_STREAM:
+        return decode_raw(body, dtype or "float32", n_wavelengths)
+    if kind == NPY:
+        return decode_npy(body)
+    if kind in (ARROW_STREAM, ARROW_FILE):
+        return decode_arrow(body, file_format=kind == ARROW_FILE)
+
+    raise UnsupportedMediaTypeError(
+        f"Unsupported content type '{kind}', use one of {[JSON, *BINARY_TYPES]}"
+    )
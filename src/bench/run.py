@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Benchmark the training and inference pipeline on synthetic data.
+
+A synthetic dataset (see src.bench.synthetic) is written to a scratch
+directory, then each stage runs in its own freshly spawned process so
+that its wall time and peak memory are measured in isolation:
+
+- clean: src.data.clean_bi on the raw dataset (``--stream`` for streaming mode)
+- cv: the component search alone (GroupKFold CV)
+- train: src.models.train_pls end to end
+- infer_single: one spectrum per predict call
+- infer_batch: one predict call per batch of spectra
+
+Results are appended as JSON lines to a results file, tagged with the
+git commit and dataset configuration, so runs can be compared across
+commits with ``--compare``. Everything runs offline.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+
+STAGES = ["clean", "cv", "train", "infer_single", "infer_batch"]
+
+CROP = "carrots"
+TARGET = "antioxidants"
+
+
+def git_commit() -> Optional[str]:
+    """Short hash of the checked-out commit, with a ``+dirty`` suffix for local changes."""
+    root = Path(__file__).resolve().parents[2]
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               cwd=root, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}+dirty" if dirty else commit
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_cli(main: Callable[[], int], argv: List[str]) -> Dict[str, Any]:
+    """Run a script's ``main`` with the given command line arguments."""
+    old_argv = sys.argv
+    sys.argv = [main.__module__] + argv
+    try:
+        code = main()
+    finally:
+        sys.argv = old_argv
+    if code:
+        raise RuntimeError(f"{main.__module__} exited with status {code}")
+    return {}
+
+
+def stage_clean(params: Dict[str, Any]) -> Dict[str, Any]:
+    from src.data.clean_bi import main
+    argv = ["--crop", CROP, "--target", TARGET]
+    if params['stream']:
+        argv.append("--stream")
+    return run_cli(main, argv)
+
+
+def stage_cv(params: Dict[str, Any]) -> Dict[str, Any]:
+    import pandas as pd
+    from src.data.splits import load_folds, splits_path
+    from src.models import train_pls
+
+    clean_dir = Path("data/clean")
+    X = pd.read_parquet(clean_dir / f"{CROP}__X.parquet")
+    y = pd.read_parquet(clean_dir / f"{CROP}__y__{TARGET}.parquet").iloc[:, 0]
+    folds = load_folds(splits_path(clean_dir, CROP))
+
+    if params['search'] == "path":
+        _, best_n, _, _, _ = train_pls.path_search_components(X, y, folds)
+    else:
+        _, best_n, _, _, _ = train_pls.grid_search_components(X, y, folds)
+    return {'best_n_components': int(best_n)}
+
+
+def stage_train(params: Dict[str, Any]) -> Dict[str, Any]:
+    from src.models.train_pls import main
+    return run_cli(main, ["--crop", CROP, "--target", TARGET, "--search", params['search']])
+
+
+def _load_model_and_spectra(n_spectra: int):
+    import pandas as pd
+    from src.models.registry import ModelRegistry
+
+    registry = ModelRegistry()
+    loaded = registry.load(Path("models") / f"{CROP}__{TARGET}__pls.joblib")
+    X = pd.read_parquet(Path("data/clean") / f"{CROP}__X.parquet").to_numpy()
+    rows = np.resize(np.arange(len(X)), n_spectra)
+    return loaded, X[rows]
+
+
+def stage_infer_single(params: Dict[str, Any]) -> Dict[str, Any]:
+    loaded, X = _load_model_and_spectra(params['single_requests'])
+    spectra = X.tolist()
+
+    latencies = []
+    for spectrum in spectra:
+        start = time.perf_counter()
+        loaded.predict(spectrum)
+        latencies.append(time.perf_counter() - start)
+
+    latencies_ms = np.array(latencies) * 1000.0
+    return {
+        'requests': len(spectra),
+        'predictor': type(loaded.model).__name__,
+        'latency_p50_ms': float(np.percentile(latencies_ms, 50)),
+        'latency_p99_ms': float(np.percentile(latencies_ms, 99)),
+        'spectra_per_s': float(len(spectra) / latencies_ms.sum() * 1000.0)
+    }
+
+
+def stage_infer_batch(params: Dict[str, Any]) -> Dict[str, Any]:
+    batch_size = params['batch_size']
+    loaded, X = _load_model_and_spectra(batch_size * params['batches'])
+
+    latencies = []
+    for start_row in range(0, len(X), batch_size):
+        start = time.perf_counter()
+        loaded.predict_batch(X[start_row:start_row + batch_size])
+        latencies.append(time.perf_counter() - start)
+
+    latencies_ms = np.array(latencies) * 1000.0
+    return {
+        'batches': len(latencies),
+        'batch_size': batch_size,
+        'predictor': type(loaded.model).__name__,
+        'batch_p50_ms': float(np.percentile(latencies_ms, 50)),
+        'spectra_per_s': float(len(X) / latencies_ms.sum() * 1000.0)
+    }
+
+
+STAGE_FUNCTIONS = {
+    'clean': stage_clean,
+    'cv': stage_cv,
+    'train': stage_train,
+    'infer_single': stage_infer_single,
+    'infer_batch': stage_infer_batch,
+}
+
+
+def _stage_worker(stage: str, workdir: str, params: Dict[str, Any],
+                  verbose: bool, queue) -> None:
+    """Run one stage in a child process and report its measurements."""
+    os.chdir(workdir)
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    try:
+        with output:
+            start = time.perf_counter()
+            extra = STAGE_FUNCTIONS[stage](params)
+            wall = time.perf_counter() - start
+        queue.put({'ok': True, 'wall_s': wall, 'peak_rss_mb': peak_rss_mb(), 'extra': extra})
+    except Exception as e:
+        queue.put({'ok': False, 'error': f"{type(e).__name__}: {e}"})
+
+
+def run_stage(stage: str, workdir: Path, params: Dict[str, Any],
+              verbose: bool = False) -> Dict[str, Any]:
+    """Run a stage in a fresh spawned process so memory peaks don't carry over."""
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_stage_worker,
+                          args=(stage, str(workdir), params, verbose, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def generate(workdir: Path, params: Dict[str, Any], stages: List[str]) -> None:
+    """Write the synthetic inputs needed by the selected stages."""
+    from src.bench.synthetic import SyntheticNIR
+
+    generator = SyntheticNIR(params['samples'], params['wavelengths'],
+                             n_crops=params['crops'], seed=params['seed'])
+    data_dir = workdir / "data"
+    if "clean" in stages:
+        generator.write_raw(data_dir)
+    else:
+        generator.write_clean(data_dir)
+
+
+def append_results(results_path: Path, records: List[Dict[str, Any]]) -> None:
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(results_path, 'a') as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def compare(results_path: Path) -> int:
+    """Print the latest result of each stage per commit and configuration."""
+    if not results_path.exists():
+        print(f"❌ No results found at {results_path}")
+        return 1
+
+    latest: Dict[tuple, Dict[str, Any]] = {}
+    with open(results_path, 'r') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                config = record['config']
+                key = (config['samples'], config['wavelengths'], config['search'],
+                       record['stage'], record['commit'])
+                latest[key] = record
+
+    print(f"{'samples':>9} {'wl':>5} {'search':>6} {'stage':<13} {'commit':<14} "
+          f"{'wall_s':>9} {'peak_mb':>9}")
+    for key in sorted(latest, key=lambda k: (k[:4], latest[k]['timestamp'])):
+        record = latest[key]
+        samples, wavelengths, search, stage, commit = key
+        print(f"{samples:>9} {wavelengths:>5} {search:>6} {stage:<13} {str(commit):<14} "
+              f"{record['wall_s']:>9.3f} {record['peak_rss_mb']:>9.1f}")
+    return 0
+
+
+def main():
+    """Run the pipeline benchmarks."""
+    parser = argparse.ArgumentParser(description="Benchmark training and inference on synthetic data")
+    parser.add_argument("--samples", type=int, default=10_000, help="Number of synthetic scans")
+    parser.add_argument("--wavelengths", type=int, default=256, help="Wavelengths per scan")
+    parser.add_argument("--crops", type=int, default=1, help="Number of crops in the raw dataset")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES,
+                        help="Stages to run, in pipeline order")
+    parser.add_argument("--search", choices=["grid", "path"], default="path",
+                        help="Component search used by the cv and train stages")
+    parser.add_argument("--stream", action="store_true",
+                        help="Benchmark the streaming (bounded-memory) clean mode")
+    parser.add_argument("--single-requests", type=int, default=1000,
+                        help="Number of single-spectrum predictions")
+    parser.add_argument("--batch-size", type=int, default=256, help="Spectra per batch prediction")
+    parser.add_argument("--batches", type=int, default=20, help="Number of batch predictions")
+    parser.add_argument("--workdir", help="Directory for the synthetic data (default: a temp dir)")
+    parser.add_argument("--results", default="benchmarks/results.jsonl",
+                        help="JSON lines file the results are appended to")
+    parser.add_argument("--compare", action="store_true",
+                        help="Print stored results per commit instead of running")
+    parser.add_argument("--verbose", action="store_true", help="Show the stages' own output")
+
+    args = parser.parse_args()
+
+    results_path = Path(args.results)
+    if args.compare:
+        return compare(results_path)
+
+    stages = [stage for stage in STAGES if stage in args.stages]
+    params = {
+        'samples': args.samples,
+        'wavelengths': args.wavelengths,
+        'crops': args.crops,
+        'seed': args.seed,
+        'search': args.search,
+        'stream': args.stream,
+        'single_requests': args.single_requests,
+        'batch_size': args.batch_size,
+        'batches': args.batches
+    }
+    commit = git_commit()
+
+    print(f"⏱️  Benchmarking {args.samples} scans x {args.wavelengths} wavelengths "
+          f"(commit {commit or 'unknown'})")
+
+    with contextlib.ExitStack() as stack:
+        if args.workdir:
+            workdir = Path(args.workdir)
+            workdir.mkdir(parents=True, exist_ok=True)
+        else:
+            workdir = Path(stack.enter_context(tempfile.TemporaryDirectory(prefix="nir-bench-")))
+
+        print(f"🧪 Generating synthetic data in {workdir}")
+        start = time.perf_counter()
+        generate(workdir, params, stages)
+        print(f"   Generated in {time.perf_counter() - start:.1f}s")
+
+        records = []
+        for stage in stages:
+            result = run_stage(stage, workdir, params, verbose=args.verbose)
+            if not result['ok']:
+                print(f"❌ {stage} failed: {result['error']}")
+                append_results(results_path, records)
+                return 1
+
+            print(f"   {stage:<13} {result['wall_s']:>9.3f}s {result['peak_rss_mb']:>9.1f} MB "
+                  f"{json.dumps(result['extra']) if result['extra'] else ''}")
+            records.append({
+                'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+                'commit': commit,
+                'stage': stage,
+                'config': params,
+                'wall_s': result['wall_s'],
+                'peak_rss_mb': result['peak_rss_mb'],
+                'extra': result['extra'],
+                'python': platform.python_version(),
+                'cpus': os.cpu_count()
+            })
+
+    append_results(results_path, records)
+    print(f"💾 Appended {len(records)} results to {results_path}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
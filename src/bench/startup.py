@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Measure the import (cold start) time of each entry point.
+
+Every entry point is imported in a fresh interpreter several times and the
+median import time is compared with its target. A separate run with
+``python -X importtime`` lists the heaviest modules it pulls in, and the
+modules an entry point must not load at import time (e.g. sklearn for the
+API, which serves fused predictors) are checked against ``sys.modules``.
+
+Exits non-zero when an entry point misses its target or imports a
+deferred dependency, so it can run in CI.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+
+# Heavy dependencies deferred until they are used
+PLOTTING = ['matplotlib']
+TRAINING = ['sklearn', 'joblib']
+TABULAR = ['pandas', 'pyarrow']
+
+# Import time target (ms) and modules that must not be loaded at import
+ENTRY_POINTS: Dict[str, Dict[str, Any]] = {
+    'src.api.main': {
+        'target_ms': 800,
+        'deferred': PLOTTING + TRAINING + TABULAR + ['scipy', 'uvicorn']
+    },
+    'src.models.infer': {
+        'target_ms': 250,
+        'deferred': PLOTTING + TRAINING + TABULAR + ['scipy', 'fastapi']
+    },
+    'src.models.train_pls': {
+        'target_ms': 250,
+        'deferred': PLOTTING + TRAINING + TABULAR
+    },
+    'src.models.evaluate': {
+        'target_ms': 250,
+        'deferred': PLOTTING + TRAINING + TABULAR
+    },
+    'src.models.precision_report': {
+        'target_ms': 250,
+        'deferred': PLOTTING + TRAINING + TABULAR
+    },
+    'src.data.clean_bi': {
+        'target_ms': 1000,
+        'deferred': PLOTTING + TRAINING + ['openpyxl']
+    },
+}
+
+_TIMER = (
+    "import json, sys, time\n"
+    "start = time.perf_counter()\n"
+    "import {module}\n"
+    "elapsed = time.perf_counter() - start\n"
+    "print(json.dumps({{'ms': elapsed * 1000.0, 'modules': sorted(sys.modules)}}))\n"
+)
+
+
+def time_import(module: str, cwd: Path) -> Tuple[float, List[str]]:
+    """Import a module in a fresh interpreter; return its import time and loaded modules."""
+    result = subprocess.run([sys.executable, "-W", "ignore", "-c", _TIMER.format(module=module)],
+                            cwd=cwd, capture_output=True, text=True, check=True)
+    data = json.loads(result.stdout.strip().splitlines()[-1])
+    return data['ms'], data['modules']
+
+
+def heaviest_imports(module: str, cwd: Path, top: int = 5) -> List[Tuple[str, float]]:
+    """Top-level packages pulled in by a module, by cumulative import time (ms)."""
+    result = subprocess.run([sys.executable, "-W", "ignore", "-X", "importtime", "-c", f"import {module}"],
+                            cwd=cwd, capture_output=True, text=True, check=True)
+
+    totals: Dict[str, float] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # Direct children of the entry point are indented by three spaces
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            package = name.strip().split(".")[0]
+            totals[package] = totals.get(package, 0.0) + int(cumulative) / 1000.0
+    return sorted(totals.items(), key=lambda item: -item[1])[:top]
+
+
+def loaded_deferred(modules: List[str], deferred: List[str]) -> List[str]:
+    """Deferred packages present among the loaded modules."""
+    loaded = {name.split(".")[0] for name in modules}
+    return [package for package in deferred if package in loaded]
+
+
+def profile(module: str, spec: Dict[str, Any], cwd: Path, repeat: int) -> Dict[str, Any]:
+    """Time an entry point's import and check its target and deferred modules."""
+    # The first import also warms the bytecode cache
+    times = []
+    for _ in range(repeat + 1):
+        ms, modules = time_import(module, cwd)
+        times.append(ms)
+    median = statistics.median(times[1:])
+
+    violations = loaded_deferred(modules, spec['deferred'])
+    return {
+        'module': module,
+        'import_ms': median,
+        'target_ms': spec['target_ms'],
+        'modules': len(modules),
+        'deferred_loaded': violations,
+        'heaviest': heaviest_imports(module, cwd),
+        'ok': median <= spec['target_ms'] and not violations
+    }
+
+
+def main():
+    """Profile the import time of each entry point."""
+    parser = argparse.ArgumentParser(description="Measure entry point import times")
+    parser.add_argument("--modules", nargs="+", choices=list(ENTRY_POINTS),
+                        default=list(ENTRY_POINTS), help="Entry points to profile")
+    parser.add_argument("--repeat", type=int, default=5, help="Imports timed per entry point")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+
+    args = parser.parse_args()
+
+    root = Path(__file__).resolve().parents[2]
+    results = [profile(module, ENTRY_POINTS[module], root, args.repeat) for module in args.modules]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'entry point':<28} {'import_ms':>9} {'target':>7} {'modules':>8}  heaviest imports")
+        for result in results:
+            heaviest = ", ".join(f"{name} {ms:.0f}ms" for name, ms in result['heaviest'])
+            status = "✅" if result['ok'] else "❌"
+            print(f"{status} {result['module']:<26} {result['import_ms']:>9.1f} "
+                  f"{result['target_ms']:>7} {result['modules']:>8}  {heaviest}")
+            if result['deferred_loaded']:
+                print(f"   ⚠️  imports deferred dependencies: {', '.join(result['deferred_loaded'])}")
+
+    return 0 if all(result['ok'] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic NIR datasets for benchmarking.
+
+Spectra are smooth mixtures of Gaussian absorption bands driven by a few
+latent factors, with nutrient targets that depend linearly on the same
+factors. Data is generated and written in chunks, so datasets with
+millions of samples never have to fit in memory at once.
+
+Two layouts can be written:
+
+- raw: ``data/raw/averaged_dataset.parquet`` in the shape of the BI
+  averaged dataset, for benchmarking the cleaning stage
+- clean: ``data/clean/{crop}__X.parquet``, ``{crop}__y__{target}.parquet``,
+  ``{crop}__wavelengths.json`` and ``{crop}__splits.npy``, as written by
+  src.data.clean_bi
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Iterator, List
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.data.splits import fold_ids_from_splits, save_fold_ids, splits_file
+
+
+TARGETS = ['antioxidants', 'protein', 'minerals']
+CROPS = ['carrots', 'spinach', 'kale', 'lettuce', 'oats', 'wheat']
+
+
+class SyntheticNIR:
+    """
+    Reproducible generator of synthetic spectra and targets.
+
+    Args:
+        n_samples: Number of scans
+        n_wavelengths: Number of wavelengths per scan
+        n_crops: Number of crops the scans are spread over
+        n_factors: Number of latent factors behind spectra and targets
+        scans_per_sample: Scans sharing one sample_id (for GroupKFold)
+        missing_rate: Fraction of spectral values set to NaN
+        seed: Random seed
+    """
+
+    def __init__(self, n_samples: int, n_wavelengths: int, n_crops: int = 1,
+                 n_factors: int = 8, scans_per_sample: int = 2,
+                 missing_rate: float = 0.001, seed: int = 0):
+        self.n_samples = n_samples
+        self.n_wavelengths = n_wavelengths
+        self.crops = CROPS[:max(1, min(n_crops, len(CROPS)))]
+        self.scans_per_sample = scans_per_sample
+        self.missing_rate = missing_rate
+        self.seed = seed
+
+        rng = np.random.default_rng(seed)
+        self.wavelengths = np.linspace(900.0, 2500.0, n_wavelengths)
+        centers = rng.uniform(900.0, 2500.0, n_factors)
+        widths = rng.uniform(40.0, 160.0, n_factors)
+        self.bands = np.exp(-((self.wavelengths[None, :] - centers[:, None]) / widths[:, None]) ** 2)
+        self.target_weights = rng.normal(size=(n_factors, len(TARGETS)))
+
+    @property
+    def wavelength_names(self) -> List[str]:
+        return [f"{w:.1f}" for w in self.wavelengths]
+
+    def chunks(self, chunk_size: int = 50_000) -> Iterator[pd.DataFrame]:
+        """Yield the raw dataset in chunks of rows."""
+        for start in range(0, self.n_samples, chunk_size):
+            stop = min(start + chunk_size, self.n_samples)
+            rng = np.random.default_rng([self.seed, start])
+            n = stop - start
+
+            factors = rng.normal(size=(n, self.bands.shape[0]))
+            spectra = 0.5 + 0.1 * factors @ self.bands
+            spectra += rng.normal(scale=0.002, size=spectra.shape)
+            spectra[rng.random(spectra.shape) < self.missing_rate] = np.nan
+            targets = factors @ self.target_weights + rng.normal(scale=0.1, size=(n, len(TARGETS)))
+
+            sample_ids = np.arange(start, stop) // self.scans_per_sample
+            chunk = pd.DataFrame(spectra, columns=self.wavelength_names)
+            chunk.insert(0, 'Sample ID', sample_ids)
+            chunk.insert(1, 'Crop', np.array(self.crops)[sample_ids % len(self.crops)])
+            for i, target in enumerate(TARGETS):
+                chunk[target] = targets[:, i]
+            yield chunk
+
+    def write_raw(self, data_dir: Path) -> Path:
+        """Write ``raw/averaged_dataset.parquet`` under data_dir."""
+        raw_dir = Path(data_dir) / "raw"
+        raw_dir.mkdir(parents=True, exist_ok=True)
+        path = raw_dir / "averaged_dataset.parquet"
+
+        writer = None
+        try:
+            for chunk in self.chunks():
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+        return path
+
+    def write_clean(self, data_dir: Path, n_folds: int = 5) -> Path:
+        """
+        Write the cleaned layout for the first crop under ``data_dir/clean``.
+
+        Spectra are median-imputed per chunk, which is close enough for
+        benchmarking training and inference.
+        """
+        from sklearn.model_selection import GroupKFold
+
+        clean_dir = Path(data_dir) / "clean"
+        clean_dir.mkdir(parents=True, exist_ok=True)
+        crop = self.crops[0]
+
+        writer = None
+        targets = []
+        sample_ids = []
+        try:
+            for chunk in self.chunks():
+                chunk = chunk[chunk['Crop'] == crop]
+                X = chunk[self.wavelength_names]
+                X = X.fillna(X.median())
+                table = pa.Table.from_pandas(X, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(clean_dir / f"{crop}__X.parquet", table.schema)
+                writer.write_table(table)
+                targets.append(chunk[TARGETS])
+                sample_ids.append(chunk['Sample ID'].to_numpy())
+        finally:
+            if writer is not None:
+                writer.close()
+
+        y = pd.concat(targets, ignore_index=True)
+        for target in TARGETS:
+            y[[target]].to_parquet(clean_dir / f"{crop}__y__{target}.parquet", index=False)
+
+        groups = np.concatenate(sample_ids)
+        val_indices = [
+            val_idx for _, val_idx in
+            GroupKFold(n_splits=n_folds).split(np.zeros((len(groups), 1)), groups=groups)
+        ]
+        save_fold_ids(clean_dir / splits_file(crop), fold_ids_from_splits(len(groups), val_indices))
+
+        with open(clean_dir / f"{crop}__wavelengths.json", 'w') as f:
+            json.dump(self.wavelength_names, f, indent=2)
+
+        return clean_dir
+
+
+def main():
+    """Generate a synthetic dataset."""
+    parser = argparse.ArgumentParser(description="Generate synthetic NIR datasets")
+    parser.add_argument("--out", default="data", help="Data directory to write into")
+    parser.add_argument("--samples", type=int, default=10_000, help="Number of scans")
+    parser.add_argument("--wavelengths", type=int, default=256, help="Wavelengths per scan")
+    parser.add_argument("--crops", type=int, default=1, help="Number of crops")
+    parser.add_argument("--layout", choices=["raw", "clean", "both"], default="both",
+                        help="Which layout to write")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+
+    args = parser.parse_args()
+
+    generator = SyntheticNIR(args.samples, args.wavelengths, n_crops=args.crops, seed=args.seed)
+    print(f"🧪 Generating {args.samples} synthetic scans x {args.wavelengths} wavelengths")
+
+    if args.layout in ("raw", "both"):
+        print(f"💾 Saved raw dataset to {generator.write_raw(Path(args.out))}")
+    if args.layout in ("clean", "both"):
+        print(f"💾 Saved clean dataset to {generator.write_clean(Path(args.out))}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,53 +4,256 @@ Clean and prepare Bionutrient Institute dataset for modeling.
 
 This script loads the BI dataset, cleans the data, filters by crop,
 and prepares it for PLS modeling with proper train/test splits.
+
+Spectra are saved as float64 by default; ``--dtype float32`` halves the
+size of ``{crop}__X.parquet`` and of every matrix loaded from it (see
+src.models.precision_report for the accuracy check).
 """
 
 import argparse
+import importlib.util
 import json
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
-from sklearn.model_selection import GroupKFold
 
-try:
-    import openpyxl
-except ImportError:
-    print("❌ Missing dependency: openpyxl")
-    print("   Run: pip install openpyxl")
-    sys.exit(1)
+from src.data.columns import detect_spectral_columns, load_schema, normalize_name, spectral_columns
+from src.data.ingest import file_digest, is_fresh, load_table, optional_digest, write_manifest
+from src.data.splits import fold_ids_from_splits, save_fold_ids, splits_file
+
+# Nutrient targets cleaned by --all unless --targets is given
+DEFAULT_TARGETS = ['antioxidants', 'protein', 'minerals']
+
+# Bump when cleaning logic changes so existing outputs are rebuilt
+CLEAN_VERSION = 1
+
+# Storage dtypes for cleaned spectra
+DTYPES = ['float64', 'float32']
 
 
 def normalize_column_names(df):
     """Convert column names to snake_case."""
-    df.columns = df.columns.str.lower().str.replace(' ', '_').str.replace('-', '_')
+    df.columns = [normalize_name(col) for col in df.columns]
     return df
 
 
-def identify_nir_columns(df):
-    """Identify NIR wavelength columns in the dataframe."""
-    # Look for columns that are numeric and could be wavelengths
-    nir_cols = []
-    for col in df.columns:
-        if col in ['sample_id', 'lab_id', 'crop', 'color', 'variety', 'antioxidants', 'protein', 'minerals']:
-            continue
-        try:
-            # Try to convert to float - if successful, likely a wavelength
-            pd.to_numeric(df[col], errors='raise')
-            nir_cols.append(col)
-        except (ValueError, TypeError):
-            continue
-    
-    # Sort by numeric value (wavelength)
+def identify_nir_columns(df, dataset_path=None, schema_path=None):
+    """
+    Identify NIR wavelength columns in the dataframe.
+    
+    Columns whose header parses as a wavelength and whose dtype is numeric
+    are spectral; no column data is scanned. With dataset_path, the result
+    is cached next to the raw file (see src.data.columns).
+    """
+    names = list(df.columns)
+    numeric = [
+        pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+        for dtype in df.dtypes
+    ]
+    
+    if dataset_path is None:
+        return detect_spectral_columns(names, numeric, load_schema(schema_path))
+    return spectral_columns(dataset_path, names, numeric, schema_path)
+
+
+def save_splits(clean_dir, crop, groups):
+    """Create GroupKFold splits for a crop and save them as a fold id per sample."""
+    from sklearn.model_selection import GroupKFold
+    
+    gkf = GroupKFold(n_splits=5)
+    val_indices = [
+        val_idx for _, val_idx in gkf.split(np.zeros((len(groups), 1)), groups=groups)
+    ]
+    
+    return save_fold_ids(clean_dir / splits_file(crop), fold_ids_from_splits(len(groups), val_indices))
+
+
+def clean_crop(df, crop, targets, nir_cols, clean_dir, dtype='float64'):
+    """
+    Clean one crop's rows and save its features, targets, splits and wavelengths.
+    
+    Rows where every requested target is missing are dropped. With several
+    targets, the remaining rows share one X and one split manifest, and each
+    target's parquet keeps NaN where that target wasn't measured. Spectra
+    are stored as ``dtype``; medians are computed before the cast.
+    
+    Returns:
+        Summary dictionary for reporting
+    """
+    original_count = len(df)
+    df = df.dropna(subset=targets, how='all')
+    
+    # Handle missing values in NIR features
+    missing_pct = df[nir_cols].isnull().sum() / max(len(df), 1) * 100
+    
+    # Drop columns with >10% missing
+    high_missing = set(missing_pct[missing_pct > 10].index)
+    nir_cols = [col for col in nir_cols if col not in high_missing]
+    
+    # Median impute remaining missing values
+    X = df[nir_cols]
+    X = X.fillna(X.median()).astype(dtype)
+    
+    splits_path = save_splits(clean_dir, crop, df['sample_id'].to_numpy())
+    
+    X_path = clean_dir / f"{crop}__X.parquet"
+    X.to_parquet(X_path, index=False)
+    
+    target_stats = {}
+    for target in targets:
+        y = df[target]
+        y.to_frame().to_parquet(clean_dir / f"{crop}__y__{target}.parquet", index=False)
+        target_stats[target] = {
+            'samples': int(y.notna().sum()),
+            'min': float(y.min()),
+            'max': float(y.max()),
+            'mean': float(y.mean()),
+            'std': float(y.std())
+        }
+    
+    wavelengths_path = clean_dir / f"{crop}__wavelengths.json"
+    with open(wavelengths_path, 'w') as f:
+        json.dump(nir_cols, f, indent=2)
+    
+    return {
+        'crop': crop,
+        'samples': len(df),
+        'dropped_rows': original_count - len(df),
+        'dropped_cols': len(high_missing),
+        'features': len(nir_cols),
+        'targets': target_stats,
+        'X_path': X_path,
+        'splits_path': splits_path,
+        'wavelengths_path': wavelengths_path
+    }
+
+
+def crop_outputs(clean_dir, crop, targets):
+    """Files written for a crop by clean_crop."""
+    return [
+        clean_dir / f"{crop}__X.parquet",
+        *[clean_dir / f"{crop}__y__{target}.parquet" for target in targets],
+        clean_dir / splits_file(crop),
+        clean_dir / f"{crop}__wavelengths.json"
+    ]
+
+
+def manifest_path(clean_dir, crop):
+    return clean_dir / f"{crop}__manifest.json"
+
+
+def clean_params(targets, schema_path, dtype='float64'):
+    """Parameters the cleaned outputs depend on (besides the raw data)."""
+    return {
+        'targets': list(targets),
+        'schema': optional_digest(schema_path),
+        'dtype': dtype,
+        'max_missing_pct': 10,
+        'n_splits': 5,
+        'version': CLEAN_VERSION
+    }
+
+
+def clean_all_crops(df, crops, targets, nir_cols, clean_dir, workers, dtype='float64'):
+    """Clean every crop partition, in parallel across processes."""
+    partitions = [(crop, part) for crop, part in df.groupby(df['crop'].str.lower()) if crop in crops]
+    
+    pool = None
+    if workers > 1 and len(partitions) > 1:
+        pool = ProcessPoolExecutor(max_workers=min(workers, len(partitions)))
+        results = [
+            pool.submit(clean_crop, part, crop, targets, nir_cols, clean_dir, dtype).result
+            for crop, part in partitions
+        ]
+    else:
+        results = [
+            partial(clean_crop, part, crop, targets, nir_cols, clean_dir, dtype)
+            for crop, part in partitions
+        ]
+    
+    summaries = []
     try:
-        nir_cols.sort(key=lambda x: float(x))
-    except ValueError:
-        # If sorting fails, keep original order
-        pass
+        for (crop, _), result in zip(partitions, results):
+            try:
+                summary = result()
+            except ValueError as e:
+                # e.g. fewer sample groups than folds
+                print(f"⚠️  Skipped {crop}: {e}")
+                continue
+            counts = ", ".join(f"{t}={stats['samples']}" for t, stats in summary['targets'].items())
+            print(f"   {crop}: {summary['samples']} samples, {summary['features']} features ({counts})")
+            summaries.append(summary)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    
+    return summaries
+
+
+def clean_streaming(args, dataset_path):
+    """Clean a large dataset in row batches with bounded memory."""
+    from src.data.streaming import StreamingCleaner
     
-    return nir_cols
+    print(f"🌊 Streaming in batches of {args.batch_rows} rows")
+    
+    try:
+        cleaner = StreamingCleaner(dataset_path, args.crop, args.target, batch_rows=args.batch_rows,
+                                   schema_path=args.schema, dtype=args.dtype)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    
+    print(f"🔬 Found {len(cleaner.nir_cols)} NIR wavelength columns")
+    if len(cleaner.nir_cols) == 0:
+        print("❌ No NIR wavelength columns found")
+        return 1
+    
+    clean_dir = Path("data/clean")
+    clean_dir.mkdir(parents=True, exist_ok=True)
+    X_path = clean_dir / f"{args.crop}__X.parquet"
+    
+    result = cleaner.run(X_path)
+    y = pd.Series(result['y'], name=args.target)
+    nir_cols = result['nir_cols']
+    
+    print(f"🌱 Kept {len(y)} {args.crop} samples with {args.target}")
+    if len(y) == 0:
+        print(f"❌ No samples found for crop '{args.crop}'")
+        return 1
+    
+    if result['dropped_cols']:
+        print(f"⚠️  Dropped {result['dropped_cols']} NIR columns with >10% missing values")
+    print(f"✅ Handled missing values in NIR features")
+    
+    splits_path = save_splits(clean_dir, args.crop, result['sample_ids'])
+    print(f"💾 Saved splits to {splits_path}")
+    
+    y_path = clean_dir / f"{args.crop}__y__{args.target}.parquet"
+    y.to_frame().to_parquet(y_path, index=False)
+    
+    print(f"💾 Saved features to {X_path}")
+    print(f"💾 Saved target to {y_path}")
+    
+    wavelengths_path = clean_dir / f"{args.crop}__wavelengths.json"
+    with open(wavelengths_path, 'w') as f:
+        json.dump(nir_cols, f, indent=2)
+    
+    print(f"💾 Saved wavelengths to {wavelengths_path}")
+    
+    print(f"\n📈 Dataset Summary:")
+    print(f"   Crop: {args.crop}")
+    print(f"   Target: {args.target}")
+    print(f"   Samples: {len(y)}")
+    print(f"   Features: {len(nir_cols)}")
+    print(f"   Target range: {y.min():.3f} - {y.max():.3f}")
+    print(f"   Target mean: {y.mean():.3f} ± {y.std():.3f}")
+    
+    return 0
 
 
 def main():
@@ -58,10 +261,35 @@ def main():
     parser = argparse.ArgumentParser(description="Clean BI dataset for modeling")
     parser.add_argument("--crop", default="carrots", help="Crop to filter for")
     parser.add_argument("--target", default="antioxidants", help="Target variable")
+    parser.add_argument("--all", action="store_true",
+                        help="Clean every crop (or --crops) and every target (or --targets) "
+                             "in one pass over the raw dataset")
+    parser.add_argument("--crops", nargs="+", help="Crops to clean with --all (default: all)")
+    parser.add_argument("--targets", nargs="+", help="Targets to clean with --all "
+                        f"(default: those of {DEFAULT_TARGETS} present)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Processes used to clean crops in parallel with --all")
+    parser.add_argument("--schema", help="JSON file listing the spectral columns "
+                        "(or extra non-spectral ones) instead of detecting them")
+    parser.add_argument("--force", action="store_true",
+                        help="Rebuild outputs even if their inputs and parameters are unchanged")
+    parser.add_argument("--stream", action="store_true",
+                        help="Read the dataset in row batches with bounded memory (Parquet/CSV)")
+    parser.add_argument("--batch-rows", type=int, default=50_000,
+                        help="Rows per batch in streaming mode")
+    parser.add_argument("--dtype", choices=DTYPES, default="float64",
+                        help="Storage dtype of the cleaned spectra (float32 halves memory and I/O)")
     
     args = parser.parse_args()
     
-    print(f"🧹 Cleaning BI dataset for {args.crop} - {args.target}")
+    if args.all and args.stream:
+        print("❌ --all and --stream can't be combined; stream one crop/target at a time")
+        return 1
+    
+    if args.all:
+        print("🧹 Cleaning BI dataset for all crops and targets")
+    else:
+        print(f"🧹 Cleaning BI dataset for {args.crop} - {args.target}")
     
     # Look for dataset file
     data_dir = Path("data/raw")
@@ -72,6 +300,10 @@ def main():
         "averaged_dataset.parquet"
     ]
     
+    if args.stream:
+        # Only columnar/CSV files can be scanned in batches
+        dataset_files.sort(key=lambda file: not file.endswith(('.parquet', '.csv')))
+    
     dataset_path = None
     for file in dataset_files:
         if (data_dir / file).exists():
@@ -86,17 +318,36 @@ def main():
         print("\n   Run: python -m src.data.download_bi")
         return 1
     
+    # Only Excel files need openpyxl (checked without importing it)
+    if dataset_path.suffix == ".xlsx" and importlib.util.find_spec("openpyxl") is None:
+        print("❌ Missing dependency: openpyxl")
+        print("   Run: pip install openpyxl")
+        return 1
+    
+    clean_dir = Path("data/clean")
+    inputs = {'dataset': file_digest(dataset_path)}
+    
+    # Skip work whose inputs and parameters haven't changed
+    if not args.all:
+        params = clean_params([args.target], args.schema, args.dtype)
+        if not args.force and is_fresh(manifest_path(clean_dir, args.crop), inputs, params):
+            print(f"✅ {args.crop} - {args.target} is up to date (use --force to rebuild)")
+            return 0
+    
     print(f"📊 Loading dataset: {dataset_path}")
     
-    # Load dataset
-    if dataset_path.suffix == '.xlsx':
-        df = pd.read_excel(dataset_path)
-    elif dataset_path.suffix == '.csv':
-        df = pd.read_csv(dataset_path)
-    elif dataset_path.suffix == '.parquet':
-        df = pd.read_parquet(dataset_path)
-    else:
-        print(f"❌ Unsupported file format: {dataset_path.suffix}")
+    if args.stream:
+        code = clean_streaming(args, dataset_path)
+        if code == 0:
+            write_manifest(manifest_path(clean_dir, args.crop), inputs, params,
+                           crop_outputs(clean_dir, args.crop, [args.target]))
+        return code
+    
+    # Load dataset (parsed once per file content, see src.data.ingest)
+    try:
+        df = load_table(dataset_path)
+    except ValueError as e:
+        print(f"❌ {e}")
         return 1
     
     print(f"   Original shape: {df.shape}")
@@ -113,107 +364,88 @@ def main():
         print(f"   Available columns: {list(df.columns)}")
         return 1
     
-    # Check for target column
-    if args.target not in df.columns:
-        print(f"❌ Target column '{args.target}' not found")
+    # Check for target columns
+    if args.all:
+        targets = args.targets or [t for t in DEFAULT_TARGETS if t in df.columns]
+    else:
+        targets = [args.target]
+    missing_targets = [t for t in targets if t not in df.columns]
+    if missing_targets or not targets:
+        print(f"❌ Target column(s) {missing_targets or DEFAULT_TARGETS} not found")
         print(f"   Available columns: {list(df.columns)}")
         return 1
     
     # Identify NIR columns
-    nir_cols = identify_nir_columns(df)
+    try:
+        nir_cols = identify_nir_columns(df, dataset_path, args.schema)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
     print(f"🔬 Found {len(nir_cols)} NIR wavelength columns")
     
     if len(nir_cols) == 0:
         print("❌ No NIR wavelength columns found")
         return 1
     
-    # Filter by crop
-    if 'crop' in df.columns:
-        original_count = len(df)
-        df = df[df['crop'].str.lower() == args.crop.lower()]
-        print(f"🌱 Filtered to {args.crop}: {len(df)} samples (from {original_count})")
+    clean_dir.mkdir(parents=True, exist_ok=True)
+    
+    if args.all:
+        crops = [c.lower() for c in args.crops] if args.crops else sorted(df['crop'].dropna().str.lower().unique())
+        params = clean_params(targets, args.schema, args.dtype)
+        stale = [
+            crop for crop in crops
+            if args.force or not is_fresh(manifest_path(clean_dir, crop), inputs, params)
+        ]
+        if len(stale) < len(crops):
+            print(f"✅ {len(crops) - len(stale)} crops are up to date (use --force to rebuild)")
+        if not stale:
+            return 0
+        
+        print(f"🌱 Cleaning {len(stale)} crops for targets {targets} with {args.workers} workers")
         
-        if len(df) == 0:
-            print(f"❌ No samples found for crop '{args.crop}'")
-            print(f"   Available crops: {df['crop'].unique()}")
-            return 1
+        summaries = clean_all_crops(df, stale, targets, nir_cols, clean_dir, args.workers, args.dtype)
+        for summary in summaries:
+            write_manifest(manifest_path(clean_dir, summary['crop']), inputs, params,
+                           crop_outputs(clean_dir, summary['crop'], targets))
+        print(f"💾 Saved {len(summaries)} crops to {clean_dir}")
+        return 0 if summaries else 1
     
-    # Drop rows with missing target
+    # Filter by crop
     original_count = len(df)
-    df = df.dropna(subset=[args.target])
-    print(f"🎯 Dropped {original_count - len(df)} rows with missing {args.target}")
+    df = df[df['crop'].str.lower() == args.crop.lower()]
+    print(f"🌱 Filtered to {args.crop}: {len(df)} samples (from {original_count})")
     
-    # Handle missing values in NIR features
-    nir_data = df[nir_cols]
-    missing_pct = nir_data.isnull().sum() / len(nir_data) * 100
-    
-    # Drop columns with >10% missing
-    high_missing = missing_pct[missing_pct > 10].index
-    if len(high_missing) > 0:
-        print(f"⚠️  Dropping {len(high_missing)} NIR columns with >10% missing values")
-        nir_cols = [col for col in nir_cols if col not in high_missing]
-    
-    # Median impute remaining missing values
-    nir_data = df[nir_cols]
-    nir_data = nir_data.fillna(nir_data.median())
-    df[nir_cols] = nir_data
-    
-    print(f"✅ Handled missing values in NIR features")
+    if len(df) == 0:
+        print(f"❌ No samples found for crop '{args.crop}'")
+        return 1
     
-    # Create GroupKFold splits
     print("📊 Creating GroupKFold splits...")
-    gkf = GroupKFold(n_splits=5)
-    splits = []
-    
-    for fold, (train_idx, val_idx) in enumerate(gkf.split(df, df[args.target], groups=df['sample_id'])):
-        splits.append({
-            'fold': fold,
-            'train_idx': train_idx.tolist(),
-            'val_idx': val_idx.tolist()
-        })
-    
-    # Save splits manifest
-    clean_dir = Path("data/clean")
-    clean_dir.mkdir(parents=True, exist_ok=True)
-    
-    splits_df = pd.DataFrame(splits)
-    splits_df.to_csv(clean_dir / "splits.csv", index=False)
-    print(f"💾 Saved splits to {clean_dir / 'splits.csv'}")
-    
-    # Prepare features and target
-    X = df[nir_cols].copy()
-    y = df[args.target].copy()
-    
-    # Save features and target
-    X_path = clean_dir / f"{args.crop}__X.parquet"
-    y_path = clean_dir / f"{args.crop}__y__{args.target}.parquet"
-    
-    X.to_parquet(X_path, index=False)
-    y.to_parquet(y_path, index=False)
-    
-    print(f"💾 Saved features to {X_path}")
-    print(f"💾 Saved target to {y_path}")
+    summary = clean_crop(df, args.crop, targets, nir_cols, clean_dir, args.dtype)
+    write_manifest(manifest_path(clean_dir, args.crop), inputs, params,
+                   crop_outputs(clean_dir, args.crop, targets))
     
-    # Save wavelength list
-    wavelengths_path = clean_dir / f"{args.crop}__wavelengths.json"
-    with open(wavelengths_path, 'w') as f:
-        json.dump(nir_cols, f, indent=2)
+    print(f"🎯 Dropped {summary['dropped_rows']} rows with missing {args.target}")
+    if summary['dropped_cols']:
+        print(f"⚠️  Dropped {summary['dropped_cols']} NIR columns with >10% missing values")
+    print(f"✅ Handled missing values in NIR features")
     
-    print(f"💾 Saved wavelengths to {wavelengths_path}")
+    print(f"💾 Saved splits to {summary['splits_path']}")
+    print(f"💾 Saved features to {summary['X_path']}")
+    print(f"💾 Saved target to {clean_dir / f'{args.crop}__y__{args.target}.parquet'}")
+    print(f"💾 Saved wavelengths to {summary['wavelengths_path']}")
     
     # Print summary
+    stats = summary['targets'][args.target]
     print(f"\n📈 Dataset Summary:")
     print(f"   Crop: {args.crop}")
     print(f"   Target: {args.target}")
-    print(f"   Samples: {len(df)}")
-    print(f"   Features: {len(nir_cols)}")
-    print(f"   Target range: {y.min():.3f} - {y.max():.3f}")
-    print(f"   Target mean: {y.mean():.3f} ± {y.std():.3f}")
+    print(f"   Samples: {summary['samples']}")
+    print(f"   Features: {summary['features']}")
+    print(f"   Target range: {stats['min']:.3f} - {stats['max']:.3f}")
+    print(f"   Target mean: {stats['mean']:.3f} ± {stats['std']:.3f}")
     
     return 0
 
 
 if __name__ == "__main__":
     sys.exit(main())
-
-
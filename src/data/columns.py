@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Find the spectral (NIR wavelength) columns of a raw dataset.
+
+Detection only looks at column headers and dtypes, never at column data:
+a column is spectral when its header parses as a wavelength (see
+src.data.wavelengths), it isn't a known metadata/target column and its
+dtype is numeric. Spectral columns are returned sorted by wavelength.
+
+An explicit schema file can override detection::
+
+    {
+      "spectral_columns": ["1350", "1352", ...],
+      "non_spectral_columns": ["moisture_1"]
+    }
+
+``spectral_columns`` lists the spectral columns outright;
+``non_spectral_columns`` adds to the built-in exclusion list.
+
+The result is cached next to the raw file (``<file>.columns.json``),
+keyed by the file's size and modification time and by the schema.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from src.data.wavelengths import parse_wavelength
+
+
+# Columns that are never wavelengths (normalized names)
+NON_SPECTRAL_COLUMNS = ['sample_id', 'lab_id', 'crop', 'color', 'variety',
+                        'antioxidants', 'protein', 'minerals']
+
+# Bump when the detection rules change so cached results are recomputed
+DETECTION_VERSION = 1
+
+
+def normalize_name(name) -> str:
+    """Snake-case a column name."""
+    return str(name).lower().replace(' ', '_').replace('-', '_')
+
+
+def load_schema(path: Optional[Path]) -> Dict[str, List[str]]:
+    """
+    Read a column schema file.
+
+    Raises:
+        ValueError: If the file isn't a JSON object with list values
+    """
+    if path is None:
+        return {}
+    with open(path, 'r') as f:
+        schema = json.load(f)
+    if not isinstance(schema, dict) or not all(isinstance(v, list) for v in schema.values()):
+        raise ValueError(f"Schema {path} must be a JSON object of column name lists")
+    return schema
+
+
+def detect_spectral_columns(
+    names: Sequence[str],
+    numeric: Sequence[bool],
+    schema: Optional[Dict[str, List[str]]] = None
+) -> List[str]:
+    """
+    Pick the spectral columns from (normalized) column names and dtypes.
+
+    Args:
+        names: Column names
+        numeric: Whether each column has a numeric dtype
+        schema: Optional parsed schema file
+
+    Returns:
+        Spectral column names sorted by wavelength
+
+    Raises:
+        ValueError: If the schema lists spectral columns that don't exist
+    """
+    schema = schema or {}
+
+    if schema.get('spectral_columns'):
+        columns = [normalize_name(name) for name in schema['spectral_columns']]
+        missing = sorted(set(columns) - set(names))
+        if missing:
+            raise ValueError(f"Schema spectral columns not found: {missing[:5]}")
+        return columns
+
+    excluded = set(NON_SPECTRAL_COLUMNS) | {normalize_name(n) for n in schema.get('non_spectral_columns', [])}
+    columns = [
+        (wavelength, name) for name, is_numeric in zip(names, numeric)
+        if is_numeric and name not in excluded
+        for wavelength in [parse_wavelength(name)] if wavelength is not None
+    ]
+    # Stable sort keeps the original order of equal wavelengths
+    return [name for _, name in sorted(columns, key=lambda item: item[0])]
+
+
+def _fingerprint(dataset_path: Path, schema: Dict[str, List[str]]) -> Dict[str, object]:
+    stat = Path(dataset_path).stat()
+    schema_hash = hashlib.sha1(json.dumps(schema, sort_keys=True).encode()).hexdigest()
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'schema': schema_hash,
+        'version': DETECTION_VERSION
+    }
+
+
+def cache_path(dataset_path: Path) -> Path:
+    dataset_path = Path(dataset_path)
+    return dataset_path.with_name(dataset_path.name + ".columns.json")
+
+
+def spectral_columns(
+    dataset_path: Path,
+    names: Sequence[str],
+    numeric: Sequence[bool],
+    schema_path: Optional[Path] = None
+) -> List[str]:
+    """
+    Spectral columns of a raw dataset, cached alongside the file.
+
+    Args:
+        dataset_path: Raw dataset file the names/dtypes come from
+        names: Normalized column names
+        numeric: Whether each column has a numeric dtype
+        schema_path: Optional schema file
+
+    Returns:
+        Spectral column names sorted by wavelength
+    """
+    schema = load_schema(schema_path)
+    fingerprint = _fingerprint(dataset_path, schema)
+    cache = cache_path(dataset_path)
+
+    try:
+        with open(cache, 'r') as f:
+            cached = json.load(f)
+        if cached.get('fingerprint') == fingerprint and set(cached['columns']) <= set(names):
+            return cached['columns']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    columns = detect_spectral_columns(names, numeric, schema)
+
+    try:
+        with open(cache, 'w') as f:
+            json.dump({'fingerprint': fingerprint, 'columns': columns}, f)
+    except OSError:
+        # Read-only data directory; detection is cheap enough to repeat
+        pass
+
+    return columns
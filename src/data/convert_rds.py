@@ -4,10 +4,24 @@ Convert RDS files to Parquet format using pyreadr.
 
 This script converts .Rds files from the BI dataset to more accessible
 Parquet format for easier processing in Python.
+
+pyreadr can only read an R object whole, so the parsed frame is the one
+full in-memory copy: it is converted to Arrow and written one bounded row
+group at a time rather than as a second full table. Rows are ordered by
+crop so readers filtering on crop can skip row groups, spectral columns
+can be downcast to float32, and the output can be partitioned by a
+column (``crop=<value>/`` directories) so later stages read only the
+partitions they need. Several inputs are converted in parallel.
 """
 
 import argparse
+import os
+import resource
+import shutil
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 
 try:
@@ -18,53 +32,256 @@ except ImportError as e:
     print("   Run: pip install pyreadr pandas")
     sys.exit(1)
 
+import numpy as np
+
+from src.data.columns import detect_spectral_columns, normalize_name
+from src.data.ingest import file_digest, is_fresh, write_manifest
+
+
+COMPRESSIONS = ["zstd", "snappy", "gzip", "lz4", "none"]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def find_column(df, name):
+    """Column of df whose normalized name is ``name``, or None."""
+    for col in df.columns:
+        if normalize_name(col) == name:
+            return col
+    return None
+
+
+def spectral_columns_of(df):
+    """Spectral columns of df, by header and dtype (see src.data.columns)."""
+    by_name = {normalize_name(col): col for col in df.columns}
+    numeric = [
+        pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+        for dtype in df.dtypes
+    ]
+    return [by_name[name] for name in detect_spectral_columns(list(by_name), numeric)]
+
+
+def record_batches(df, order, row_group_size, schema, float32_cols):
+    """Yield Arrow record batches of at most row_group_size rows, in the given row order."""
+    import pyarrow as pa
+
+    for start in range(0, len(order), row_group_size):
+        chunk = df.iloc[order[start:start + row_group_size]]
+        if float32_cols:
+            chunk = chunk.astype({col: np.float32 for col in float32_cols})
+        yield pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False)
+
+
+def convert(input_path, output_path, compression="zstd", row_group_size=50_000,
+            float32=False, partition_by=None, sort_by="crop", force=False):
+    """
+    Convert one .Rds file to Parquet.
+
+    Args:
+        input_path: .Rds file
+        output_path: Parquet file, or directory when partitioning
+        compression: Parquet compression codec
+        row_group_size: Rows per row group
+        float32: Downcast spectral columns to float32
+        partition_by: Column to partition the output by (e.g. ``crop``)
+        sort_by: Column to order rows by when it exists
+        force: Convert even if the output is up to date
+
+    Returns:
+        Dictionary of conversion statistics
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    input_path, output_path = Path(input_path), Path(output_path)
+    params = {
+        'compression': compression,
+        'row_group_size': row_group_size,
+        'float32': float32,
+        'partition_by': partition_by,
+        'sort_by': sort_by
+    }
+
+    # Skip the conversion when the output was built from identical input
+    inputs = {'rds': file_digest(input_path)}
+    manifest = output_path.with_name(output_path.name + ".manifest.json")
+    if not force and is_fresh(manifest, inputs, params):
+        return {'input': str(input_path), 'output': str(output_path), 'skipped': True}
+
+    start = time.perf_counter()
+
+    # Read RDS file and get the first (and usually only) dataframe
+    df = next(iter(pyreadr.read_r(input_path).values()))
+
+    float32_cols = spectral_columns_of(df) if float32 else []
+
+    # Order rows by the partition/sort column so row groups are homogeneous
+    key = find_column(df, normalize_name(partition_by or sort_by or ""))
+    if partition_by and key is None:
+        raise ValueError(f"Partition column '{partition_by}' not found")
+    if key is not None:
+        order = np.argsort(df[key].astype(str).to_numpy(), kind="stable")
+    else:
+        order = np.arange(len(df))
+
+    schema = pa.Schema.from_pandas(
+        df.iloc[:0].astype({col: np.float32 for col in float32_cols}), preserve_index=False
+    )
+    batches = record_batches(df, order, row_group_size, schema, float32_cols)
+    codec = None if compression == "none" else compression
+
+    # Write next to the destination, then swap it in
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(f".{output_path.name}.{os.getpid()}.tmp")
+
+    if partition_by:
+        file_format = ds.ParquetFileFormat()
+        ds.write_dataset(
+            batches,
+            tmp_path,
+            schema=schema,
+            format=file_format,
+            file_options=file_format.make_write_options(compression=codec),
+            partitioning=[key],
+            partitioning_flavor="hive",
+            min_rows_per_group=row_group_size,
+            max_rows_per_group=row_group_size,
+            existing_data_behavior="delete_matching"
+        )
+    else:
+        with pq.ParquetWriter(tmp_path, schema, compression=codec or "none") as writer:
+            for batch in batches:
+                writer.write_batch(batch, row_group_size=row_group_size)
+
+    # A directory can't be replaced in one step: move the old output aside
+    # so the path always holds a complete dataset, then remove it
+    old_path = None
+    if output_path.exists():
+        old_path = output_path.with_name(f".{output_path.name}.{os.getpid()}.old")
+        os.replace(output_path, old_path)
+    try:
+        os.replace(tmp_path, output_path)
+    except OSError:
+        if old_path is not None:
+            os.replace(old_path, output_path)
+        raise
+    if old_path is not None:
+        if old_path.is_dir():
+            shutil.rmtree(old_path)
+        else:
+            old_path.unlink()
+    write_manifest(manifest, inputs, params, [output_path])
+
+    seconds = time.perf_counter() - start
+    input_mb = input_path.stat().st_size / 1e6
+    return {
+        'input': str(input_path),
+        'output': str(output_path),
+        'skipped': False,
+        'rows': len(df),
+        'columns': len(df.columns),
+        'float32_columns': len(float32_cols),
+        'seconds': seconds,
+        'rows_per_s': len(df) / seconds if seconds else 0.0,
+        'input_mb_per_s': input_mb / seconds if seconds else 0.0,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
 
 def main():
-    """Convert RDS file to Parquet format."""
-    parser = argparse.ArgumentParser(description="Convert RDS file to Parquet")
-    parser.add_argument("--in", dest="input_file", required=True,
-                       help="Input RDS file path")
+    """Convert RDS files to Parquet format."""
+    parser = argparse.ArgumentParser(description="Convert RDS files to Parquet")
+    parser.add_argument("--in", dest="input_files", nargs="+", required=True,
+                       help="Input RDS file path(s)")
     parser.add_argument("--out", dest="output_file", required=True,
-                       help="Output Parquet file path")
+                       help="Output Parquet file path (a directory for several inputs)")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default="zstd",
+                       help="Parquet compression codec")
+    parser.add_argument("--row-group-size", type=int, default=50_000,
+                       help="Rows per Parquet row group")
+    parser.add_argument("--float32", action="store_true",
+                       help="Store spectral columns as float32")
+    parser.add_argument("--partition-by",
+                       help="Write a directory partitioned by this column (e.g. crop)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                       help="Inputs converted in parallel")
+    parser.add_argument("--force", action="store_true",
+                       help="Convert even if the input hasn't changed since the last run")
     
     args = parser.parse_args()
     
-    input_path = Path(args.input_file)
+    input_paths = [Path(path) for path in args.input_files]
     output_path = Path(args.output_file)
     
-    # Check if input file exists
-    if not input_path.exists():
-        print(f"⚠️  Input file not found: {input_path}")
+    # Check if input files exist
+    missing = [path for path in input_paths if not path.exists()]
+    for path in missing:
+        print(f"⚠️  Input file not found: {path}")
+    if missing:
         print("   This is normal if you haven't downloaded siware_scans.Rds yet")
+    input_paths = [path for path in input_paths if path.exists()]
+    if not input_paths:
         return 0
     
-    print(f"🔄 Converting {input_path} to {output_path}")
+    if len(args.input_files) > 1:
+        output_paths = [output_path / f"{path.stem}.parquet" for path in input_paths]
+    else:
+        output_paths = [output_path]
+    
+    options = dict(
+        compression=args.compression,
+        row_group_size=args.row_group_size,
+        float32=args.float32,
+        partition_by=args.partition_by,
+        force=args.force
+    )
+    
+    for input_path, out in zip(input_paths, output_paths):
+        print(f"🔄 Converting {input_path} to {out}")
     
+    workers = min(args.workers, len(input_paths))
+    jobs = list(zip(input_paths, output_paths))
+    
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = [pool.submit(convert, input_path, out, **options).result for input_path, out in jobs]
+    else:
+        results = [partial(convert, input_path, out, **options) for input_path, out in jobs]
+    
+    failed = 0
     try:
-        # Read RDS file
-        result = pyreadr.read_r(input_path)
-        
-        # Get the first (and usually only) dataframe
-        df = list(result.values())[0]
-        
-        # Create output directory if needed
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        # Save as Parquet
-        df.to_parquet(output_path, index=False)
-        
-        print(f"✅ Successfully converted to {output_path}")
-        print(f"   Shape: {df.shape}")
-        print(f"   Columns: {list(df.columns)[:5]}...")  # Show first 5 columns
-        
-    except Exception as e:
-        print(f"❌ Error converting file: {e}")
-        return 1
+        for input_path, result in zip(input_paths, results):
+            try:
+                stats = result()
+            except Exception as e:
+                print(f"❌ Error converting {input_path}: {e}")
+                failed += 1
+                continue
+            
+            if stats['skipped']:
+                print(f"✅ {stats['output']} is up to date (use --force to convert again)")
+                continue
+            
+            print(f"✅ Successfully converted to {stats['output']}")
+            print(f"   Shape: ({stats['rows']}, {stats['columns']})"
+                  + (f", {stats['float32_columns']} spectral columns as float32"
+                     if stats['float32_columns'] else ""))
+            print(f"   Throughput: {stats['rows_per_s']:,.0f} rows/s, "
+                  f"{stats['input_mb_per_s']:.1f} MB/s in {stats['seconds']:.1f}s")
+            print(f"   Peak memory: {stats['peak_rss_mb']:.0f} MB")
+    finally:
+        if pool is not None:
+            pool.shutdown()
     
-    return 0
+    return 1 if failed else 0
 
 
 if __name__ == "__main__":
     sys.exit(main())
-
-
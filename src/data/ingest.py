@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Content-addressed ingest cache for raw datasets.
+
+Parsing ``averaged_dataset.xlsx`` or an ``.Rds`` export takes far longer
+than reading the same table from Parquet. ``load_table`` hashes the raw
+file (SHA-256 of its contents) and keeps the parsed, typed DataFrame as
+``data/interim/cache/{digest}.parquet``, so unchanged inputs are parsed
+once. Digests are remembered per path, size and mtime, so a file is only
+re-hashed after it changes.
+
+Build manifests record the input digests and parameters a step's outputs
+were built from; ``is_fresh`` tells whether they can be reused.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import pandas as pd
+
+
+CACHE_DIR = Path("data/interim/cache")
+
+# File types that are parsed into the cache (Parquet is read directly)
+CACHED_SUFFIXES = ('.xlsx', '.xls', '.csv', '.rds')
+
+
+def _write_json_atomic(path: Path, data) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def file_digest(path: Path, cache_dir: Path = CACHE_DIR) -> str:
+    """
+    SHA-256 of a file's contents, reusing the stored digest while the
+    file's size and mtime are unchanged.
+    """
+    path = Path(path)
+    stat = path.stat()
+    index_path = Path(cache_dir) / "digests.json"
+
+    try:
+        with open(index_path, 'r') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+
+    key = str(path.resolve())
+    entry = index.get(key)
+    if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+        return entry['sha256']
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    digest = sha.hexdigest()
+
+    index[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest}
+    try:
+        _write_json_atomic(index_path, index)
+    except OSError:
+        pass
+    return digest
+
+
+def parse_table(path: Path) -> pd.DataFrame:
+    """Parse a raw .xlsx/.csv/.parquet/.Rds table."""
+    path = Path(path)
+    suffix = path.suffix.lower()
+
+    if suffix in ('.xlsx', '.xls'):
+        return pd.read_excel(path)
+    if suffix == '.csv':
+        return pd.read_csv(path)
+    if suffix == '.parquet':
+        return pd.read_parquet(path)
+    if suffix == '.rds':
+        import pyreadr
+        return next(iter(pyreadr.read_r(path).values()))
+
+    raise ValueError(f"Unsupported file format: {path.suffix}")
+
+
+def load_table(path: Path, cache_dir: Path = CACHE_DIR, use_cache: bool = True) -> pd.DataFrame:
+    """
+    Load a raw table, parsing it at most once per distinct file content.
+
+    Args:
+        path: Raw .xlsx/.csv/.parquet/.Rds file
+        cache_dir: Directory of the parsed Parquet cache
+        use_cache: Set to False to always parse the file
+
+    Returns:
+        Parsed DataFrame (column names are strings)
+    """
+    path = Path(path)
+    if not use_cache or path.suffix.lower() not in CACHED_SUFFIXES:
+        return parse_table(path)
+
+    cached = Path(cache_dir) / f"{file_digest(path, cache_dir)}.parquet"
+    if cached.exists():
+        return pd.read_parquet(cached)
+
+    df = parse_table(path)
+    # Parquet needs string column names (Excel yields ints for wavelength headers)
+    df.columns = [str(col) for col in df.columns]
+
+    cached.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cached.with_name(f".{cached.name}.{os.getpid()}.tmp")
+    try:
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, cached)
+    except (OSError, ValueError, TypeError) as e:
+        # Mixed-type object columns can't always be stored; parse again next time
+        tmp.unlink(missing_ok=True)
+        print(f"⚠️  Could not cache parsed {path.name}: {e}")
+    return df
+
+
+def params_digest(params: Dict[str, object]) -> str:
+    """Stable digest of a JSON-serializable parameter dictionary."""
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def is_fresh(manifest_path: Path, inputs: Dict[str, str], params: Dict[str, object]) -> bool:
+    """
+    Whether a manifest's outputs were built from these inputs and params and still exist.
+
+    Args:
+        manifest_path: Manifest written by write_manifest
+        inputs: Input name -> content digest
+        params: Parameters of the build step
+    """
+    try:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+
+    return (
+        manifest.get('inputs') == inputs
+        and manifest.get('params') == params_digest(params)
+        and all(Path(output).exists() for output in manifest.get('outputs', []))
+    )
+
+
+def write_manifest(manifest_path: Path, inputs: Dict[str, str], params: Dict[str, object],
+                   outputs: Iterable[Path]) -> None:
+    """Record the inputs and params a step's outputs were built from."""
+    _write_json_atomic(Path(manifest_path), {
+        'inputs': inputs,
+        'params': params_digest(params),
+        'outputs': [str(output) for output in outputs]
+    })
+
+
+def optional_digest(path: Optional[Path]) -> Optional[str]:
+    """Content digest of an optional input file."""
+    return file_digest(path) if path else None
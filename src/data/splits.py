@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Cross-validation split manifests.
+
+Splits are stored per crop as one fold id per sample in
+``{crop}__splits.npy`` (an int8 NumPy array; -1 marks samples held out
+of every fold). That is O(n) regardless of the number of folds, loads
+memory-mapped without parsing, and each fold's index arrays come
+straight from ``np.flatnonzero``. Because fold ids are per sample, the
+folds of any subset of rows (e.g. the rows where one target is present)
+are just the fold ids of that subset.
+
+Datasets cleaned before fold ids have a shared ``splits.csv`` with
+stringified ``train_idx``/``val_idx`` lists per fold; it is still read.
+"""
+
+import json
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+SPLITS_FILE = "splits.npy"
+LEGACY_SPLITS_FILE = "splits.csv"
+
+Fold = Tuple[np.ndarray, np.ndarray]
+
+
+def fold_ids_from_splits(n_samples: int, val_indices) -> np.ndarray:
+    """
+    Build the per-sample fold id array from each fold's validation indices.
+
+    Args:
+        n_samples: Number of samples in the dataset
+        val_indices: Validation index array of each fold, in fold order
+
+    Returns:
+        int8 array of shape (n_samples,) holding each sample's fold, or -1
+    """
+    fold_ids = np.full(n_samples, -1, dtype=np.int8)
+    for fold, val_idx in enumerate(val_indices):
+        fold_ids[np.asarray(val_idx, dtype=np.intp)] = fold
+    return fold_ids
+
+
+def save_fold_ids(path: Path, fold_ids: np.ndarray) -> Path:
+    """Save a fold id array as ``.npy``."""
+    path = Path(path)
+    np.save(path, np.asarray(fold_ids, dtype=np.int8))
+    return path
+
+
+def folds_from_ids(fold_ids: np.ndarray) -> List[Fold]:
+    """Turn a fold id array into (train_idx, val_idx) index arrays per fold."""
+    fold_ids = np.asarray(fold_ids)
+    assigned = fold_ids >= 0
+    n_folds = int(fold_ids.max()) + 1 if assigned.any() else 0
+    return [
+        (np.flatnonzero(assigned & (fold_ids != fold)), np.flatnonzero(fold_ids == fold))
+        for fold in range(n_folds)
+    ]
+
+
+def splits_file(crop: str) -> str:
+    """File name of a crop's split manifest."""
+    return f"{crop}__{SPLITS_FILE}"
+
+
+def splits_path(clean_dir: Path, crop: Optional[str] = None) -> Optional[Path]:
+    """Locate the split manifest for a crop, falling back to the shared legacy ``splits.csv``."""
+    names = [LEGACY_SPLITS_FILE]
+    if crop is not None:
+        names.insert(0, splits_file(crop))
+    for name in names:
+        path = Path(clean_dir) / name
+        if path.exists():
+            return path
+    return None
+
+
+def _read_legacy_folds(path: Path) -> List[Fold]:
+    import pandas as pd
+
+    folds = []
+    for _, fold_data in pd.read_csv(path).iterrows():
+        indices = []
+        for column in ('train_idx', 'val_idx'):
+            idx = fold_data[column]
+            if isinstance(idx, str):
+                idx = json.loads(idx)
+            indices.append(np.asarray(idx, dtype=int))
+        folds.append(tuple(indices))
+    return folds
+
+
+def load_fold_ids(path: Path) -> np.ndarray:
+    """Load the per-sample fold ids of a manifest (memory-mapped for ``.npy``)."""
+    path = Path(path)
+    if path.suffix == ".csv":
+        folds = _read_legacy_folds(path)
+        n_samples = max((int(idx.max()) + 1 for fold in folds for idx in fold if len(idx)), default=0)
+        return fold_ids_from_splits(n_samples, [val_idx for _, val_idx in folds])
+    return np.load(path, mmap_mode='r')
+
+
+def load_folds(path: Path, mask: Optional[np.ndarray] = None) -> List[Fold]:
+    """
+    Load (train_idx, val_idx) index arrays for each fold of a manifest.
+
+    Args:
+        path: ``{crop}__splits.npy``, or a legacy ``splits.csv``
+        mask: Optional boolean row mask; the folds then index the selected
+            rows only (e.g. the rows where a target is present)
+
+    Returns:
+        List of (train_idx, val_idx) tuples in fold order
+    """
+    path = Path(path)
+    if mask is None and path.suffix == ".csv":
+        return _read_legacy_folds(path)
+
+    fold_ids = load_fold_ids(path)
+    if mask is not None:
+        mask = np.asarray(mask, dtype=bool)
+        if len(mask) != len(fold_ids):
+            raise ValueError(f"Split manifest has {len(fold_ids)} samples, mask has {len(mask)}")
+        fold_ids = fold_ids[mask]
+    return folds_from_ids(fold_ids)
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Streaming, bounded-memory cleaning for large scan exports.
+
+The in-memory cleaner in src.data.clean_bi loads the whole dataset into
+one DataFrame. This module produces the same outputs by scanning a
+Parquet or CSV file in row batches with pyarrow.dataset, with the crop
+filter and the target-not-null filter pushed down to the reader:
+
+1. Per-wavelength missing counts and value ranges, plus the (small)
+   target and sample_id columns needed for the splits.
+2. Per-wavelength histograms of the columns that need imputing.
+3. The values inside each column's median bin, which pins the exact
+   median (the same value pandas computes). A bin holding too many
+   values is histogrammed again over its own range instead.
+4. Imputed batches written to ``{crop}__X.parquet`` incrementally.
+
+Peak memory depends on the batch size, not on the input size.
+"""
+
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from src.data.columns import normalize_name, spectral_columns
+
+
+HISTOGRAM_BINS = 4096
+# Values per middle rank held in memory by the exact-median scan
+MEDIAN_BUFFER = HISTOGRAM_BINS
+
+
+def open_dataset(path: Path):
+    """
+    Open a Parquet or CSV file, or a hive-partitioned Parquet directory
+    (see src.data.convert_rds --partition-by), as a pyarrow dataset.
+    """
+    import pyarrow.dataset as ds
+
+    if path.is_dir() or path.suffix == '.parquet':
+        # Without pre-buffering, pyarrow reads column chunks through a small
+        # buffer instead of holding whole row groups of raw pages in memory
+        file_format = ds.ParquetFileFormat(
+            default_fragment_scan_options=ds.ParquetFragmentScanOptions(
+                pre_buffer=False, use_buffered_stream=True, buffer_size=1 << 20
+            )
+        )
+    elif path.suffix == '.csv':
+        file_format = 'csv'
+    else:
+        raise ValueError(
+            f"Streaming supports .parquet and .csv inputs, not {path.suffix} "
+            "(convert .Rds with src.data.convert_rds first)"
+        )
+    return ds.dataset(str(path), format=file_format,
+                      partitioning='hive' if path.is_dir() else None)
+
+
+class StreamingCleaner:
+    """
+    Clean one crop/target of a large dataset in row batches.
+
+    Args:
+        dataset_path: Parquet or CSV file
+        crop: Crop to keep (case-insensitive)
+        target: Target column (normalized name)
+        batch_rows: Rows per scanned batch
+        max_missing_pct: Wavelength columns missing more than this are dropped
+        schema_path: Optional column schema file (see src.data.columns)
+        dtype: Storage dtype of the written spectra
+    """
+
+    def __init__(self, dataset_path: Path, crop: str, target: str,
+                 batch_rows: int = 50_000, max_missing_pct: float = 10.0,
+                 schema_path: Optional[Path] = None, dtype: str = 'float64'):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+
+        self.dataset = open_dataset(Path(dataset_path))
+        self.batch_rows = batch_rows
+        self.max_missing_pct = max_missing_pct
+        self.dtype = np.dtype(dtype)
+
+        schema = self.dataset.schema
+        self.raw_names = {normalize_name(name): name for name in schema.names}
+        for required in ('sample_id', 'crop', target):
+            if required not in self.raw_names:
+                raise ValueError(f"Column '{required}' not found; available: {sorted(self.raw_names)}")
+
+        self.target = target
+        numeric = [pa.types.is_floating(field.type) or pa.types.is_integer(field.type)
+                   for field in schema]
+        self.nir_cols = [
+            self.raw_names[name] for name in spectral_columns(
+                dataset_path, [normalize_name(name) for name in schema.names], numeric, schema_path
+            )
+        ]
+
+        target_field = ds.field(self.raw_names[target])
+        self.filter = (pc.utf8_lower(ds.field(self.raw_names['crop'])) == crop.lower()) \
+            & target_field.is_valid()
+        if pa.types.is_floating(schema.field(self.raw_names[target]).type):
+            self.filter = self.filter & ~pc.is_nan(target_field)
+
+    def batches(self, columns: List[str]) -> Iterator:
+        """Scan the filtered rows of the given columns in order."""
+        scanner = self.dataset.scanner(
+            columns=columns,
+            filter=self.filter,
+            batch_size=self.batch_rows,
+            batch_readahead=1,
+            fragment_readahead=1
+        )
+        for batch in scanner.to_batches():
+            if batch.num_rows:
+                yield batch
+
+    def spectra(self, columns: List[str]) -> Iterator[np.ndarray]:
+        """Scan filtered spectra as float64 arrays of shape (rows, len(columns))."""
+        for batch in self.batches(columns):
+            yield np.column_stack([
+                batch.column(i).to_numpy(zero_copy_only=False).astype(float, copy=False)
+                for i in range(len(columns))
+            ])
+
+    def scan_stats(self) -> Dict[str, np.ndarray]:
+        """Pass 1: missing counts, ranges, target values and sample ids."""
+        columns = [self.raw_names['sample_id'], self.raw_names[self.target]] + self.nir_cols
+        n_nir = len(self.nir_cols)
+
+        missing = np.zeros(n_nir, dtype=np.int64)
+        lo = np.full(n_nir, np.inf)
+        hi = np.full(n_nir, -np.inf)
+        sample_ids, targets = [], []
+
+        for batch in self.batches(columns):
+            sample_ids.append(batch.column(0).to_numpy(zero_copy_only=False))
+            targets.append(batch.column(1).to_numpy(zero_copy_only=False).astype(float))
+            X = np.column_stack([
+                batch.column(i).to_numpy(zero_copy_only=False).astype(float, copy=False)
+                for i in range(2, len(columns))
+            ]) if n_nir else np.empty((batch.num_rows, 0))
+
+            nan = np.isnan(X)
+            missing += nan.sum(axis=0)
+            if (~nan).any():
+                with np.errstate(invalid='ignore'):
+                    lo = np.fmin(lo, np.nanmin(np.where(nan, np.inf, X), axis=0))
+                    hi = np.fmax(hi, np.nanmax(np.where(nan, -np.inf, X), axis=0))
+
+        return {
+            'missing': missing,
+            'lo': lo,
+            'hi': hi,
+            'sample_ids': np.concatenate(sample_ids) if sample_ids else np.array([]),
+            'y': np.concatenate(targets) if targets else np.array([])
+        }
+
+    def _bins(self, X: np.ndarray, lo: np.ndarray, width: np.ndarray) -> np.ndarray:
+        bins = np.floor((X - lo) / width).astype(np.int64, copy=False)
+        return np.clip(bins, 0, HISTOGRAM_BINS - 1)
+
+    def _scan_windows(self, columns: List[str], sel_col: np.ndarray, w_lo: np.ndarray,
+                      w_hi: np.ndarray, collect: np.ndarray):
+        """
+        One scan for a set of rank selections, each a value window
+        ``[w_lo, w_hi]`` of column ``sel_col``: the number of values below
+        each window, the range of the values inside it, and either their
+        histogram or (where ``collect``) the values themselves.
+        """
+        n_sel = len(sel_col)
+        width = np.where(w_hi > w_lo, (w_hi - w_lo) / HISTOGRAM_BINS, 1.0)
+        offsets = np.arange(n_sel) * HISTOGRAM_BINS
+
+        histogram = np.zeros(n_sel * HISTOGRAM_BINS, dtype=np.int64)
+        below = np.zeros(n_sel, dtype=np.int64)
+        w_min = np.full(n_sel, np.inf)
+        w_max = np.full(n_sel, -np.inf)
+        values: List[List[np.ndarray]] = [[] for _ in range(n_sel)]
+
+        for X in self.spectra(columns):
+            X = X[:, sel_col]
+            # NaN compares False, so missing values are in no window
+            with np.errstate(invalid='ignore'):
+                below += (X < w_lo).sum(axis=0)
+                inside = (X >= w_lo) & (X <= w_hi)
+            if not inside.any():
+                continue
+            w_min = np.fmin(w_min, np.where(inside, X, np.inf).min(axis=0))
+            w_max = np.fmax(w_max, np.where(inside, X, -np.inf).max(axis=0))
+
+            binned = inside & ~collect
+            if binned.any():
+                bins = self._bins(np.where(binned, X, w_lo), w_lo, width) + offsets
+                histogram += np.bincount(bins[binned], minlength=histogram.size)
+            for s in np.flatnonzero((inside & collect).any(axis=0)):
+                values[s].append(X[inside[:, s], s])
+
+        return below, histogram.reshape(n_sel, HISTOGRAM_BINS), w_min, w_max, values
+
+    def medians(self, columns: List[str], counts: np.ndarray,
+                lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+        """
+        Passes 2 and 3 (and more for clustered columns): exact medians of the non-missing values of columns.
+
+        Each middle rank is searched in a window of its column's values: a
+        histogram of the window locates the bin holding the rank, and the
+        window narrows to that bin (plus one bin of slack each side) until
+        it holds at most MEDIAN_BUFFER values, which a last scan collects,
+        or a single repeated value. Clustered or low-cardinality columns
+        cost extra scans rather than memory.
+        """
+        counts = np.asarray(counts, dtype=np.int64)
+        measured = np.flatnonzero(counts > 0)
+
+        # One selection per 0-based middle rank (the two are equal for odd counts)
+        sel_col = np.repeat(measured, 2)
+        rank = np.column_stack([(counts[measured] - 1) // 2, counts[measured] // 2]).reshape(-1)
+        w_lo = np.asarray(lo, dtype=float)[sel_col]
+        w_hi = np.asarray(hi, dtype=float)[sel_col]
+        # Values in each window (estimated from the histogram once narrowed)
+        inside = counts[sel_col]
+        value = np.full(len(sel_col), np.nan)
+        todo = np.ones(len(sel_col), dtype=bool)
+
+        while todo.any():
+            active = np.flatnonzero(todo)
+            read = np.unique(sel_col[active])
+            collect = inside[active] <= MEDIAN_BUFFER
+            below, histogram, w_min, w_max, values = self._scan_windows(
+                [columns[j] for j in read], np.searchsorted(read, sel_col[active]),
+                w_lo[active], w_hi[active], collect
+            )
+            local = rank[active] - below
+
+            for i, s in enumerate(active):
+                if collect[i]:
+                    value[s] = np.sort(np.concatenate(values[i]))[local[i]]
+                elif w_min[i] == w_max[i]:
+                    value[s] = w_min[i]
+                else:
+                    width = (w_hi[s] - w_lo[s]) / HISTOGRAM_BINS
+                    cumulative = np.cumsum(histogram[i])
+                    b = int(np.searchsorted(cumulative, local[i], side='right'))
+                    first, last = max(b - 1, 0), min(b + 2, HISTOGRAM_BINS)
+                    # Outer edges stay exact; values past them were never in the window
+                    start, stop = w_lo[s], w_hi[s]
+                    if first > 0:
+                        start = w_lo[s] + first * width
+                    if last < HISTOGRAM_BINS:
+                        stop = w_lo[s] + last * width
+                    w_lo[s], w_hi[s] = max(start, w_min[i]), min(stop, w_max[i])
+                    inside[s] = cumulative[last - 1] - (cumulative[first - 1] if first else 0)
+                    continue
+                todo[s] = False
+
+        medians = np.full(len(columns), np.nan)
+        medians[measured] = value.reshape(-1, 2).mean(axis=1)
+        return medians
+
+    def write(self, X_path: Path, columns: List[str], fill: np.ndarray) -> int:
+        """Pass 4: write imputed spectra to Parquet batch by batch."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([(normalize_name(name), pa.from_numpy_dtype(self.dtype)) for name in columns])
+        rows = 0
+        with pq.ParquetWriter(X_path, schema) as writer:
+            for X in self.spectra(columns):
+                X = np.where(np.isnan(X), fill, X).astype(self.dtype, copy=False)
+                writer.write_table(pa.Table.from_arrays(list(X.T), schema=schema))
+                rows += len(X)
+            if rows == 0:
+                writer.write_table(schema.empty_table())
+        return rows
+
+    def run(self, X_path: Path) -> Dict[str, object]:
+        """
+        Clean the dataset and write the spectra to ``X_path``.
+
+        Returns:
+            Dictionary with the kept ``nir_cols`` (normalized names), the number of
+            ``dropped_cols``, the target values ``y`` and ``sample_ids``
+        """
+        stats = self.scan_stats()
+        n_rows = len(stats['y'])
+        if n_rows == 0:
+            return {'nir_cols': [normalize_name(col) for col in self.nir_cols], 'dropped_cols': 0,
+                    'y': stats['y'], 'sample_ids': stats['sample_ids']}
+
+        missing_pct = stats['missing'] / n_rows * 100
+        keep = missing_pct <= self.max_missing_pct
+        nir_cols = [col for col, k in zip(self.nir_cols, keep) if k]
+
+        fill = np.zeros(len(nir_cols))
+        impute = (stats['missing'][keep] > 0)
+        if impute.any():
+            columns = [col for col, i in zip(nir_cols, impute) if i]
+            fill[impute] = self.medians(
+                columns,
+                n_rows - stats['missing'][keep][impute],
+                stats['lo'][keep][impute],
+                stats['hi'][keep][impute]
+            )
+
+        self.write(X_path, nir_cols, fill)
+
+        return {
+            'nir_cols': [normalize_name(col) for col in nir_cols],
+            'dropped_cols': int((~keep).sum()),
+            'y': stats['y'],
+            'sample_ids': stats['sample_ids']
+        }
+
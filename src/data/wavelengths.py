@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Parse wavelength values from spectral column names.
+
+Spectral columns are named after their wavelength, optionally with a
+prefix or unit, e.g. ``1350``, ``1350.5``, ``x1350``, ``nm_1350`` or
+``1350nm``.
+"""
+
+import re
+from typing import Iterable, Optional
+
+import numpy as np
+
+
+WAVELENGTH_PATTERN = re.compile(
+    r'^(?:x|nm|wl|wavelength)?[_\s]?(\d+(?:\.\d+)?)[_\s]?(?:nm)?$',
+    re.IGNORECASE
+)
+
+
+def parse_wavelength(name) -> Optional[float]:
+    """Return the wavelength encoded in a column name, or None."""
+    if isinstance(name, (int, float, np.integer, np.floating)):
+        return float(name)
+    match = WAVELENGTH_PATTERN.match(str(name).strip())
+    return float(match.group(1)) if match else None
+
+
+def wavelength_axis(names: Iterable) -> np.ndarray:
+    """
+    Convert a list of wavelength column names to a numeric axis.
+
+    Raises:
+        ValueError: If any name doesn't encode a wavelength
+    """
+    values = [parse_wavelength(name) for name in names]
+    bad = [name for name, value in zip(names, values) if value is None]
+    if bad:
+        raise ValueError(f"Could not parse wavelengths from column names: {bad[:5]}")
+    return np.asarray(values, dtype=float)
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Applicability-domain statistics for PLS models.
+
+A spectrum outside the calibration domain (dirty lens, wrong crop, a
+different instrument) gets a prediction anyway, so every prediction is
+accompanied by the two classical PLS monitoring statistics:
+
+- Hotelling's T², the distance of the spectrum's PLS scores from the
+  centre of the training scores: ``T² = t S^-1 t'`` with ``S`` the
+  covariance of the training scores.
+- The Q residual (squared prediction error), the part of the
+  preprocessed spectrum the PLS loadings don't reconstruct:
+  ``Q = ||z - z_hat||²`` with ``z_hat`` rebuilt from the scores.
+
+Limits are computed at training time: T² from the F distribution for a
+new observation, Q from Box's scaled chi-squared approximation of the
+training residuals.
+
+Q is expanded as ``||d||² - 2 t·(d L') + t (L L') t'`` with ``d`` the
+centred preprocessed spectrum and ``L`` the loadings. ``d L'`` is an
+affine map of the raw spectrum, stacked next to the prediction
+coefficients, so only ``||d||²`` needs an element-wise pass over the
+spectrum and the residual itself is never reconstructed. (Expanding
+``||d||²`` in the raw spectrum too would cancel large terms and lose
+float32 models most of their precision.)
+
+For models with spectral preprocessing (see src.models.preprocessing),
+"raw" spectra here are the preprocessed spectra the scaler receives.
+"""
+
+import warnings
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from src.models.preprocessing import split_preprocessing
+
+
+# Confidence level of the T² and Q limits
+DEFAULT_LEVEL = 0.95
+
+# Prefix of the domain arrays inside a fused ``.npz`` artifact
+ARRAY_PREFIX = "domain_"
+
+
+def _probe(fn: Any, probes: np.ndarray) -> np.ndarray:
+    with warnings.catch_warnings():
+        # Models fitted on DataFrames warn about missing feature names
+        warnings.simplefilter("ignore", UserWarning)
+        return np.asarray(fn(probes), dtype=float).reshape(len(probes), -1)
+
+
+def preprocessing_transform(model: Any, n_features: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Element-wise affine map ``z = x * scale + offset`` of the steps before PLS.
+
+    Probed from the pipeline's pre-PLS steps after any spectral
+    preprocessing (a StandardScaler), with the offset the transform of the
+    origin and the scale the response to a spectrum of ones.
+    """
+    _, affine = split_preprocessing(model)
+    response = _probe(affine[:-1].transform, np.vstack([np.zeros(n_features), np.ones(n_features)]))
+    return response[1] - response[0], response[0]
+
+
+def reconstruction_transform(model: Any, n_components: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Affine map ``z_hat = t @ loadings + mean`` from PLS scores back to
+    the preprocessed spectrum, probed from the PLS step's inverse_transform.
+
+    Returns:
+        Tuple of (loadings of shape (n_components, n_features), mean)
+    """
+    response = _probe(model[-1].inverse_transform,
+                      np.vstack([np.zeros((1, n_components)), np.eye(n_components)]))
+    return response[1:] - response[0], response[0]
+
+
+class DomainLimits:
+    """
+    Hotelling T² and Q residual statistics and their limits.
+
+    Args:
+        scale: Element-wise scale of the raw spectrum (n_features,)
+        center: Offset such that ``d = x * scale + center`` is the centred
+            preprocessed spectrum (n_features,)
+        projection_weights: Raw spectrum to ``d L'`` weights (n_features, n_components)
+        projection_offset: Offset of ``d L'`` (n_components,)
+        loading_gram: ``L L'`` (n_components, n_components)
+        score_precision: Inverse covariance of the training scores
+        t2_limit: Hotelling T² limit
+        q_limit: Q residual limit
+        level: Confidence level of the limits
+    """
+
+    def __init__(self, scale: np.ndarray, center: np.ndarray, projection_weights: np.ndarray,
+                 projection_offset: np.ndarray, loading_gram: np.ndarray,
+                 score_precision: np.ndarray, t2_limit: float, q_limit: float, level: float):
+        self.scale = np.asarray(scale).reshape(-1)
+        self.center = np.asarray(center).reshape(-1)
+        self.projection_weights = np.asarray(projection_weights)
+        self.projection_offset = np.asarray(projection_offset).reshape(-1)
+        self.loading_gram = np.asarray(loading_gram, dtype=float)
+        self.score_precision = np.asarray(score_precision, dtype=float)
+        self.t2_limit = float(t2_limit)
+        self.q_limit = float(q_limit)
+        self.level = float(level)
+
+    @property
+    def n_components(self) -> int:
+        return self.projection_weights.shape[1]
+
+    def projections(self, X: np.ndarray) -> np.ndarray:
+        """``d L'`` for raw spectra."""
+        X = np.asarray(X, dtype=self.projection_weights.dtype)
+        return X @ self.projection_weights + self.projection_offset
+
+    def statistics(self, X: np.ndarray, scores: np.ndarray,
+                   projections: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Hotelling T² and Q residual of raw spectra.
+
+        Args:
+            X: Raw spectra (n_samples, n_features)
+            scores: Their PLS scores (n_samples, n_components)
+            projections: Their ``d L'``, if already computed with the scores
+
+        Returns:
+            Tuple of (T², Q) arrays of shape (n_samples,)
+        """
+        if projections is None:
+            projections = self.projections(X)
+        scores = np.asarray(scores, dtype=float)
+        projections = np.asarray(projections, dtype=float)
+
+        t2 = ((scores @ self.score_precision) * scores).sum(axis=1)
+
+        d = np.asarray(X, dtype=self.scale.dtype) * self.scale
+        d += self.center
+        q = (np.einsum('ij,ij->i', d, d)
+             - 2.0 * (scores * projections).sum(axis=1)
+             + ((scores @ self.loading_gram) * scores).sum(axis=1))
+        return t2, np.maximum(q, 0.0)
+
+    def flags(self, t2: np.ndarray, q: np.ndarray) -> Dict[str, np.ndarray]:
+        """T² and Q with whether each exceeds its limit."""
+        return {'t2': t2, 'q': q, 't2_exceeded': t2 > self.t2_limit, 'q_exceeded': q > self.q_limit}
+
+    def astype(self, dtype: Any) -> "DomainLimits":
+        """Copy with the per-wavelength arrays stored as dtype."""
+        return DomainLimits(self.scale.astype(dtype), self.center.astype(dtype),
+                            self.projection_weights.astype(dtype), self.projection_offset.astype(dtype),
+                            self.loading_gram, self.score_precision,
+                            self.t2_limit, self.q_limit, self.level)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Arrays to store in a ``.npz`` next to the model coefficients."""
+        return {
+            f"{ARRAY_PREFIX}scale": self.scale,
+            f"{ARRAY_PREFIX}center": self.center,
+            f"{ARRAY_PREFIX}projection_weights": self.projection_weights,
+            f"{ARRAY_PREFIX}projection_offset": self.projection_offset,
+            f"{ARRAY_PREFIX}loading_gram": self.loading_gram,
+            f"{ARRAY_PREFIX}score_precision": self.score_precision,
+            f"{ARRAY_PREFIX}t2_limit": np.array(self.t2_limit),
+            f"{ARRAY_PREFIX}q_limit": np.array(self.q_limit),
+            f"{ARRAY_PREFIX}level": np.array(self.level)
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Any) -> "DomainLimits":
+        """Rebuild from the arrays written by to_arrays (e.g. an open ``.npz``)."""
+        return cls(*(arrays[f"{ARRAY_PREFIX}{name}"] for name in (
+            'scale', 'center', 'projection_weights', 'projection_offset', 'loading_gram',
+            'score_precision', 't2_limit', 'q_limit', 'level'
+        )))
+
+    def summary(self) -> Dict[str, Any]:
+        """JSON-serializable description for metrics files and responses."""
+        return {'level': self.level, 't2_limit': self.t2_limit, 'q_limit': self.q_limit}
+
+
+def q_limit_box(q: np.ndarray, level: float) -> float:
+    """Box's approximation ``g * chi2(h)`` of the Q residual limit, with g and h matched to q's mean and variance."""
+    from scipy import stats
+
+    mean, var = float(np.mean(q)), float(np.var(q, ddof=1))
+    if mean <= 0 or var <= 0:
+        return float(np.max(q)) if len(q) else 0.0
+    g, h = var / (2.0 * mean), 2.0 * mean ** 2 / var
+    return float(g * stats.chi2.ppf(level, h))
+
+
+def t2_limit_f(n_components: int, n_train: int, level: float) -> float:
+    """F-distribution limit of Hotelling's T² for a new observation."""
+    from scipy import stats
+
+    a, n = n_components, n_train
+    if n <= a:
+        return float('inf')
+    return float(a * (n - 1) * (n + 1) / (n * (n - a)) * stats.f.ppf(level, a, n - a))
+
+
+def calibrate_domain(
+    model: Any,
+    X: np.ndarray,
+    score_weights: np.ndarray,
+    score_offset: np.ndarray,
+    level: float = DEFAULT_LEVEL
+) -> Tuple[DomainLimits, Dict[str, float]]:
+    """
+    Compute the T² and Q statistics of the training spectra and their limits.
+
+    For pipelines with a leading spectral preprocessing step, the
+    statistics are computed from the preprocessed spectra.
+
+    Args:
+        model: Pipeline of optional spectral preprocessing, element-wise
+            affine scaling and a final PLS step, refitted on all of X
+        X: Training spectra
+        score_weights: Raw spectrum to PLS score weights (see
+            src.models.intervals.score_transform)
+        score_offset: Score offset
+        level: Confidence level of the limits
+
+    Returns:
+        Tuple of (domain limits, training statistics)
+    """
+    preprocessor, _ = split_preprocessing(model)
+    X = np.asarray(X, dtype=float)
+    if preprocessor is not None:
+        X = preprocessor.transform(X)
+    n_train, n_features = X.shape
+    n_components = score_weights.shape[1]
+
+    scale, offset = preprocessing_transform(model, n_features)
+    loadings, mean = reconstruction_transform(model, n_components)
+    center = offset - mean
+
+    scores = X @ score_weights + score_offset
+    covariance = scores.T @ scores / max(n_train - 1, 1)
+    domain = DomainLimits(
+        scale, center,
+        projection_weights=scale[:, None] * loadings.T,
+        projection_offset=center @ loadings.T,
+        loading_gram=loadings @ loadings.T,
+        score_precision=np.linalg.pinv(covariance),
+        t2_limit=0.0, q_limit=0.0, level=level
+    )
+
+    t2, q = domain.statistics(X, scores)
+    domain.t2_limit = t2_limit_f(n_components, n_train, level)
+    domain.q_limit = q_limit_box(q, level)
+
+    flags = domain.flags(t2, q)
+    stats = {
+        't2_exceeded_fraction': float(flags['t2_exceeded'].mean()) if n_train else 0.0,
+        'q_exceeded_fraction': float(flags['q_exceeded'].mean()) if n_train else 0.0
+    }
+    return domain, stats
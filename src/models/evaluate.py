@@ -4,18 +4,222 @@ Evaluate trained models and generate reports.
 
 This script loads a trained model and evaluates it on held-out data,
 generating detailed performance reports and visualizations.
+
+``--all-folds`` evaluates every fold of the split manifest in one run:
+the spectra and targets are read from Parquet once, folds are scored in
+parallel worker processes, and a single report with per-fold and
+aggregate metrics is written. As in src.models.train_all, the spectra
+are saved once as a ``.npy`` that every worker memory-maps read-only,
+and each worker loads the model once. Plots are drawn by a background
+process so they don't hold up the report.
+
+joblib, pandas, sklearn and matplotlib are imported when first needed.
 """
 
 import argparse
 import json
+import os
 import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 
-import joblib
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
-from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
+
+from src.data.splits import load_folds, splits_path
+
+
+# Model, spectra and targets of an evaluation worker, set by init_worker
+_shared = None
+
+
+def evaluate_fold(model, X, y, fold, val_idx):
+    """
+    Score a model on one fold's validation rows.
+    
+    Rows where the target wasn't measured (multi-target cleaning) are skipped.
+    
+    Returns:
+        Tuple of (report dictionary, true values, predictions)
+    """
+    from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
+    
+    val_idx = val_idx[y.notna().to_numpy()[val_idx]]
+    
+    X_val = X.iloc[val_idx]
+    y_val = y.iloc[val_idx]
+    y_pred = np.asarray(model.predict(X_val), dtype=float).reshape(len(X_val))
+    
+    report = {
+        'fold': fold,
+        'n_samples': len(X_val),
+        'metrics': {
+            'r2': float(r2_score(y_val, y_pred)),
+            'rmse': float(np.sqrt(mean_squared_error(y_val, y_pred))),
+            'mae': float(mean_absolute_error(y_val, y_pred))
+        },
+        'target_stats': {
+            'mean': float(y_val.mean()),
+            'std': float(y_val.std()),
+            'min': float(y_val.min()),
+            'max': float(y_val.max())
+        },
+        'prediction_stats': {
+            'mean': float(y_pred.mean()),
+            'std': float(y_pred.std()),
+            'min': float(y_pred.min()),
+            'max': float(y_pred.max())
+        }
+    }
+    return report, y_val.to_numpy(), y_pred
+
+
+def init_worker(model_path, spectra_path, columns, y):
+    """Load the model and memory-map the shared spectra once per worker process."""
+    global _shared
+    import joblib
+    import pandas as pd
+    
+    X = pd.DataFrame(np.load(spectra_path, mmap_mode='r'), columns=columns, copy=False)
+    _shared = (joblib.load(model_path), X, y)
+
+
+def evaluate_shared_fold(fold, val_idx):
+    """Score one fold in a worker process set up by init_worker."""
+    model, X, y = _shared
+    return evaluate_fold(model, X, y, fold, val_idx)
+
+
+def aggregate_metrics(reports, y_true, y_pred):
+    """Mean/std of the per-fold metrics and metrics pooled over all folds."""
+    from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
+    
+    aggregate = {}
+    for metric in ('r2', 'rmse', 'mae'):
+        values = [report['metrics'][metric] for report in reports]
+        aggregate[f'{metric}_mean'] = float(np.mean(values))
+        aggregate[f'{metric}_std'] = float(np.std(values))
+    
+    aggregate['pooled'] = {
+        'n_samples': len(y_true),
+        'r2': float(r2_score(y_true, y_pred)),
+        'rmse': float(np.sqrt(mean_squared_error(y_true, y_pred))),
+        'mae': float(mean_absolute_error(y_true, y_pred))
+    }
+    return aggregate
+
+
+def plot_fold(y_val, y_pred, target, fold, r2, plot_path):
+    """Save the truth-vs-prediction and residuals plot of one fold."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    
+    plt.figure(figsize=(10, 6))
+    
+    # Truth vs prediction scatter
+    plt.subplot(1, 2, 1)
+    plt.scatter(y_val, y_pred, alpha=0.6)
+    plt.plot([y_val.min(), y_val.max()], [y_val.min(), y_val.max()], 'r--', lw=2)
+    plt.xlabel(f'True {target}')
+    plt.ylabel(f'Predicted {target}')
+    plt.title(f'Truth vs Prediction (Fold {fold})')
+    plt.text(0.05, 0.95, f'R² = {r2:.3f}', transform=plt.gca().transAxes,
+             bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
+    
+    # Residuals plot
+    plt.subplot(1, 2, 2)
+    residuals = y_val - y_pred
+    plt.scatter(y_pred, residuals, alpha=0.6)
+    plt.axhline(y=0, color='r', linestyle='--')
+    plt.xlabel(f'Predicted {target}')
+    plt.ylabel('Residuals')
+    plt.title(f'Residuals Plot (Fold {fold})')
+    
+    plt.tight_layout()
+    plt.savefig(plot_path, dpi=150, bbox_inches='tight')
+    plt.close()
+    return plot_path
+
+
+def evaluate_all_folds(model, X, y, folds, target, model_path, workers):
+    """
+    Evaluate every fold and write one consolidated report.
+    
+    Returns:
+        Tuple of (report path, plot paths)
+    """
+    # Plots only need each fold's (small) truth/prediction vectors, so one
+    # background process (importing matplotlib once) draws them while the
+    # remaining folds are scored
+    plotter = ProcessPoolExecutor(max_workers=1)
+    stem = Path(model_path).stem
+    out_dir = Path(model_path).parent
+    
+    pool = None
+    shared_dir = None
+    if workers > 1 and len(folds) > 1:
+        # Workers memory-map one copy of the spectra instead of each
+        # receiving a pickled DataFrame
+        interim_dir = Path("data/interim")
+        interim_dir.mkdir(parents=True, exist_ok=True)
+        shared_dir = tempfile.TemporaryDirectory(prefix=".evaluate-", dir=interim_dir)
+        spectra_path = Path(shared_dir.name) / "X.npy"
+        np.save(spectra_path, X.to_numpy())
+        
+        pool = ProcessPoolExecutor(max_workers=min(workers, len(folds)), initializer=init_worker,
+                                   initargs=(model_path, spectra_path, list(X.columns), y))
+        results = [
+            pool.submit(evaluate_shared_fold, fold, val_idx).result
+            for fold, (_, val_idx) in enumerate(folds)
+        ]
+    else:
+        results = [
+            partial(evaluate_fold, model, X, y, fold, val_idx)
+            for fold, (_, val_idx) in enumerate(folds)
+        ]
+    
+    reports, y_true, y_pred, plots = [], [], [], []
+    try:
+        for fold, result in enumerate(results):
+            report, y_val, y_hat = result()
+            reports.append(report)
+            y_true.append(y_val)
+            y_pred.append(y_hat)
+            metrics = report['metrics']
+            print(f"   Fold {fold}: {report['n_samples']} samples, R² = {metrics['r2']:.4f}, "
+                  f"RMSE = {metrics['rmse']:.4f}, MAE = {metrics['mae']:.4f}")
+            plots.append(plotter.submit(plot_fold, y_val, y_hat, target, fold, metrics['r2'],
+                                        out_dir / f"{stem}__evaluation_fold_{fold}.png"))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if shared_dir is not None:
+            shared_dir.cleanup()
+    
+    report = {
+        'model_path': str(model_path),
+        'n_folds': len(folds),
+        'aggregate': aggregate_metrics(reports, np.concatenate(y_true), np.concatenate(y_pred)),
+        'folds': reports
+    }
+    report_path = out_dir / f"{stem}__evaluation.json"
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    
+    print(f"\n📈 Aggregate Results:")
+    aggregate = report['aggregate']
+    print(f"   R²: {aggregate['r2_mean']:.4f} ± {aggregate['r2_std']:.4f}")
+    print(f"   RMSE: {aggregate['rmse_mean']:.4f} ± {aggregate['rmse_std']:.4f}")
+    print(f"   MAE: {aggregate['mae_mean']:.4f} ± {aggregate['mae_std']:.4f}")
+    print(f"💾 Saved evaluation report to {report_path}")
+    
+    try:
+        plot_paths = [plot.result() for plot in plots]
+    finally:
+        plotter.shutdown()
+    return report_path, plot_paths
 
 
 def main():
@@ -23,6 +227,12 @@ def main():
     parser = argparse.ArgumentParser(description="Evaluate trained model")
     parser.add_argument("--model_path", required=True, help="Path to trained model")
     parser.add_argument("--fold", type=int, default=0, help="Fold to evaluate")
+    parser.add_argument("--all-folds", action="store_true",
+                        help="Evaluate every fold with one data load and write a single report")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes evaluating folds in parallel with --all-folds")
+    parser.add_argument("--dtype", choices=["float64", "float32"],
+                        help="Dtype of the spectra (default: as stored by clean_bi)")
     
     args = parser.parse_args()
     
@@ -33,27 +243,10 @@ def main():
         print(f"❌ Model file not found: {args.model_path}")
         return 1
     
+    import joblib
     model = joblib.load(args.model_path)
     print("✅ Model loaded")
     
-    # Load data
-    clean_dir = Path("data/clean")
-    splits_path = clean_dir / "splits.csv"
-    
-    if not splits_path.exists():
-        print(f"❌ Splits file not found: {splits_path}")
-        return 1
-    
-    splits_df = pd.read_csv(splits_path)
-    
-    if args.fold >= len(splits_df):
-        print(f"❌ Invalid fold {args.fold}. Available folds: 0-{len(splits_df)-1}")
-        return 1
-    
-    # Get fold data
-    fold_data = splits_df.iloc[args.fold]
-    val_idx = fold_data['val_idx']
-    
     # Load features and target
     # Extract crop and target from model path
     model_name = Path(args.model_path).stem
@@ -65,6 +258,20 @@ def main():
         print("❌ Could not extract crop and target from model path")
         return 1
     
+    # Load data
+    clean_dir = Path("data/clean")
+    folds_path = splits_path(clean_dir, crop)
+    
+    if folds_path is None:
+        print(f"❌ Splits file not found in {clean_dir}")
+        return 1
+    
+    folds = load_folds(folds_path)
+    
+    if not args.all_folds and args.fold >= len(folds):
+        print(f"❌ Invalid fold {args.fold}. Available folds: 0-{len(folds)-1}")
+        return 1
+    
     X_path = clean_dir / f"{crop}__X.parquet"
     y_path = clean_dir / f"{crop}__y__{target}.parquet"
     
@@ -72,53 +279,32 @@ def main():
         print(f"❌ Data files not found: {X_path} or {y_path}")
         return 1
     
+    import pandas as pd
     X = pd.read_parquet(X_path)
     y = pd.read_parquet(y_path).iloc[:, 0]
+    if args.dtype:
+        X = X.astype(args.dtype)
     
-    # Get validation data
-    X_val = X.iloc[val_idx]
-    y_val = y.iloc[val_idx]
-    
-    print(f"📊 Evaluating on fold {args.fold}: {len(X_val)} samples")
+    if args.all_folds:
+        print(f"📊 Evaluating {len(folds)} folds with {min(args.workers, len(folds))} workers")
+        _, plot_paths = evaluate_all_folds(model, X, y, folds, target, args.model_path, args.workers)
+        print(f"📊 Saved {len(plot_paths)} evaluation plots to {Path(args.model_path).parent}")
+        return 0
     
-    # Make predictions
-    y_pred = model.predict(X_val)
+    # Get fold data
+    _, val_idx = folds[args.fold]
+    report, y_val, y_pred = evaluate_fold(model, X, y, args.fold, val_idx)
     
-    # Calculate metrics
-    r2 = r2_score(y_val, y_pred)
-    rmse = np.sqrt(mean_squared_error(y_val, y_pred))
-    mae = mean_absolute_error(y_val, y_pred)
+    print(f"📊 Evaluating on fold {args.fold}: {report['n_samples']} samples")
     
+    metrics = report['metrics']
     print(f"\n📈 Evaluation Results:")
-    print(f"   R²: {r2:.4f}")
-    print(f"   RMSE: {rmse:.4f}")
-    print(f"   MAE: {mae:.4f}")
-    
-    # Create evaluation report
-    report = {
-        'model_path': str(args.model_path),
-        'fold': args.fold,
-        'n_samples': len(X_val),
-        'metrics': {
-            'r2': float(r2),
-            'rmse': float(rmse),
-            'mae': float(mae)
-        },
-        'target_stats': {
-            'mean': float(y_val.mean()),
-            'std': float(y_val.std()),
-            'min': float(y_val.min()),
-            'max': float(y_val.max())
-        },
-        'prediction_stats': {
-            'mean': float(y_pred.mean()),
-            'std': float(y_pred.std()),
-            'min': float(y_pred.min()),
-            'max': float(y_pred.max())
-        }
-    }
+    print(f"   R²: {metrics['r2']:.4f}")
+    print(f"   RMSE: {metrics['rmse']:.4f}")
+    print(f"   MAE: {metrics['mae']:.4f}")
     
     # Save report
+    report = {'model_path': str(args.model_path), **report}
     report_path = Path(args.model_path).parent / f"evaluation_fold_{args.fold}.json"
     with open(report_path, 'w') as f:
         json.dump(report, f, indent=2)
@@ -126,32 +312,8 @@ def main():
     print(f"💾 Saved evaluation report to {report_path}")
     
     # Create visualization
-    plt.figure(figsize=(10, 6))
-    
-    # Truth vs prediction scatter
-    plt.subplot(1, 2, 1)
-    plt.scatter(y_val, y_pred, alpha=0.6)
-    plt.plot([y_val.min(), y_val.max()], [y_val.min(), y_val.max()], 'r--', lw=2)
-    plt.xlabel(f'True {target}')
-    plt.ylabel(f'Predicted {target}')
-    plt.title(f'Truth vs Prediction (Fold {args.fold})')
-    plt.text(0.05, 0.95, f'R² = {r2:.3f}', transform=plt.gca().transAxes,
-             bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
-    
-    # Residuals plot
-    plt.subplot(1, 2, 2)
-    residuals = y_val - y_pred
-    plt.scatter(y_pred, residuals, alpha=0.6)
-    plt.axhline(y=0, color='r', linestyle='--')
-    plt.xlabel(f'Predicted {target}')
-    plt.ylabel('Residuals')
-    plt.title(f'Residuals Plot (Fold {args.fold})')
-    
-    plt.tight_layout()
-    
     plot_path = Path(args.model_path).parent / f"evaluation_fold_{args.fold}.png"
-    plt.savefig(plot_path, dpi=150, bbox_inches='tight')
-    plt.close()
+    plot_fold(y_val, y_pred, target, args.fold, metrics['r2'], plot_path)
     
     print(f"📊 Saved evaluation plot to {plot_path}")
     
@@ -160,5 +322,3 @@ def main():
 
 if __name__ == "__main__":
     sys.exit(main())
-
-
@@ -3,102 +3,74 @@
 Inference module for making predictions from NIR spectra.
 
 This module provides functions to load trained models and make predictions
-on new NIR spectral data with confidence intervals.
+on new NIR spectral data with confidence intervals. Loaded models are cached
+in the model registry (see src.models.registry). When a fused ``.npz``
+predictor has been exported next to the model (see src.models.linear),
+predictions are a single NumPy matrix product instead of a pipeline call.
+Multi-target (PLS2) models return every nutrient from the same product.
+Models trained with domain limits also report each spectrum's Hotelling T²
+and Q residual, flagging spectra outside the calibration domain.
 """
 
 import json
-import joblib
 import numpy as np
 from pathlib import Path
 from typing import Union, List, Dict, Any
 
+from src.models.registry import ModelRegistry, default_registry
+
 
 def predict_from_spectrum(
     model_path: str,
     spectrum: Union[List[float], np.ndarray],
-    wavelengths_json: str = None
+    wavelengths_json: str = None,
+    registry: ModelRegistry = None,
+    wavelengths: List[float] = None
 ) -> Dict[str, Any]:
     """
     Predict nutrient value from NIR spectrum.
     
+    The model and wavelength list are cached in the model registry, so
+    repeated calls only load them from disk when the model file changes.
+    
     Args:
         model_path: Path to trained model (.joblib file)
         spectrum: NIR spectrum as list or array
         wavelengths_json: Path to wavelengths JSON file (optional)
+        registry: Model registry to load from (defaults to the shared one)
+        wavelengths: Wavelengths the spectrum was measured at; if given, the
+            spectrum is resampled onto the model's wavelengths (optional)
     
     Returns:
         Dictionary with prediction, confidence interval, and metadata
     """
-    # Load model
-    model = joblib.load(model_path)
-    
-    # Convert spectrum to numpy array
-    spectrum = np.array(spectrum)
-    
-    # Load wavelengths if provided
-    if wavelengths_json and Path(wavelengths_json).exists():
-        with open(wavelengths_json, 'r') as f:
-            expected_wavelengths = json.load(f)
-        
-        if len(spectrum) != len(expected_wavelengths):
-            raise ValueError(
-                f"Spectrum length ({len(spectrum)}) doesn't match "
-                f"expected wavelengths ({len(expected_wavelengths)})"
-            )
-    else:
-        # Try to infer from model path
-        model_dir = Path(model_path).parent
-        crop = Path(model_path).stem.split('__')[0]
-        wavelengths_path = model_dir / f"{crop}__wavelengths.json"
-        
-        if wavelengths_path.exists():
-            with open(wavelengths_path, 'r') as f:
-                expected_wavelengths = json.load(f)
-            
-            if len(spectrum) != len(expected_wavelengths):
-                raise ValueError(
-                    f"Spectrum length ({len(spectrum)}) doesn't match "
-                    f"expected wavelengths ({len(expected_wavelengths)})"
-                )
-        else:
-            print("⚠️  No wavelengths file found, assuming spectrum is correct length")
-    
-    # Reshape spectrum for prediction (sklearn expects 2D array)
-    spectrum_2d = spectrum.reshape(1, -1)
-    
-    # Make prediction
-    prediction = model.predict(spectrum_2d)[0]
+    registry = registry or default_registry
+    return registry.load(model_path, wavelengths_json).predict(spectrum, wavelengths)
+
+
+def predict_batch_from_spectra(
+    model_path: str,
+    spectra: Union[List[List[float]], np.ndarray],
+    wavelengths_json: str = None,
+    registry: ModelRegistry = None,
+    wavelengths: List[float] = None
+) -> Dict[str, Any]:
+    """
+    Predict nutrient values for many NIR spectra with one model call.
     
-    # Calculate confidence interval (simple approximation)
-    # This is a basic implementation - in practice, you'd want more sophisticated methods
-    try:
-        # Get residuals from training (if available in model)
-        # For now, use a simple approximation based on typical PLS performance
-        residual_std = 0.1 * abs(prediction)  # 10% of prediction as rough estimate
-        
-        # 80% confidence interval (approximately 1.28 standard deviations)
-        confidence_factor = 1.28
-        lower_bound = prediction - confidence_factor * residual_std
-        upper_bound = prediction + confidence_factor * residual_std
-        
-    except Exception:
-        # Fallback: use a fixed percentage
-        margin = 0.2 * abs(prediction)  # 20% margin
-        lower_bound = prediction - margin
-        upper_bound = prediction + margin
+    Args:
+        model_path: Path to trained model (.joblib file)
+        spectra: NIR spectra as a list of lists or a 2D array
+        wavelengths_json: Path to wavelengths JSON file (optional)
+        registry: Model registry to load from (defaults to the shared one)
+        wavelengths: Wavelengths the spectra were measured at; if given, all
+            spectra are resampled onto the model's wavelengths (optional)
     
-    return {
-        'prediction': float(prediction),
-        'confidence_interval': {
-            'lower': float(lower_bound),
-            'upper': float(upper_bound)
-        },
-        'metadata': {
-            'model_path': str(model_path),
-            'spectrum_length': len(spectrum),
-            'wavelengths_file': str(wavelengths_json) if wavelengths_json else None
-        }
-    }
+    Returns:
+        Dictionary with per-row predictions (or errors) and metadata
+    """
+    registry = registry or default_registry
+    return registry.load(model_path, wavelengths_json).predict_batch(spectra, wavelengths)
 
 
 def main():
@@ -116,19 +88,39 @@ def main():
     with open(args.spectrum, 'r') as f:
         spectrum_data = json.load(f)
     
+    wavelengths = None
     if 'spectrum' in spectrum_data:
         spectrum = spectrum_data['spectrum']
+        wavelengths = spectrum_data.get('wavelengths')  # Device grid, if different
     else:
         spectrum = spectrum_data  # Assume it's the spectrum directly
     
     # Make prediction
     try:
-        result = predict_from_spectrum(args.model, spectrum, args.wavelengths)
+        result = predict_from_spectrum(args.model, spectrum, args.wavelengths,
+                                       wavelengths=wavelengths)
+        
+        # Models saved without calibrated intervals report no level
+        level = result['metadata'].get('interval_level')
+        label = f"{level:.0%} PI" if level is not None else "Uncalibrated PI"
         
         print("🎯 Prediction Results:")
-        print(f"   Prediction: {result['prediction']:.4f}")
-        print(f"   80% CI: [{result['confidence_interval']['lower']:.4f}, "
-              f"{result['confidence_interval']['upper']:.4f}]")
+        if result.get('targets'):
+            for target, row in result['targets'].items():
+                print(f"   {target}: {row['prediction']:.4f} "
+                      f"({label}: [{row['confidence_interval']['lower']:.4f}, "
+                      f"{row['confidence_interval']['upper']:.4f}])")
+        else:
+            print(f"   Prediction: {result['prediction']:.4f}")
+            print(f"   {label}: [{result['confidence_interval']['lower']:.4f}, "
+                  f"{result['confidence_interval']['upper']:.4f}]")
+        domain = result.get('domain')
+        if domain is not None:
+            limits = result['metadata']['domain_limits']
+            print(f"   T²: {domain['t2']:.2f} (limit {limits['t2_limit']:.2f}), "
+                  f"Q: {domain['q']:.4g} (limit {limits['q_limit']:.4g})")
+            if domain['t2_exceeded'] or domain['q_exceeded']:
+                print("⚠️  Spectrum is outside the model's calibration domain")
         
         # Save result
         output_path = Path(args.spectrum).parent / "prediction_result.json"
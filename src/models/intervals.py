@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Calibrated prediction intervals for PLS models.
+
+Intervals are calibrated once at training time from the out-of-fold
+residuals of cross-validation and stored with the model, so inference
+needs no refitting or bootstrapping.
+
+The half-width of an interval grows with the sample's leverage in PLS
+score space, as in the usual PLS prediction error
+``s * sqrt(1 + h)`` with ``h = 1/n + t (T'T)^-1 t'``, where ``t`` are the
+sample's scores and ``T`` the training scores. The scale ``s`` is not
+estimated from degrees of freedom: it is the split-conformal quantile of
+the out-of-fold residuals normalized by ``sqrt(1 + h)``, so the
+intervals cover the requested fraction of held-out samples.
+
+Scores are an affine function of the raw spectrum
+(``t = x @ score_weights + score_offset``), so scoring one more sample
+costs one extra matrix product next to the prediction. For models with
+spectral preprocessing (see src.models.preprocessing), "raw" spectra here
+are the preprocessed spectra the scaler receives.
+"""
+
+import math
+import warnings
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+from src.models.preprocessing import split_preprocessing
+
+
+# Nominal coverage of the intervals returned by the API
+DEFAULT_LEVEL = 0.8
+
+# Prefix of the interval arrays inside a fused ``.npz`` artifact
+ARRAY_PREFIX = "interval_"
+
+
+def conformal_quantile(scores: np.ndarray, level: float) -> np.ndarray:
+    """
+    Split-conformal quantile of nonconformity scores, per column.
+
+    The ``ceil((n + 1) * level)``-th smallest score, so that a new sample
+    exchangeable with the calibration samples falls within it with
+    probability at least ``level``.
+    """
+    scores = np.asarray(scores, dtype=float)
+    if scores.ndim == 1:
+        scores = scores[:, None]
+    scores = np.sort(scores, axis=0)
+    n = len(scores)
+    if n == 0:
+        return np.full(scores.shape[1], np.nan)
+    rank = min(math.ceil((n + 1) * level), n)
+    return scores[rank - 1]
+
+
+def score_transform(model: Any, n_features: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Affine map from raw spectra to PLS scores of a fitted pipeline.
+
+    Probed like src.models.linear.fuse_pipeline: the offset is the
+    transform of the origin and each weight row the response to a unit
+    spectrum. For pipelines with a leading spectral preprocessing step,
+    the map starts from the preprocessed spectrum.
+
+    Returns:
+        Tuple of (weights of shape (n_features, n_components), offset)
+    """
+    _, affine = split_preprocessing(model)
+    probes = np.vstack([np.zeros((1, n_features)), np.eye(n_features)])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        response = np.asarray(affine.transform(probes), dtype=float)
+    response = response.reshape(n_features + 1, -1)
+    return response[1:] - response[0], response[0]
+
+
+class PredictionIntervals:
+    """
+    Leverage-scaled conformal intervals ``prediction ± q * sqrt(1 + h)``.
+
+    Args:
+        quantile: Calibrated scale ``q`` per target
+        level: Nominal coverage
+        score_weights: Raw spectrum to PLS score weights (n_features, n_components)
+        score_offset: Score offset (n_components,)
+        score_precision: Inverse of the training scores' cross-product
+            matrix ``(T'T)^-1`` (n_components, n_components)
+        n_train: Number of training samples
+    """
+
+    def __init__(self, quantile: np.ndarray, level: float, score_weights: np.ndarray,
+                 score_offset: np.ndarray, score_precision: np.ndarray, n_train: int):
+        self.quantile = np.asarray(quantile, dtype=float).reshape(-1)
+        self.level = float(level)
+        self.score_weights = np.asarray(score_weights)
+        self.score_offset = np.asarray(score_offset).reshape(-1)
+        self.score_precision = np.asarray(score_precision, dtype=float)
+        self.n_train = int(n_train)
+
+    @property
+    def n_components(self) -> int:
+        return self.score_weights.shape[1]
+
+    def scores(self, X: np.ndarray) -> np.ndarray:
+        """PLS scores of (preprocessed) spectra."""
+        return np.asarray(X, dtype=self.score_weights.dtype) @ self.score_weights + self.score_offset
+
+    def leverage(self, scores: np.ndarray) -> np.ndarray:
+        """Leverage ``1/n + t (T'T)^-1 t'`` of each row of scores."""
+        scores = np.asarray(scores, dtype=float)
+        return 1.0 / self.n_train + ((scores @ self.score_precision) * scores).sum(axis=1)
+
+    def half_width_from_scores(self, scores: np.ndarray) -> np.ndarray:
+        """Interval half-widths of shape (n_samples, n_targets) from PLS scores."""
+        return np.sqrt(1.0 + self.leverage(scores))[:, None] * self.quantile
+
+    def half_width(self, X: np.ndarray) -> np.ndarray:
+        """Interval half-widths of shape (n_samples, n_targets) for (preprocessed) spectra."""
+        return self.half_width_from_scores(self.scores(X))
+
+    def astype(self, dtype: Any) -> "PredictionIntervals":
+        """Copy with the score weights stored as dtype."""
+        return PredictionIntervals(self.quantile, self.level,
+                                   self.score_weights.astype(dtype), self.score_offset.astype(dtype),
+                                   self.score_precision, self.n_train)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Arrays to store in a ``.npz`` next to the model coefficients."""
+        return {
+            f"{ARRAY_PREFIX}quantile": self.quantile,
+            f"{ARRAY_PREFIX}level": np.array(self.level),
+            f"{ARRAY_PREFIX}score_weights": self.score_weights,
+            f"{ARRAY_PREFIX}score_offset": self.score_offset,
+            f"{ARRAY_PREFIX}score_precision": self.score_precision,
+            f"{ARRAY_PREFIX}n_train": np.array(self.n_train)
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Any) -> "PredictionIntervals":
+        """Rebuild from the arrays written by to_arrays (e.g. an open ``.npz``)."""
+        return cls(*(arrays[f"{ARRAY_PREFIX}{name}"] for name in (
+            'quantile', 'level', 'score_weights', 'score_offset', 'score_precision', 'n_train'
+        )))
+
+    def summary(self) -> Dict[str, Any]:
+        """JSON-serializable description for metrics files."""
+        return {
+            'method': 'leverage-scaled split conformal',
+            'level': self.level,
+            'quantile': [float(q) for q in self.quantile],
+            'n_components': self.n_components,
+            'n_train': self.n_train
+        }
+
+
+def calibrate(
+    model: Any,
+    X: np.ndarray,
+    y: np.ndarray,
+    oof: np.ndarray,
+    level: float = DEFAULT_LEVEL
+) -> Tuple[PredictionIntervals, Dict[str, float]]:
+    """
+    Calibrate intervals for a fitted pipeline from out-of-fold predictions.
+
+    The score weights apply to spectra after the pipeline's spectral
+    preprocessing, if it has any.
+
+    Args:
+        model: Pipeline refitted on all of X, with a ``transform`` to PLS scores
+        X: Training spectra
+        y: Training targets of shape (n_samples,) or (n_samples, n_targets)
+        oof: Out-of-fold predictions, same shape as y (NaN for unassigned rows)
+        level: Nominal coverage
+
+    Returns:
+        Tuple of (intervals, calibration statistics)
+    """
+    preprocessor, _ = split_preprocessing(model)
+    X = np.asarray(X, dtype=float)
+    if preprocessor is not None:
+        X = preprocessor.transform(X)
+    y = np.asarray(y, dtype=float).reshape(len(X), -1)
+    oof = np.asarray(oof, dtype=float).reshape(len(X), -1)
+
+    weights, offset = score_transform(model, X.shape[1])
+    scores = X @ weights + offset
+    precision = np.linalg.pinv(scores.T @ scores)
+    intervals = PredictionIntervals(np.ones(y.shape[1]), level, weights, offset, precision, len(X))
+
+    # Residuals normalized by the leverage term, one nonconformity score per sample
+    held_out = ~np.isnan(oof).any(axis=1)
+    scale = np.sqrt(1.0 + intervals.leverage(scores[held_out]))[:, None]
+    nonconformity = np.abs(y[held_out] - oof[held_out]) / scale
+    intervals.quantile = conformal_quantile(nonconformity, level)
+
+    covered = nonconformity <= intervals.quantile
+    stats = {
+        'n_calibration': int(held_out.sum()),
+        'oof_coverage': float(covered.mean()) if covered.size else float('nan'),
+        'mean_width': float(2 * (scale * intervals.quantile).mean()) if covered.size else float('nan')
+    }
+    return intervals, stats
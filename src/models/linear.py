@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Fuse a trained pipeline into a single linear predictor.
+
+A fitted ``Pipeline([StandardScaler, PLSRegression])`` is an affine map
+``y = x @ coef + intercept``. This module collapses such a pipeline into
+one coefficient matrix and intercept, saves them as a compact ``.npz``
+next to the ``.joblib`` and predicts with a single NumPy matrix product.
+Coefficients can be stored as float32, in which case spectra are scored
+in float32 too.
+
+When the pipeline carries calibrated prediction intervals (see
+src.models.intervals) and applicability-domain limits (see
+src.models.domain), their weights are stored in the same ``.npz`` and
+stacked next to the coefficients, so a prediction, its interval and its
+T²/Q statistics come from one matrix product.
+
+A leading spectral preprocessing step (see src.models.preprocessing) is
+kept as is and applied to the spectra, in one vectorized pass, before the
+matrix product; everything after it is fused.
+
+Multi-target (PLS2) models store the names of their targets, one per
+coefficient column, so every target is predicted by the same product.
+"""
+
+import argparse
+import sys
+import warnings
+from pathlib import Path
+from typing import Any, List, Optional, Tuple, Union
+
+import numpy as np
+
+from src.models.domain import ARRAY_PREFIX as DOMAIN_PREFIX, DomainLimits
+from src.models.intervals import ARRAY_PREFIX as INTERVAL_PREFIX, PredictionIntervals
+from src.models.preprocessing import (
+    ARRAY_PREFIX as PREPROCESS_PREFIX, SpectralPreprocessor, split_preprocessing
+)
+
+
+class LinearPredictor:
+    """
+    Affine predictor ``y = X @ coef + intercept``, optionally applied to
+    preprocessed spectra.
+
+    Args:
+        coef: Coefficients of shape (n_features, n_targets)
+        intercept: Intercept per target
+        intervals: Calibrated prediction intervals (optional)
+        domain: Applicability-domain limits (optional; they use the PLS
+            scores stored with the intervals)
+        preprocessor: Spectral preprocessing applied before the product
+            (optional); intervals and domain limits are in its output space
+        targets: Names of the targets of a multi-target model, one per
+            coefficient column (optional)
+    """
+
+    def __init__(self, coef: np.ndarray, intercept: np.ndarray,
+                 intervals: Optional[PredictionIntervals] = None,
+                 domain: Optional[DomainLimits] = None,
+                 preprocessor: Optional[SpectralPreprocessor] = None,
+                 targets: Optional[List[str]] = None):
+        if domain is not None and intervals is None:
+            raise ValueError("Domain limits need the PLS score weights stored with the intervals")
+        self.coef = np.asarray(coef).reshape(len(coef), -1)
+        self.intercept = np.asarray(intercept).reshape(-1)
+        self.intervals = intervals.astype(self.coef.dtype) if intervals is not None else None
+        self.domain = domain.astype(self.coef.dtype) if domain is not None else None
+        self.preprocessor = preprocessor
+        self.targets = [str(target) for target in targets] if targets is not None else None
+        if self.targets is not None and len(self.targets) != self.n_targets:
+            raise ValueError(f"Got {len(self.targets)} target names for {self.n_targets} targets")
+        self._stacked: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    @property
+    def n_features(self) -> int:
+        return self.coef.shape[0]
+
+    @property
+    def n_targets(self) -> int:
+        return self.coef.shape[1]
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.coef.dtype
+
+    def preprocess(self, X: np.ndarray) -> np.ndarray:
+        """Spectra in the model's dtype, preprocessed if the model has a preprocessor."""
+        X = np.asarray(X, dtype=self.coef.dtype)
+        if self.preprocessor is not None:
+            X = self.preprocessor.transform(X)
+        return X
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """
+        Predict for a 2D array of spectra with one matrix product.
+
+        Returns an array of shape (n_samples,) for single-target models and
+        (n_samples, n_targets) otherwise.
+        """
+        y = self.preprocess(X) @ self.coef + self.intercept
+        return y[:, 0] if self.n_targets == 1 else y
+
+    def _stacked_pass(self, X: np.ndarray) -> Tuple[np.ndarray, ...]:
+        """Predictions, PLS scores and domain projections from one matrix product."""
+        if self._stacked is None:
+            weights = [self.coef, self.intervals.score_weights]
+            offsets = [self.intercept, self.intervals.score_offset]
+            if self.domain is not None:
+                weights.append(self.domain.projection_weights)
+                offsets.append(self.domain.projection_offset)
+            self._stacked = np.hstack(weights), np.concatenate(offsets)
+        weights, offset = self._stacked
+
+        out = X @ weights + offset
+        n_scores = self.n_targets + self.intervals.n_components
+        return out[:, :self.n_targets], out[:, self.n_targets:n_scores], out[:, n_scores:]
+
+    def predict_interval(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Predict and compute interval half-widths with one matrix product.
+
+        Requires calibrated ``intervals``. Predictions and PLS scores are
+        computed together against the stacked ``[coef | score_weights]``.
+
+        Returns:
+            Tuple of (predictions, half-widths), both shaped like predict's output
+        """
+        predictions, half_width, _ = self.predict_with_domain(X)
+        return predictions, half_width
+
+    def predict_with_domain(
+        self,
+        X: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, Optional[Tuple[np.ndarray, np.ndarray]]]:
+        """
+        Predict with interval half-widths and, when domain limits are
+        stored, the Hotelling T² and Q residual of each spectrum.
+
+        Returns:
+            Tuple of (predictions, half-widths, (T², Q) or None); predictions
+            and half-widths are shaped like predict's output
+        """
+        if self.intervals is None:
+            raise ValueError("Predictor has no calibrated prediction intervals")
+
+        X = self.preprocess(X)
+        y, scores, projections = self._stacked_pass(X)
+        half_width = self.intervals.half_width_from_scores(scores)
+        statistics = self.domain.statistics(X, scores, projections) if self.domain is not None else None
+        if self.n_targets == 1:
+            return y[:, 0], half_width[:, 0], statistics
+        return y, half_width, statistics
+
+    def save(self, path: Union[str, Path]) -> Path:
+        """Save coefficients (and preprocessing, interval and domain parameters) to a ``.npz`` file."""
+        path = Path(path)
+        arrays = {'targets': np.array(self.targets)} if self.targets is not None else {}
+        for extra in (self.intervals, self.domain, self.preprocessor):
+            if extra is not None:
+                arrays.update(extra.to_arrays())
+        np.savez(path, coef=self.coef, intercept=self.intercept, **arrays)
+        return path
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "LinearPredictor":
+        """Load coefficients (and preprocessing, interval and domain parameters, if any) from a ``.npz`` file."""
+        with np.load(path) as data:
+            intervals = domain = preprocessor = None
+            if f"{INTERVAL_PREFIX}quantile" in data.files:
+                intervals = PredictionIntervals.from_arrays(data)
+            if f"{DOMAIN_PREFIX}t2_limit" in data.files:
+                domain = DomainLimits.from_arrays(data)
+            if f"{PREPROCESS_PREFIX}method" in data.files:
+                preprocessor = SpectralPreprocessor.from_arrays(data)
+            targets = list(data['targets']) if 'targets' in data.files else None
+            return cls(data['coef'], data['intercept'], intervals, domain, preprocessor, targets)
+
+
+def linear_path_for(model_path: Union[str, Path]) -> Path:
+    """Path of the fused ``.npz`` artifact for a ``.joblib`` model."""
+    return Path(model_path).with_suffix('.npz')
+
+
+def fuse_pipeline(model: Any, n_features: int, dtype: Any = np.float64) -> LinearPredictor:
+    """
+    Collapse an affine sklearn model into a LinearPredictor.
+
+    The intercept is the prediction at the origin and each coefficient row
+    is the response to a unit spectrum, so this works for any composition
+    of affine steps (scalers, PLS) regardless of sklearn internals.
+    A leading SpectralPreprocessor step is kept rather than fused (SNV is
+    not affine), and the steps after it are probed. Calibrated intervals,
+    domain limits and target names attached to the model as
+    ``intervals_``, ``domain_`` and ``targets_`` are carried over.
+
+    Args:
+        model: Fitted model with a ``predict`` method
+        n_features: Number of input wavelengths
+        dtype: Dtype of the stored coefficients
+
+    Returns:
+        LinearPredictor equivalent to the model
+    """
+    preprocessor, affine = split_preprocessing(model)
+    probes = np.vstack([np.zeros((1, n_features)), np.eye(n_features)])
+    with warnings.catch_warnings():
+        # Models fitted on DataFrames warn about missing feature names
+        warnings.simplefilter("ignore", UserWarning)
+        response = np.asarray(affine.predict(probes), dtype=float).reshape(n_features + 1, -1)
+
+    intercept = response[0]
+    coef = response[1:] - intercept
+    return LinearPredictor(coef.astype(dtype), intercept.astype(dtype),
+                           getattr(model, 'intervals_', None), getattr(model, 'domain_', None),
+                           preprocessor, getattr(model, 'targets_', None))
+
+
+def check_parity(
+    model: Any,
+    linear: LinearPredictor,
+    X: Optional[np.ndarray] = None,
+    rtol: float = 1e-6,
+    atol: float = 1e-8
+) -> float:
+    """
+    Check the fused predictor against the original model.
+
+    Args:
+        model: Original fitted model
+        linear: Fused predictor
+        X: Spectra to compare on (random spectra if not given)
+        rtol: Relative tolerance
+        atol: Absolute tolerance
+
+    Returns:
+        Maximum absolute difference between the two predictions
+
+    Raises:
+        ValueError: If predictions differ beyond tolerance
+    """
+    if X is None:
+        X = np.random.default_rng(0).normal(size=(64, linear.n_features))
+    X = np.asarray(X, dtype=float)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        expected = np.asarray(model.predict(X), dtype=float).reshape(len(X), -1)
+    actual = linear.predict(X).reshape(len(X), -1)
+
+    max_diff = float(np.max(np.abs(expected - actual))) if len(X) else 0.0
+    if not np.allclose(actual, expected, rtol=rtol, atol=atol):
+        raise ValueError(
+            f"Fused predictor does not match the pipeline (max difference {max_diff:.3g})"
+        )
+    return max_diff
+
+
+def export_linear(
+    model: Any,
+    model_path: Union[str, Path],
+    n_features: int,
+    X_check: Optional[np.ndarray] = None,
+    dtype: Any = np.float64,
+    output_path: Optional[Union[str, Path]] = None
+) -> Path:
+    """
+    Fuse a model, verify parity and save it next to its ``.joblib``.
+
+    Args:
+        model: Fitted model
+        model_path: Path the model was saved to (.joblib file)
+        n_features: Number of input wavelengths
+        X_check: Spectra to run the parity check on (optional)
+        dtype: Dtype of the stored coefficients (float32 halves the
+            artifact and scores spectra in float32)
+        output_path: Where to write the ``.npz`` (default: next to the
+            model; e.g. a temporary file the caller renames there and
+            reports)
+
+    Returns:
+        Path to the saved ``.npz`` artifact
+    """
+    linear = fuse_pipeline(model, n_features, dtype)
+    if linear.dtype == np.float32:
+        # float32 rounding of spectra and coefficients
+        max_diff = check_parity(model, linear, X_check, rtol=1e-3, atol=1e-3)
+    else:
+        max_diff = check_parity(model, linear, X_check)
+    saved_path = linear.save(output_path or linear_path_for(model_path))
+    if output_path is None:
+        print(f"💾 Saved fused linear predictor to {saved_path} (max parity diff {max_diff:.2e})")
+    else:
+        # A staged file: the caller reports the path once it is renamed into place
+        print(f"✅ Fused linear predictor matches the model (max parity diff {max_diff:.2e})")
+    return saved_path
+
+
+def main():
+    """Export a fused linear predictor for a trained model."""
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Fuse a trained pipeline into a linear predictor")
+    parser.add_argument("--model", required=True, help="Path to trained model (.joblib)")
+    parser.add_argument("--dtype", choices=["float64", "float32"], default="float64",
+                        help="Dtype of the stored coefficients")
+
+    args = parser.parse_args()
+
+    model_path = Path(args.model)
+    if not model_path.exists():
+        print(f"❌ Model file not found: {model_path}")
+        return 1
+
+    model = joblib.load(model_path)
+    n_features = getattr(model, 'n_features_in_', None)
+    if n_features is None:
+        print("❌ Could not determine the number of input features of the model")
+        return 1
+
+    try:
+        export_linear(model, model_path, n_features, dtype=args.dtype)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Single-pass PLS component path.
+
+NIPALS extracts PLS components one at a time, and the first k components
+do not depend on how many are extracted in total. Fitting once up to the
+largest component count therefore yields the models for every smaller
+count: their rotations are the leading columns of the full rotation
+matrix. This module fits that path and predicts with every component
+count in one matrix product, so a whole component sweep costs about one
+PLS fit per fold instead of one fit per candidate.
+
+The model matches ``Pipeline([StandardScaler, PLSRegression])``: X is
+standardized and Y is centered and scaled as PLSRegression does. For
+multi-target Y, each weight vector comes from the same NIPALS power
+iterations as PLSRegression (start, stopping tolerance and iteration
+cap), so PLS2 paths agree with sklearn's models to rounding as well,
+rather than only to the tolerance of those iterations.
+float32 inputs are fitted and predicted in float32, halving the memory
+of the working copies; anything else is computed in float64.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def _compute_dtype(X: np.ndarray) -> np.dtype:
+    """float32 for float32 input, float64 otherwise."""
+    return np.dtype(np.float32) if np.asarray(X).dtype == np.float32 else np.dtype(np.float64)
+
+
+def _nipals_weights(Xk: np.ndarray, Yk: np.ndarray, max_iter: int = 500,
+                    tol: float = 1e-6) -> Optional[np.ndarray]:
+    """
+    First X weight vector of PLS2 by NIPALS power iterations, computed as
+    sklearn's PLSRegression does. None once every Y residual is constant.
+    """
+    eps = np.finfo(Xk.dtype).eps
+    columns = [col for col in Yk.T if np.any(np.abs(col) > eps)]
+    if not columns:
+        return None
+
+    y_score = columns[0]
+    w_old = None
+    for _ in range(max_iter):
+        w = Xk.T @ y_score / (y_score @ y_score)
+        w /= np.sqrt(w @ w) + eps
+        x_score = Xk @ w
+        c = Yk.T @ x_score / (x_score @ x_score)
+        y_score = Yk @ c / (c @ c + eps)
+        if w_old is not None and (w - w_old) @ (w - w_old) < tol:
+            break
+        w_old = w
+    return w
+
+
+def fit_path(
+    X: np.ndarray,
+    Y: np.ndarray,
+    max_components: int
+) -> Dict[str, np.ndarray]:
+    """
+    Fit PLS with NIPALS up to ``max_components`` components.
+
+    Args:
+        X: Spectra of shape (n_samples, n_features)
+        Y: Targets of shape (n_samples,) or (n_samples, n_targets)
+        max_components: Number of components to extract
+
+    Returns:
+        Dictionary with ``x_mean``, ``x_std``, ``y_mean``, ``y_std``,
+        ``rotations`` (n_features, A), ``x_loadings`` (n_features, A) and
+        ``y_loadings`` (n_targets, A)
+    """
+    dtype = _compute_dtype(X)
+    X = np.asarray(X, dtype=dtype)
+    Y = np.asarray(Y, dtype=dtype).reshape(len(X), -1)
+
+    x_mean = X.mean(axis=0)
+    x_std = X.std(axis=0)
+    x_std[x_std == 0.0] = 1.0
+    y_mean = Y.mean(axis=0)
+    y_std = Y.std(axis=0, ddof=1) if len(Y) > 1 else np.ones(Y.shape[1], dtype=dtype)
+    y_std[y_std == 0.0] = 1.0
+
+    Xk = (X - x_mean) / x_std
+    Yk = (Y - y_mean) / y_std
+
+    n_features, n_targets = X.shape[1], Y.shape[1]
+    n_components = min(max_components, n_features, max(len(X) - 1, 1))
+    weights = np.zeros((n_features, n_components), dtype=dtype)
+    x_loadings = np.zeros((n_features, n_components), dtype=dtype)
+    y_loadings = np.zeros((n_targets, n_components), dtype=dtype)
+
+    for a in range(n_components):
+        if n_targets == 1:
+            w = Xk.T @ Yk[:, 0]
+        else:
+            # Targets explained to rounding don't steer the next component
+            Yk[:, np.all(np.abs(Yk) < 10 * np.finfo(dtype).eps, axis=0)] = 0.0
+            w = _nipals_weights(Xk, Yk)
+            if w is None:
+                n_components = a
+                break
+
+        norm = np.linalg.norm(w)
+        if norm == 0.0:
+            # X is fully explained; further components carry no signal
+            n_components = a
+            break
+        w = w / norm
+
+        t = Xk @ w
+        tt = t @ t
+        p = Xk.T @ t / tt
+        q = Yk.T @ t / tt
+        Xk -= np.outer(t, p)
+        Yk -= np.outer(t, q)
+
+        weights[:, a] = w
+        x_loadings[:, a] = p
+        y_loadings[:, a] = q
+
+    weights = weights[:, :n_components]
+    x_loadings = x_loadings[:, :n_components]
+    y_loadings = y_loadings[:, :n_components]
+
+    # Rotations map standardized X to scores: r_a = w_a - sum_b r_b (p_b . w_a).
+    # They are nested, so the first k columns give the k-component model.
+    rotations = np.zeros_like(weights)
+    for a in range(n_components):
+        rotations[:, a] = weights[:, a] - rotations[:, :a] @ (x_loadings[:, :a].T @ weights[:, a])
+
+    return {
+        'x_mean': x_mean,
+        'x_std': x_std,
+        'y_mean': y_mean,
+        'y_std': y_std,
+        'rotations': rotations,
+        'x_loadings': x_loadings,
+        'y_loadings': y_loadings
+    }
+
+
+def predict_path(path: Dict[str, np.ndarray], X: np.ndarray) -> np.ndarray:
+    """
+    Predict with every component count of a fitted path at once.
+
+    Args:
+        path: Result of fit_path
+        X: Spectra of shape (n_samples, n_features)
+
+    Returns:
+        Array of shape (n_samples, n_components, n_targets) whose
+        ``[:, k - 1]`` slice holds the predictions of the k-component model
+    """
+    X = np.asarray(X, dtype=path['rotations'].dtype)
+    scores = ((X - path['x_mean']) / path['x_std']) @ path['rotations']
+    contributions = scores[:, :, None] * path['y_loadings'].T[None, :, :]
+    return path['y_mean'] + np.cumsum(contributions, axis=1) * path['y_std']
+
+
+def cv_path(
+    X: np.ndarray,
+    Y: np.ndarray,
+    folds: Sequence[Tuple[np.ndarray, np.ndarray]],
+    components: Sequence[int]
+) -> Dict[str, object]:
+    """
+    Cross-validate every candidate component count with one fit per fold.
+
+    Args:
+        X: Spectra of shape (n_samples, n_features)
+        Y: Targets of shape (n_samples,) or (n_samples, n_targets)
+        folds: (train_idx, val_idx) index arrays per fold
+        components: Candidate component counts
+
+    Returns:
+        Dictionary with ``components`` (the candidates that could be
+        evaluated on every fold), ``fold_mse`` of shape (n_folds,
+        n_candidates, n_targets), and ``oof`` out-of-fold predictions of
+        shape (n_samples, n_candidates, n_targets)
+    """
+    dtype = _compute_dtype(X)
+    X = np.asarray(X, dtype=dtype)
+    Y_true = np.asarray(Y, dtype=float).reshape(len(X), -1)
+    Y = Y_true.astype(dtype, copy=False)
+    components = sorted(set(int(k) for k in components))
+
+    fold_paths: List[Tuple[np.ndarray, np.ndarray]] = []
+    max_fitted = max(components)
+    for train_idx, val_idx in folds:
+        path = fit_path(X[train_idx], Y[train_idx], max(components))
+        max_fitted = min(max_fitted, path['rotations'].shape[1])
+        fold_paths.append((val_idx, predict_path(path, X[val_idx])))
+
+    components = [k for k in components if k <= max_fitted]
+    if not components:
+        raise ValueError("No candidate component count could be fitted on every fold")
+    columns = np.array(components) - 1
+
+    oof = np.full((len(X), len(components), Y.shape[1]), np.nan)
+    fold_mse = np.zeros((len(fold_paths), len(components), Y.shape[1]))
+    for i, (val_idx, predictions) in enumerate(fold_paths):
+        # Score in float64 whatever the compute dtype
+        predictions = predictions[:, columns].astype(float)
+        oof[val_idx] = predictions
+        fold_mse[i] = ((predictions - Y_true[val_idx, None, :]) ** 2).mean(axis=0)
+
+    return {'components': components, 'fold_mse': fold_mse, 'oof': oof}
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Compare float32 and float64 PLS models on the same folds.
+
+Runs the single-pass component path (src.models.pls_path) on a crop's
+cleaned spectra once in float64 and once in float32, with the same split
+manifest, and reports CV RMSE per number of components, the chosen
+number of components, per-fold R²/RMSE, how far the out-of-fold
+predictions move, and the memory and fit time of each run. The report is
+saved as ``models/{crop}__{target}__dtype_report.json``; the script exits
+non-zero when float32 loses more accuracy than ``--max-rmse-increase``.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.data.splits import load_folds, splits_path
+from src.models.pls_path import cv_path
+from src.models.train_pls import COMPONENT_GRID, fold_metrics
+
+
+DTYPES = ['float64', 'float32']
+
+
+def run_dtype(X, y, folds, dtype):
+    """
+    Component-path cross-validation with the spectra cast to dtype.
+
+    Returns:
+        Dictionary of metrics plus the out-of-fold predictions (``oof``)
+    """
+    X = np.ascontiguousarray(X, dtype=dtype)
+
+    start = time.perf_counter()
+    cv = cv_path(X, y, folds, COMPONENT_GRID)
+    seconds = time.perf_counter() - start
+
+    mean_mse = cv['fold_mse'].mean(axis=(0, 2))
+    best = int(np.argmin(mean_mse))
+    fold_scores = [
+        fold_metrics(y[val_idx], cv['oof'][val_idx, best, 0]) for _, val_idx in folds
+    ]
+
+    return {
+        'best_n_components': int(cv['components'][best]),
+        'cv_rmse': float(np.sqrt(mean_mse[best])),
+        'cv_rmse_by_components': {
+            int(k): float(np.sqrt(mse)) for k, mse in zip(cv['components'], mean_mse)
+        },
+        'fold_scores': fold_scores,
+        'X_mb': X.nbytes / 1e6,
+        'fit_seconds': seconds,
+        'oof': cv['oof'][:, :, 0]
+    }
+
+
+def compare(X, y, folds):
+    """
+    Run both dtypes and compare them.
+
+    Returns:
+        Report dictionary with per-dtype results and their differences
+    """
+    results = {dtype: run_dtype(X, y, folds, dtype) for dtype in DTYPES}
+    ref, low = results['float64'], results['float32']
+
+    # Compare both models at the float64 choice of components
+    columns = list(ref['cv_rmse_by_components']).index(ref['best_n_components'])
+    assigned = ~np.isnan(ref['oof'][:, columns])
+    oof_diff = np.abs(ref['oof'][assigned, columns] - low['oof'][assigned, columns])
+
+    rmse_64 = ref['cv_rmse_by_components'][ref['best_n_components']]
+    rmse_32 = low['cv_rmse_by_components'][ref['best_n_components']]
+
+    report = {dtype: {k: v for k, v in result.items() if k != 'oof'}
+              for dtype, result in results.items()}
+    report['comparison'] = {
+        'same_n_components': ref['best_n_components'] == low['best_n_components'],
+        'rmse_increase': float((rmse_32 - rmse_64) / rmse_64) if rmse_64 else 0.0,
+        'max_r2_difference': float(max(
+            abs(a['r2'] - b['r2']) for a, b in zip(ref['fold_scores'], low['fold_scores'])
+        )) if folds else 0.0,
+        'max_prediction_difference': float(oof_diff.max()) if len(oof_diff) else 0.0,
+        'memory_ratio': low['X_mb'] / ref['X_mb'] if ref['X_mb'] else 1.0
+    }
+    return report
+
+
+def main():
+    """Compare float32 and float64 models on the same folds."""
+    parser = argparse.ArgumentParser(description="float32 vs float64 accuracy report")
+    parser.add_argument("--crop", default="carrots", help="Crop name")
+    parser.add_argument("--target", default="antioxidants", help="Target variable")
+    parser.add_argument("--max-rmse-increase", type=float, default=0.005,
+                        help="Largest acceptable relative CV RMSE increase for float32")
+
+    args = parser.parse_args()
+
+    print(f"🔬 Comparing float32 and float64 for {args.crop} - {args.target}")
+
+    clean_dir = Path("data/clean")
+    X_path = clean_dir / f"{args.crop}__X.parquet"
+    y_path = clean_dir / f"{args.crop}__y__{args.target}.parquet"
+    folds_path = splits_path(clean_dir, args.crop)
+    wavelengths_path = clean_dir / f"{args.crop}__wavelengths.json"
+
+    for path in [X_path, y_path, folds_path, wavelengths_path]:
+        if path is None or not path.exists():
+            print(f"❌ Required file not found: {path or clean_dir / 'splits'}")
+            print(f"   Run: python -m src.data.clean_bi --crop {args.crop} --target {args.target}")
+            return 1
+
+    with open(wavelengths_path, 'r') as f:
+        wavelengths = json.load(f)
+
+    import pandas as pd
+    X = pd.read_parquet(X_path, columns=wavelengths)
+    y = pd.read_parquet(y_path).iloc[:, 0]
+
+    # float32-cleaned spectra can only be compared against themselves upcast
+    stored = str(X.dtypes.iloc[0]) if X.shape[1] else "float64"
+    if stored != "float64":
+        print(f"⚠️  Spectra are stored as {stored}; the float64 run uses them upcast")
+
+    present = y.notna().to_numpy()
+    folds = load_folds(folds_path, mask=None if present.all() else present)
+    X = X.to_numpy()[present]
+    y = y.to_numpy(dtype=float)[present]
+
+    print(f"📊 Data loaded: {X.shape[0]} samples, {X.shape[1]} features, {len(folds)} folds")
+
+    report = compare(X, y, folds)
+    report.update({'crop': args.crop, 'target': args.target, 'stored_dtype': stored})
+    comparison = report['comparison']
+
+    print(f"\n📈 Results:")
+    for dtype in DTYPES:
+        result = report[dtype]
+        print(f"   {dtype}: {result['best_n_components']} components, "
+              f"CV RMSE {result['cv_rmse']:.4f}, X {result['X_mb']:.1f} MB, "
+              f"fit {result['fit_seconds']:.2f}s")
+    print(f"   RMSE change: {comparison['rmse_increase']:+.4%}")
+    print(f"   Max fold R² difference: {comparison['max_r2_difference']:.2e}")
+    print(f"   Max prediction difference: {comparison['max_prediction_difference']:.2e}")
+    if not comparison['same_n_components']:
+        print("⚠️  float32 picks a different number of components")
+
+    models_dir = Path("models")
+    models_dir.mkdir(exist_ok=True)
+    report_path = models_dir / f"{args.crop}__{args.target}__dtype_report.json"
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"💾 Saved report to {report_path}")
+
+    if comparison['rmse_increase'] > args.max_rmse_increase:
+        print(f"❌ float32 increases CV RMSE by more than {args.max_rmse_increase:.2%}")
+        return 1
+
+    print("✅ float32 is within tolerance")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
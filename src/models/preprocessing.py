@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Vectorized spectral preprocessing for PLS models.
+
+Scatter and baseline corrections are applied to the whole spectra matrix
+at once, as the first step of the training pipeline, and saved with the
+model so inference applies exactly the same transform:
+
+- ``snv``: standard normal variate, each spectrum centred and scaled by
+  its own mean and standard deviation (row-wise, broadcast)
+- ``detrend``: removes a polynomial baseline across the wavelength axis,
+  one projection onto a precomputed orthonormal polynomial basis
+- ``sg``, ``sg1``, ``sg2``: Savitzky-Golay smoothing, first and second
+  derivative; the convolution kernel is precomputed from the window and
+  polynomial order and applied as a few shifted multiply-adds over the
+  matrix (edges padded with the nearest value)
+
+Methods are chained with ``+`` and applied left to right, e.g.
+``snv+sg1``. Every method works on each spectrum independently, so
+fitting learns nothing and transforming a batch of spectra is the same
+as transforming them one at a time.
+
+SpectralPreprocessor implements the estimator protocol sklearn uses
+(``fit``/``transform``/``get_params``/``set_params``) without importing
+sklearn, so it can be searched over in GridSearchCV and still be loaded
+by the API, which never imports sklearn.
+"""
+
+import math
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+METHODS = ('snv', 'detrend', 'sg', 'sg1', 'sg2')
+
+# Savitzky-Golay derivative order of each method
+SAVGOL_DERIVATIVES = {'sg': 0, 'sg1': 1, 'sg2': 2}
+
+# Prefix of the preprocessing arrays inside a fused ``.npz`` artifact
+ARRAY_PREFIX = "preprocess_"
+
+
+def parse_method(method: str) -> List[str]:
+    """
+    Split a ``+``-joined chain of methods; ``none`` is the empty chain.
+
+    Raises:
+        ValueError: If the chain contains an unknown method
+    """
+    if method in (None, '', 'none'):
+        return []
+    steps = method.split('+')
+    unknown = [step for step in steps if step not in METHODS]
+    if unknown:
+        raise ValueError(f"Unknown preprocessing method(s) {unknown}; choose from "
+                         f"{', '.join(METHODS)} or chains such as 'snv+sg1'")
+    return steps
+
+
+@lru_cache(maxsize=32)
+def savgol_kernel(window: int, polyorder: int, deriv: int = 0) -> np.ndarray:
+    """
+    Savitzky-Golay correlation kernel: the weights that give the ``deriv``-th
+    derivative of the degree-``polyorder`` least-squares polynomial fitted
+    to a ``window`` of points, at the window's centre.
+    """
+    if window % 2 == 0 or window < 3:
+        raise ValueError(f"Savitzky-Golay window must be odd and at least 3, got {window}")
+    if not deriv <= polyorder < window:
+        raise ValueError(f"Savitzky-Golay needs deriv <= polyorder < window, got "
+                         f"deriv={deriv}, polyorder={polyorder}, window={window}")
+    half = window // 2
+    positions = np.arange(-half, half + 1, dtype=float)
+    vander = np.vander(positions, polyorder + 1, increasing=True)
+    kernel = np.linalg.pinv(vander)[deriv] * math.factorial(deriv)
+    kernel.setflags(write=False)
+    return kernel
+
+
+@lru_cache(maxsize=32)
+def polynomial_basis(n_features: int, degree: int) -> np.ndarray:
+    """Orthonormal basis (n_features, degree + 1) of polynomials over the wavelength index."""
+    positions = np.linspace(-1.0, 1.0, n_features)
+    basis, _ = np.linalg.qr(np.vander(positions, degree + 1, increasing=True))
+    basis.setflags(write=False)
+    return basis
+
+
+def snv(X: np.ndarray) -> np.ndarray:
+    """Standard normal variate of each row."""
+    centred = X - X.mean(axis=1, keepdims=True)
+    std = np.sqrt(np.einsum('ij,ij->i', centred, centred) / max(X.shape[1] - 1, 1))
+    std[std == 0] = 1.0
+    centred /= std[:, None]
+    return centred
+
+
+def detrend(X: np.ndarray, degree: int = 2) -> np.ndarray:
+    """Remove each row's least-squares polynomial baseline of the given degree."""
+    basis = polynomial_basis(X.shape[1], degree).astype(X.dtype, copy=False)
+    return X - (X @ basis) @ basis.T
+
+
+def savgol(X: np.ndarray, window: int = 11, polyorder: int = 2, deriv: int = 0) -> np.ndarray:
+    """Savitzky-Golay filter along each row, with edges padded by the nearest value."""
+    kernel = savgol_kernel(window, polyorder, deriv).astype(X.dtype)
+    half = window // 2
+    n_samples, n_features = X.shape
+    padded = np.empty((n_samples, n_features + 2 * half), dtype=X.dtype)
+    padded[:, half:half + n_features] = X
+    padded[:, :half] = X[:, :1]
+    padded[:, half + n_features:] = X[:, -1:]
+
+    out = kernel[0] * padded[:, :n_features]
+    for k in range(1, window):
+        out += kernel[k] * padded[:, k:k + n_features]
+    return out
+
+
+class SpectralPreprocessor:
+    """
+    Chain of row-wise spectral preprocessing methods.
+
+    Args:
+        method: ``none``, one of METHODS, or a ``+``-joined chain of them
+        window: Savitzky-Golay window length (odd)
+        polyorder: Savitzky-Golay polynomial order
+        degree: Polynomial degree removed by ``detrend``
+    """
+
+    def __init__(self, method: str = 'none', window: int = 11, polyorder: int = 2, degree: int = 2):
+        self.method = method
+        self.window = window
+        self.polyorder = polyorder
+        self.degree = degree
+
+    @property
+    def steps(self) -> List[str]:
+        return parse_method(self.method)
+
+    @property
+    def is_identity(self) -> bool:
+        return not self.steps
+
+    def get_params(self, deep: bool = True) -> Dict[str, Any]:
+        return {'method': self.method, 'window': self.window,
+                'polyorder': self.polyorder, 'degree': self.degree}
+
+    def set_params(self, **params: Any) -> "SpectralPreprocessor":
+        for name, value in params.items():
+            if name not in self.get_params():
+                raise ValueError(f"Invalid parameter {name!r} for SpectralPreprocessor")
+            setattr(self, name, value)
+        return self
+
+    def fit(self, X: Any, y: Any = None) -> "SpectralPreprocessor":
+        """Validate the parameters; the methods are row-wise and learn nothing."""
+        for step in self.steps:
+            if step in SAVGOL_DERIVATIVES:
+                savgol_kernel(self.window, self.polyorder, SAVGOL_DERIVATIVES[step])
+        return self
+
+    def transform(self, X: Any) -> np.ndarray:
+        """Apply the chain to a 2D array of spectra, keeping float32 input in float32."""
+        X = np.asarray(X)
+        if X.dtype != np.float32:
+            X = X.astype(float, copy=False)
+        for step in self.steps:
+            if step == 'snv':
+                X = snv(X)
+            elif step == 'detrend':
+                X = detrend(X, self.degree)
+            else:
+                X = savgol(X, self.window, self.polyorder, SAVGOL_DERIVATIVES[step])
+        return X
+
+    def fit_transform(self, X: Any, y: Any = None) -> np.ndarray:
+        return self.fit(X, y).transform(X)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Arrays to store in a ``.npz`` next to the model coefficients."""
+        return {f"{ARRAY_PREFIX}{name}": np.array(value) for name, value in self.get_params().items()}
+
+    @classmethod
+    def from_arrays(cls, arrays: Any) -> "SpectralPreprocessor":
+        """Rebuild from the arrays written by to_arrays (e.g. an open ``.npz``)."""
+        return cls(str(arrays[f"{ARRAY_PREFIX}method"]),
+                   *(int(arrays[f"{ARRAY_PREFIX}{name}"]) for name in ('window', 'polyorder', 'degree')))
+
+    def __repr__(self) -> str:
+        params = ", ".join(f"{name}={value!r}" for name, value in self.get_params().items())
+        return f"SpectralPreprocessor({params})"
+
+
+def split_preprocessing(model: Any) -> Tuple[Optional[SpectralPreprocessor], Any]:
+    """
+    Split a fitted pipeline into its leading spectral preprocessing step
+    and the affine remainder (scaler and PLS).
+
+    Returns:
+        Tuple of (preprocessor, or None if the pipeline has none or it is
+        the identity; the rest of the pipeline)
+    """
+    steps = getattr(model, 'steps', None)
+    if steps and isinstance(steps[0][1], SpectralPreprocessor):
+        preprocessor = steps[0][1]
+        return (None if preprocessor.is_identity else preprocessor), model[1:]
+    return None, model
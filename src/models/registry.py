@@ -0,0 +1,611 @@
+#!/usr/bin/env python3
+"""
+In-process registry of trained models.
+
+The registry loads each trained pipeline and its wavelength list once and
+keeps them in memory keyed by (crop, target, version), so that serving a
+prediction does not have to unpickle the model or re-read JSON from disk.
+Models are reloaded automatically when the ``.joblib`` file changes on disk.
+When an up-to-date fused ``.npz`` predictor (see src.models.linear) sits next
+to the ``.joblib``, it is loaded instead of unpickling the pipeline, and
+joblib/sklearn are never imported.
+
+The registry can serve many crop/target pairs from one process: models are
+loaded lazily on first use, the least recently used ones are evicted when
+the configured memory budget is exceeded, and idle models are dropped.
+
+A crop's multi-target (PLS2) model, ``{crop}__multi__pls2``, is served
+like any other under the target name ``multi``; its predictions carry one
+value and interval per nutrient, all from the same matrix product.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union, Any
+
+import numpy as np
+
+from src.data.wavelengths import wavelength_axis
+from src.models.domain import DomainLimits
+from src.models.intervals import PredictionIntervals
+from src.models.linear import LinearPredictor, linear_path_for
+from src.models.preprocessing import split_preprocessing
+from src.models.resample import resample
+
+
+ModelKey = Tuple[str, str, str]
+
+# Per-spectrum T²/Q arrays and limit flags (see src.models.domain)
+DomainFlags = Dict[str, np.ndarray]
+
+# Crop, target and version names that may appear in a model file name
+MODEL_NAME_PART = re.compile(r'[A-Za-z0-9][A-Za-z0-9_.+-]*')
+
+
+class InvalidModelNameError(ValueError):
+    """Raised when a crop, target or version can't be part of a model file name."""
+
+
+def parse_model_name(model_path: Union[str, Path]) -> ModelKey:
+    """
+    Split a model file name of the form ``{crop}__{target}__{version}.joblib``.
+
+    Args:
+        model_path: Path to trained model (.joblib file)
+
+    Returns:
+        Tuple of (crop, target, version). Missing parts are returned as
+        empty strings.
+    """
+    parts = Path(model_path).stem.split('__')
+    parts += [''] * (3 - len(parts))
+    return parts[0], parts[1], '__'.join(parts[2:])
+
+
+def domain_row(domain: Optional[DomainFlags], i: int) -> Optional[Dict[str, Any]]:
+    """JSON-ready T²/Q statistics and flags of row ``i``, or None without domain limits."""
+    if domain is None:
+        return None
+    return {
+        't2': float(domain['t2'][i]),
+        'q': float(domain['q'][i]),
+        't2_exceeded': bool(domain['t2_exceeded'][i]),
+        'q_exceeded': bool(domain['q_exceeded'][i])
+    }
+
+
+def prediction_row(
+    targets: Optional[List[str]],
+    predictions: np.ndarray,
+    lower: np.ndarray,
+    upper: np.ndarray,
+    i: int
+) -> Dict[str, Any]:
+    """
+    JSON-ready prediction and interval of row ``i``.
+
+    Multi-target models (``targets`` given) report them per target under
+    ``targets``, with ``prediction`` and ``confidence_interval`` None.
+    """
+    if targets is None:
+        return {
+            'prediction': float(predictions[i]),
+            'confidence_interval': {'lower': float(lower[i]), 'upper': float(upper[i])}
+        }
+    return {
+        'prediction': None,
+        'confidence_interval': None,
+        'targets': {
+            target: {
+                'prediction': float(predictions[i, j]),
+                'confidence_interval': {'lower': float(lower[i, j]), 'upper': float(upper[i, j])}
+            }
+            for j, target in enumerate(targets)
+        }
+    }
+
+
+def _mtime(path: Path) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+def find_wavelengths_file(
+    crop: str,
+    model_dir: Union[str, Path],
+    clean_dir: Union[str, Path] = "data/clean"
+) -> Optional[Path]:
+    """Locate ``{crop}__wavelengths.json`` next to the model or in data/clean."""
+    for directory in (Path(model_dir), Path(clean_dir)):
+        candidate = directory / f"{crop}__wavelengths.json"
+        if candidate.exists():
+            return candidate
+    return None
+
+
+class LoadedModel:
+    """
+    A trained model held in memory together with its wavelength list.
+
+    ``model`` is either the sklearn pipeline or its fused LinearPredictor;
+    both expose ``predict`` on a 2D array. Spectra are converted to the
+    model's ``dtype`` (float32 for float32 artifacts), so float32 request
+    bodies reach a float32 model without a copy.
+    """
+
+    def __init__(
+        self,
+        model_path: Path,
+        model: Any,
+        mtime: float,
+        wavelengths: Optional[List[str]] = None,
+        wavelengths_path: Optional[Path] = None,
+        nbytes: int = 0,
+        linear_mtime: Optional[float] = None
+    ):
+        self.model_path = model_path
+        self.model = model
+        self.mtime = mtime
+        self.linear_mtime = linear_mtime
+        self.wavelengths = wavelengths
+        self.wavelengths_path = wavelengths_path
+        self.nbytes = nbytes
+        self.last_used = time.monotonic()
+        self.crop, self.target, self.version = parse_model_name(model_path)
+        self._axis: Optional[np.ndarray] = None
+
+    @property
+    def key(self) -> ModelKey:
+        return self.crop, self.target, self.version
+
+    @property
+    def dtype(self) -> np.dtype:
+        """Dtype spectra are scored in."""
+        if isinstance(self.model, LinearPredictor):
+            return self.model.dtype
+        return np.dtype(np.float64)
+
+    @property
+    def intervals(self) -> Optional[PredictionIntervals]:
+        """Calibrated prediction intervals stored with the model, if any."""
+        if isinstance(self.model, LinearPredictor):
+            return self.model.intervals
+        return getattr(self.model, 'intervals_', None)
+
+    @property
+    def domain(self) -> Optional[DomainLimits]:
+        """Applicability-domain limits stored with the model, if any."""
+        if isinstance(self.model, LinearPredictor):
+            return self.model.domain
+        return getattr(self.model, 'domain_', None)
+
+    @property
+    def targets(self) -> Optional[List[str]]:
+        """Target names of a multi-target model, None for single-target models."""
+        if isinstance(self.model, LinearPredictor):
+            return self.model.targets
+        return getattr(self.model, 'targets_', None)
+
+    @property
+    def n_wavelengths(self) -> Optional[int]:
+        return len(self.wavelengths) if self.wavelengths is not None else None
+
+    @property
+    def wavelength_axis(self) -> np.ndarray:
+        """Numeric wavelengths the model expects, parsed from its wavelength list."""
+        if self._axis is None:
+            if self.wavelengths is None:
+                raise ValueError("Model has no wavelengths file, so spectra can't be resampled")
+            self._axis = wavelength_axis(self.wavelengths)
+        return self._axis
+
+    def align(self, X: np.ndarray, wavelengths: Union[List[float], np.ndarray]) -> np.ndarray:
+        """Resample spectra measured at ``wavelengths`` onto the model's grid."""
+        return resample(X, wavelengths, self.wavelength_axis)
+
+    def prepare(
+        self,
+        spectrum: Union[List[float], np.ndarray],
+        wavelengths: Optional[Union[List[float], np.ndarray]] = None
+    ) -> np.ndarray:
+        """
+        Validate a spectrum and resample it onto the model's grid if it
+        comes with its own wavelength axis.
+        """
+        spectrum = np.asarray(spectrum, dtype=self.dtype)
+        if wavelengths is None:
+            self.validate(spectrum)
+            return spectrum
+
+        if len(spectrum) != len(wavelengths):
+            raise ValueError(
+                f"Spectrum length ({len(spectrum)}) doesn't match "
+                f"its wavelengths ({len(wavelengths)})"
+            )
+        if not np.isfinite(spectrum).all():
+            raise ValueError("Spectrum contains missing or non-finite values")
+        return self.align(spectrum, wavelengths)
+
+    def validate(self, spectrum: np.ndarray) -> None:
+        """Raise ValueError if the spectrum doesn't match the wavelength list or isn't finite."""
+        if self.wavelengths is not None and len(spectrum) != len(self.wavelengths):
+            raise ValueError(
+                f"Spectrum length ({len(spectrum)}) doesn't match "
+                f"expected wavelengths ({len(self.wavelengths)})"
+            )
+        if not np.isfinite(spectrum).all():
+            raise ValueError("Spectrum contains missing or non-finite values")
+
+    def predict_matrix(
+        self,
+        X: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Optional[DomainFlags]]:
+        """
+        Predict a 2D array of validated spectra with one model call.
+
+        Intervals come from the calibration stored with the model at
+        training time (see src.models.intervals). Models trained before
+        intervals were calibrated fall back to ±1.28 × 10% of the
+        prediction. Models with applicability-domain limits (see
+        src.models.domain) also return each spectrum's Hotelling T² and
+        Q residual, computed in the same matrix product as the prediction.
+
+        Args:
+            X: Spectra as an array of shape (n_spectra, n_wavelengths)
+
+        Returns:
+            Tuple of (predictions, lower bounds, upper bounds, domain flags
+            or None); predictions and bounds have shape (n_spectra,), or
+            (n_spectra, n_targets) for multi-target models
+        """
+        intervals, domain = self.intervals, self.domain
+        shape = (len(X),) if self.targets is None else (len(X), len(self.targets))
+        statistics = None
+        if isinstance(self.model, LinearPredictor) and intervals is not None:
+            predictions, half_width, statistics = self.model.predict_with_domain(X)
+            predictions = np.asarray(predictions, dtype=float).reshape(shape)
+            half_width = np.asarray(half_width, dtype=float).reshape(shape)
+        else:
+            predictions = np.asarray(self.model.predict(X), dtype=float).reshape(shape)
+            if intervals is not None:
+                preprocessor, _ = split_preprocessing(self.model)
+                X = preprocessor.transform(X) if preprocessor is not None else X
+                scores = intervals.scores(X)
+                half_width = intervals.half_width_from_scores(scores).reshape(shape)
+                if domain is not None:
+                    statistics = domain.statistics(X, scores)
+            else:
+                # Legacy approximation: 10% of the prediction as residual std,
+                # 80% interval is approximately 1.28 standard deviations
+                half_width = 1.28 * 0.1 * np.abs(predictions)
+
+        flags = domain.flags(*statistics) if statistics is not None else None
+        return predictions, predictions - half_width, predictions + half_width, flags
+
+    def predict(
+        self,
+        spectrum: Union[List[float], np.ndarray],
+        wavelengths: Optional[Union[List[float], np.ndarray]] = None
+    ) -> Dict[str, Any]:
+        """
+        Predict nutrient value from a single NIR spectrum.
+
+        Args:
+            spectrum: NIR spectrum as list or array
+            wavelengths: Wavelengths the spectrum was measured at, if they
+                differ from the model's (optional)
+
+        Returns:
+            Dictionary with prediction, confidence interval (per target
+            under ``targets`` for multi-target models), T²/Q domain
+            statistics (None without domain limits), and metadata
+        """
+        spectrum = np.asarray(spectrum, dtype=self.dtype)
+        aligned = self.prepare(spectrum, wavelengths)
+
+        # sklearn expects a 2D array
+        predictions, lower, upper, domain = self.predict_matrix(aligned.reshape(1, -1))
+
+        return {
+            **prediction_row(self.targets, predictions, lower, upper, 0),
+            'domain': domain_row(domain, 0),
+            'metadata': self.metadata(len(spectrum))
+        }
+
+    def predict_batch(
+        self,
+        spectra: Union[List[List[float]], np.ndarray],
+        wavelengths: Optional[Union[List[float], np.ndarray]] = None,
+        timings: Optional[Dict[str, float]] = None
+    ) -> Dict[str, Any]:
+        """
+        Predict nutrient values for many spectra with one model call.
+
+        All rows are validated against the wavelength list in one pass;
+        rows that fail validation get an error instead of a prediction and
+        do not fail the rest of the batch.
+
+        When the spectra come with their own wavelength axis, all valid rows
+        are resampled onto the model's grid in one sparse matrix product.
+
+        Args:
+            spectra: NIR spectra as a list of lists or a 2D array
+            wavelengths: Wavelengths the spectra were measured at, if they
+                differ from the model's (optional)
+            timings: Dictionary that receives the seconds spent on
+                ``validate`` (including resampling) and ``predict`` (optional)
+
+        Returns:
+            Dictionary with per-row results and metadata
+        """
+        start = time.perf_counter()
+        results: List[Dict[str, Any]] = [{'index': i} for i in range(len(spectra))]
+        expected = len(wavelengths) if wavelengths is not None else self.n_wavelengths
+
+        if isinstance(spectra, np.ndarray) and spectra.ndim == 2:
+            X = spectra.astype(self.dtype, copy=False)
+            valid = np.ones(len(X), dtype=bool)
+            if expected is not None and X.shape[1] != expected:
+                valid[:] = False
+                for result in results:
+                    result['error'] = (f"Spectrum length ({X.shape[1]}) doesn't match "
+                                       f"expected wavelengths ({expected})")
+        else:
+            lengths = np.fromiter((len(row) for row in spectra), dtype=int, count=len(spectra))
+            width = expected if expected is not None else (
+                int(np.bincount(lengths).argmax()) if len(lengths) else 0)
+            valid = lengths == width
+            for i in np.flatnonzero(~valid):
+                results[i]['error'] = (f"Spectrum length ({lengths[i]}) doesn't match "
+                                       f"expected wavelengths ({width})")
+            X = np.full((len(spectra), width), np.nan, dtype=self.dtype)
+            if valid.any():
+                X[valid] = [row for row, ok in zip(spectra, valid) if ok]
+
+        finite = np.isfinite(X).all(axis=1) if X.size else valid
+        for i in np.flatnonzero(valid & ~finite):
+            results[i]['error'] = "Spectrum contains missing or non-finite values"
+        valid &= finite
+
+        rows = np.flatnonzero(valid)
+        if len(rows) and wavelengths is not None:
+            X_valid = self.align(X[rows], wavelengths)
+        else:
+            X_valid = X[rows]
+        scored = time.perf_counter()
+        if len(rows):
+            predictions, lower, upper, domain = self.predict_matrix(X_valid)
+            targets = self.targets
+            for j, i in enumerate(rows):
+                results[i].update(prediction_row(targets, predictions, lower, upper, j))
+                if domain is not None:
+                    results[i]['domain'] = domain_row(domain, j)
+
+        metadata = self.metadata(expected if expected is not None else X.shape[1])
+        metadata.update({'n_spectra': len(results), 'n_errors': len(results) - len(rows)})
+
+        if timings is not None:
+            timings['validate'] = scored - start
+            timings['predict'] = time.perf_counter() - scored
+        return {'predictions': results, 'metadata': metadata}
+
+    def metadata(self, spectrum_length: int) -> Dict[str, Any]:
+        """Metadata returned alongside predictions."""
+        intervals, domain = self.intervals, self.domain
+        return {
+            'model_path': str(self.model_path),
+            'targets': self.targets,
+            'spectrum_length': spectrum_length,
+            'wavelengths_file': str(self.wavelengths_path) if self.wavelengths_path else None,
+            'interval_level': intervals.level if intervals is not None else None,
+            'domain_limits': domain.summary() if domain is not None else None
+        }
+
+
+class ModelRegistry:
+    """
+    Thread-safe cache of loaded models keyed by (crop, target, version).
+
+    Each lookup stats the ``.joblib`` file and its fused ``.npz`` and
+    reloads the model when either mtime has changed, so retrained models
+    are picked up without a restart (even when a lookup lands between the
+    two files being replaced). Models are read from disk outside the
+    registry lock, one loader per key, so a cold load never holds up
+    lookups of models already in memory.
+    
+    Args:
+        models_dir: Directory containing ``{crop}__{target}__*.joblib`` files
+        clean_dir: Fallback directory for ``{crop}__wavelengths.json``
+        max_bytes: Memory budget for loaded models; least recently used
+            models are evicted beyond it (None for no limit). The size of a
+            model is estimated from its ``.joblib`` file.
+        idle_seconds: Evict models not used for this long (None to keep)
+    """
+
+    def __init__(self, models_dir: Union[str, Path] = "models",
+                 clean_dir: Union[str, Path] = "data/clean",
+                 max_bytes: Optional[int] = None,
+                 idle_seconds: Optional[float] = None):
+        self.models_dir = Path(models_dir)
+        self.clean_dir = Path(clean_dir)
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self._models: "OrderedDict[ModelKey, LoadedModel]" = OrderedDict()
+        self._lock = threading.Lock()
+        # One lock per key, held while that model is read from disk
+        self._loading: Dict[ModelKey, threading.Lock] = {}
+
+    def resolve(self, crop: str, target: str, version: Optional[str] = None) -> Path:
+        """
+        Find the model file for a crop/target pair.
+
+        If no version is given, the most recently modified
+        ``{crop}__{target}__*.joblib`` is used.
+
+        Raises:
+            InvalidModelNameError: If a name contains path separators,
+                ``..``, glob characters or anything else a model file name
+                can't (names come from URLs and query strings)
+            FileNotFoundError: If no such model exists
+        """
+        for kind, name in (('crop', crop), ('target', target), ('version', version)):
+            if name is not None and (not MODEL_NAME_PART.fullmatch(name) or '..' in name):
+                raise InvalidModelNameError(f"Invalid {kind} name: {name!r}")
+
+        if version:
+            model_path = self.models_dir / f"{crop}__{target}__{version}.joblib"
+            if not model_path.exists():
+                raise FileNotFoundError(f"No model found: {model_path}")
+            return model_path
+
+        model_pattern = f"{crop}__{target}__*.joblib"
+        model_files = list(self.models_dir.glob(model_pattern))
+        if not model_files:
+            raise FileNotFoundError(f"No model found matching pattern: {model_pattern}")
+        return max(model_files, key=lambda x: x.stat().st_mtime)
+
+    def get(self, crop: str, target: str, version: Optional[str] = None) -> LoadedModel:
+        """Return the loaded model for a crop/target pair, loading it if needed."""
+        return self.load(self.resolve(crop, target, version))
+
+    def load(
+        self,
+        model_path: Union[str, Path],
+        wavelengths_json: Optional[Union[str, Path]] = None
+    ) -> LoadedModel:
+        """
+        Return the loaded model for a model file, (re)loading it if needed.
+
+        Args:
+            model_path: Path to trained model (.joblib file)
+            wavelengths_json: Path to wavelengths JSON file (optional)
+
+        Returns:
+            LoadedModel ready to make predictions
+        """
+        model_path = Path(model_path)
+        stat = os.stat(model_path)
+        linear_mtime = _mtime(linear_path_for(model_path))
+        key = parse_model_name(model_path)
+
+        def cached() -> Optional[LoadedModel]:
+            loaded = self._models.get(key)
+            if (loaded is not None and loaded.mtime == stat.st_mtime
+                    and loaded.linear_mtime == linear_mtime
+                    and loaded.model_path == model_path
+                    and (wavelengths_json is None
+                         or loaded.wavelengths_path == Path(wavelengths_json))):
+                return self._touch(key, loaded)
+            return None
+
+        with self._lock:
+            loaded = cached()
+            if loaded is not None:
+                return loaded
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # Another thread may have loaded it while we waited
+            with self._lock:
+                loaded = cached()
+                if loaded is not None:
+                    return loaded
+
+            loaded = self._load(model_path, stat, linear_mtime, wavelengths_json)
+            with self._lock:
+                self._models[key] = loaded
+                return self._touch(key, loaded)
+
+    def _touch(self, key: ModelKey, loaded: LoadedModel) -> LoadedModel:
+        """Mark a cached model as just used and evict others if needed (lock held)."""
+        loaded.last_used = time.monotonic()
+        self._models.move_to_end(key)
+        self._evict(keep=key)
+        return loaded
+
+    def _evict(self, keep: Optional[ModelKey] = None) -> List[ModelKey]:
+        """Drop idle models, then least recently used ones over budget."""
+        evicted = []
+        if self.idle_seconds is not None:
+            cutoff = time.monotonic() - self.idle_seconds
+            for key, loaded in list(self._models.items()):
+                if key != keep and loaded.last_used < cutoff:
+                    evicted.append(key)
+                    del self._models[key]
+
+        if self.max_bytes is not None:
+            total = sum(m.nbytes for m in self._models.values())
+            for key in list(self._models):
+                if total <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                total -= self._models.pop(key).nbytes
+                evicted.append(key)
+
+        return evicted
+
+    def evict_idle(self) -> List[ModelKey]:
+        """Evict idle and over-budget models; returns the evicted keys."""
+        with self._lock:
+            return self._evict()
+
+    def available(self) -> List[ModelKey]:
+        """List (crop, target, version) for every model file on disk."""
+        # Hidden files are artifacts still being written (see train_pls.staged_artifacts)
+        return sorted(parse_model_name(p) for p in self.models_dir.glob("*__*__*.joblib")
+                      if not p.name.startswith('.'))
+
+    def _load(
+        self,
+        model_path: Path,
+        stat: os.stat_result,
+        linear_mtime: Optional[float],
+        wavelengths_json: Optional[Union[str, Path]]
+    ) -> LoadedModel:
+        # Prefer the fused linear predictor unless the pipeline is newer
+        linear_path = linear_path_for(model_path)
+        if linear_mtime is not None and linear_mtime >= stat.st_mtime:
+            model = LinearPredictor.load(linear_path)
+            nbytes = linear_path.stat().st_size
+        else:
+            import joblib
+            model = joblib.load(model_path)
+            nbytes = stat.st_size
+
+        if wavelengths_json and Path(wavelengths_json).exists():
+            wavelengths_path = Path(wavelengths_json)
+        else:
+            crop = parse_model_name(model_path)[0]
+            wavelengths_path = find_wavelengths_file(crop, model_path.parent, self.clean_dir)
+
+        wavelengths = None
+        if wavelengths_path is not None:
+            with open(wavelengths_path, 'r') as f:
+                wavelengths = json.load(f)
+        else:
+            print("⚠️  No wavelengths file found, assuming spectrum is correct length")
+
+        return LoadedModel(model_path, model, stat.st_mtime, wavelengths,
+                           wavelengths_path, nbytes=nbytes, linear_mtime=linear_mtime)
+
+    def loaded(self) -> List[LoadedModel]:
+        """Return the models currently held in memory, least recently used first."""
+        with self._lock:
+            return list(self._models.values())
+
+    def clear(self) -> None:
+        """Drop all cached models."""
+        with self._lock:
+            self._models.clear()
+
+
+# Process-wide registry shared by the CLI and the API
+default_registry = ModelRegistry()
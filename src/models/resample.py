@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Resample spectra from a device's wavelength grid onto a model's grid.
+
+Linear interpolation from one grid to another is a fixed sparse matrix
+with at most two non-zeros per target wavelength. Matrices are cached per
+(source grid, target grid) pair, so every spectrum from a known device
+costs one sparse matrix product, and a batch from one device is resampled
+in a single operation. float32 spectra are resampled with a float32 copy
+of the matrix (cached alongside it) and stay float32. scipy is imported
+on the first resample, so models served on their own grid never load it.
+"""
+
+from functools import lru_cache
+from typing import TYPE_CHECKING, Sequence, Union
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from scipy import sparse
+
+
+# Relative slack allowed at the grid edges before we refuse to extrapolate
+EDGE_TOLERANCE = 1e-6
+
+
+@lru_cache(maxsize=128)
+def _cached_matrix(
+    source_key: bytes,
+    target_key: bytes,
+    dtype: str = 'float64'
+) -> "sparse.csr_matrix":
+    from scipy import sparse
+
+    source = np.frombuffer(source_key, dtype=float)
+    target = np.frombuffer(target_key, dtype=float)
+
+    order = np.argsort(source, kind='stable')
+    sorted_source = source[order]
+    if np.any(np.diff(sorted_source) <= 0):
+        raise ValueError("Source wavelengths must be unique")
+
+    span = sorted_source[-1] - sorted_source[0]
+    slack = EDGE_TOLERANCE * max(span, 1.0)
+    if target.min() < sorted_source[0] - slack or target.max() > sorted_source[-1] + slack:
+        raise ValueError(
+            f"Spectrum wavelengths [{sorted_source[0]:g}, {sorted_source[-1]:g}] don't cover "
+            f"model wavelengths [{target.min():g}, {target.max():g}]"
+        )
+    clipped = np.clip(target, sorted_source[0], sorted_source[-1])
+
+    # Left neighbour and interpolation weight for every target wavelength
+    right = np.clip(np.searchsorted(sorted_source, clipped, side='right'), 1, len(source) - 1)
+    left = right - 1
+    weight = (clipped - sorted_source[left]) / (sorted_source[right] - sorted_source[left])
+
+    columns = np.arange(len(target))
+    rows = np.concatenate([order[left], order[right]])
+    values = np.concatenate([1.0 - weight, weight]).astype(dtype)
+    matrix = sparse.csr_matrix(
+        (values, (rows, np.concatenate([columns, columns]))),
+        shape=(len(source), len(target))
+    )
+    matrix.eliminate_zeros()
+    return matrix
+
+
+def interpolation_matrix(
+    source_wavelengths: Union[Sequence[float], np.ndarray],
+    target_wavelengths: Union[Sequence[float], np.ndarray],
+    dtype: Union[str, np.dtype, type] = float
+) -> "sparse.csr_matrix":
+    """
+    Sparse linear-interpolation matrix from one wavelength grid to another.
+
+    Args:
+        source_wavelengths: Wavelengths the spectra were measured at
+        target_wavelengths: Wavelengths the model expects
+        dtype: Dtype of the matrix (float64 or float32)
+
+    Returns:
+        Matrix M of shape (n_source, n_target) such that ``X @ M``
+        resamples spectra X onto the target grid
+
+    Raises:
+        ValueError: If the source grid has fewer than two points, repeats
+            wavelengths or doesn't cover the target grid
+    """
+    source = np.ascontiguousarray(source_wavelengths, dtype=float)
+    target = np.ascontiguousarray(target_wavelengths, dtype=float)
+    if source.ndim != 1 or len(source) < 2:
+        raise ValueError("At least two source wavelengths are required to resample")
+    return _cached_matrix(source.tobytes(), target.tobytes(), np.dtype(dtype).name)
+
+
+def resample(
+    X: np.ndarray,
+    source_wavelengths: Union[Sequence[float], np.ndarray],
+    target_wavelengths: Union[Sequence[float], np.ndarray]
+) -> np.ndarray:
+    """
+    Resample spectra onto the target wavelength grid.
+
+    Args:
+        X: Spectra of shape (n_spectra, n_source) or (n_source,)
+        source_wavelengths: Wavelengths the spectra were measured at
+        target_wavelengths: Wavelengths the model expects
+
+    Returns:
+        Spectra on the target grid, with the same number of dimensions as X;
+        float32 if X is float32, float64 otherwise
+    """
+    X = np.asarray(X)
+    if X.dtype != np.float32:
+        X = X.astype(float, copy=False)
+    matrix = interpolation_matrix(source_wavelengths, target_wavelengths, X.dtype)
+    if X.shape[-1] != matrix.shape[0]:
+        raise ValueError(
+            f"Spectrum length ({X.shape[-1]}) doesn't match "
+            f"its wavelengths ({matrix.shape[0]})"
+        )
+    # (M.T @ X.T).T keeps the sparse matrix on the left
+    return np.asarray((matrix.T @ X.T).T)
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Train PLS models for many crop/target pairs in parallel.
+
+Pairs are given explicitly (``--pairs carrots:antioxidants ...``), as a
+matrix (``--crops`` x ``--targets``, skipping targets a crop wasn't
+cleaned for) or discovered from the cleaned targets in ``data/clean``.
+
+Each crop's spectra are loaded from Parquet once, in wavelength order and
+dtype, and saved as a ``.npy`` that every job of that crop memory-maps
+read-only, so a crop with many targets is read and held in memory once.
+
+Jobs run in a process pool sized by an explicit core budget:
+``--cores`` in total, ``--cores-per-job`` for each job. Every worker caps
+its BLAS/OpenMP thread pools at its share (through the ``*_NUM_THREADS``
+variables and threadpoolctl) and runs GridSearchCV with ``n_jobs=1``, so
+parallel jobs never oversubscribe the machine with nested pools. The
+largest jobs are submitted first.
+
+Each pair's artifacts are written atomically by
+src.models.train_pls.train_target; its output goes to
+``models/{crop}__{target}__pls__train.log``. A failed pair doesn't stop
+the others and is reported in ``models/train_all_summary.json``.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.models.domain import DEFAULT_LEVEL as DEFAULT_DOMAIN_LEVEL
+from src.models.intervals import DEFAULT_LEVEL
+from src.models.train_pls import load_spectra, preprocessing_method, required_files, train_target
+
+
+# Variables the BLAS and OpenMP runtimes read when they start
+THREAD_ENV_VARS = (
+    'OMP_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'BLIS_NUM_THREADS',
+    'VECLIB_MAXIMUM_THREADS',
+    'NUMEXPR_NUM_THREADS'
+)
+
+# Keeps the worker's thread limits alive for the life of the process
+_thread_limits = None
+
+
+def parse_pair(value: str) -> Tuple[str, str]:
+    """argparse type for a 'crop:target' pair."""
+    crop, sep, target = value.partition(':')
+    if not sep or not crop or not target:
+        raise argparse.ArgumentTypeError(f"Expected crop:target, got {value!r}")
+    return crop, target
+
+
+def discover_pairs(
+    clean_dir: Path,
+    crops: Optional[List[str]] = None,
+    targets: Optional[List[str]] = None
+) -> List[Tuple[str, str]]:
+    """
+    Crop/target pairs with cleaned targets in clean_dir, optionally
+    restricted to some crops and targets.
+    """
+    pairs = []
+    for path in sorted(Path(clean_dir).glob("*__y__*.parquet")):
+        crop, _, target = path.stem.partition('__y__')
+        if (crops is None or crop in crops) and (targets is None or target in targets):
+            pairs.append((crop, target))
+    return pairs
+
+
+def limit_threads(threads: int) -> None:
+    """
+    Cap the BLAS/OpenMP thread pools of this process and of the processes
+    it starts afterwards.
+    """
+    global _thread_limits
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+
+    from threadpoolctl import threadpool_limits
+    _thread_limits = threadpool_limits(limits=threads)
+
+
+def train_pair(
+    crop: str,
+    target: str,
+    spectra_path: Path,
+    wavelengths: List[str],
+    y: Any,
+    folds_path: Path,
+    log_path: Path,
+    options: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Train one pair from its crop's memory-mapped spectra, with the output
+    redirected to log_path.
+
+    Returns:
+        Summary of the trained model
+    """
+    import pandas as pd
+
+    X = pd.DataFrame(np.load(spectra_path, mmap_mode='r'), columns=wavelengths, copy=False)
+
+    start = time.perf_counter()
+    with open(log_path, 'w') as log, redirect_stdout(log):
+        print(f"🤖 Training PLS model for {crop} - {target}")
+        metrics = train_target(crop, target, X, y, folds_path, n_jobs=1, **options)
+
+    return {
+        'n_samples': int(y.notna().sum()),
+        'n_components': metrics['best_params']['pls__n_components'],
+        'preprocessing': (metrics['preprocessing'] or {}).get('method', 'none'),
+        'r2_mean': metrics['cv_scores']['r2_mean'],
+        'rmse_mean': metrics['cv_scores']['rmse_mean'],
+        'wall_s': time.perf_counter() - start
+    }
+
+
+def write_summary(path: Path, summary: Dict[str, Any]) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, 'w') as f:
+        json.dump(summary, f, indent=2)
+    os.replace(tmp, path)
+
+
+def main():
+    """Train PLS models for several crops and targets in parallel."""
+    parser = argparse.ArgumentParser(description="Train PLS models for many crops and targets")
+    parser.add_argument("--pairs", nargs="+", type=parse_pair,
+                        help="crop:target pairs to train (default: every cleaned pair)")
+    parser.add_argument("--crops", nargs="+", help="Crops to train (default: all cleaned)")
+    parser.add_argument("--targets", nargs="+", help="Targets to train (default: all cleaned)")
+    parser.add_argument("--cores", type=int, default=os.cpu_count() or 1,
+                        help="Total cores to use")
+    parser.add_argument("--cores-per-job", type=int, default=1,
+                        help="BLAS/OpenMP threads of each training job")
+    parser.add_argument("--search", choices=["grid", "path"], default="grid",
+                        help="Component search (see src.models.train_pls)")
+    parser.add_argument("--dtype", choices=["float64", "float32"],
+                        help="Dtype of the spectra (default: as stored by clean_bi)")
+    parser.add_argument("--preprocessing", nargs="+", type=preprocessing_method, default=["none"],
+                        help="Spectral preprocessing chains to search over")
+    parser.add_argument("--interval-level", type=float, default=DEFAULT_LEVEL,
+                        help="Coverage of the calibrated prediction intervals")
+    parser.add_argument("--domain-level", type=float, default=DEFAULT_DOMAIN_LEVEL,
+                        help="Confidence level of the T² and Q residual limits")
+
+    args = parser.parse_args()
+
+    if args.cores < 1 or args.cores_per_job < 1:
+        print("❌ --cores and --cores-per-job must be at least 1")
+        return 1
+    if args.pairs and (args.crops or args.targets):
+        print("❌ Give either --pairs or --crops/--targets, not both")
+        return 1
+
+    clean_dir = Path("data/clean")
+    models_dir = Path("models")
+    models_dir.mkdir(exist_ok=True)
+
+    pairs = list(dict.fromkeys(args.pairs or discover_pairs(clean_dir, args.crops, args.targets)))
+    if not pairs:
+        print(f"❌ No cleaned crop/target pairs found in {clean_dir}")
+        print("   Run: python -m src.data.clean_bi --all")
+        return 1
+
+    import pandas as pd
+
+    results: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    jobs = []
+    for crop, target in pairs:
+        paths = required_files(crop, target, clean_dir)
+        missing = [str(path) for path in paths.values() if not path.exists()]
+        if missing:
+            results[crop, target] = {'ok': False, 'error': f"Required file not found: {missing[0]}"}
+            continue
+        y = pd.read_parquet(paths['y']).iloc[:, 0]
+        jobs.append((crop, target, paths, y))
+
+    # Every worker gets cores_per_job threads; never more workers than jobs
+    workers = max(1, min(args.cores // args.cores_per_job, len(jobs)))
+    print(f"🤖 Training {len(jobs)} PLS models on {workers} worker(s) "
+          f"x {args.cores_per_job} thread(s)")
+
+    options = {
+        'search': args.search,
+        'preprocessing': args.preprocessing,
+        'interval_level': args.interval_level,
+        'domain_level': args.domain_level,
+        'models_dir': models_dir
+    }
+
+    # Limits set before the pool starts are inherited by its workers
+    limit_threads(args.cores_per_job)
+
+    start = time.perf_counter()
+    interim_dir = clean_dir.parent / "interim"
+    interim_dir.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix=".train_all-", dir=interim_dir) as shared_dir:
+        # Load each crop's spectra once and share them memory-mapped
+        spectra = {}
+        for crop, target, paths, y in jobs:
+            if crop not in spectra:
+                X = load_spectra(paths['X'], paths['wavelengths'], args.dtype)
+                spectra_path = Path(shared_dir) / f"{crop}__X.npy"
+                np.save(spectra_path, X.to_numpy())
+                spectra[crop] = (spectra_path, list(X.columns), X.shape[1])
+                del X
+
+        # Largest jobs first, so a big crop doesn't start last and run alone
+        jobs.sort(key=lambda job: int(job[3].notna().sum()) * spectra[job[0]][2], reverse=True)
+
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=limit_threads,
+                                   initargs=(args.cores_per_job,))
+        try:
+            futures = {}
+            for crop, target, paths, y in jobs:
+                spectra_path, wavelengths, _ = spectra[crop]
+                log_path = models_dir / f"{crop}__{target}__pls__train.log"
+                future = pool.submit(train_pair, crop, target, spectra_path, wavelengths, y,
+                                     paths['folds'], log_path, options)
+                futures[future] = (crop, target, log_path)
+
+            for future in as_completed(futures):
+                crop, target, log_path = futures[future]
+                try:
+                    result = {'ok': True, **future.result()}
+                    print(f"   ✅ {crop} - {target}: R² = {result['r2_mean']:.4f}, "
+                          f"RMSE = {result['rmse_mean']:.4f}, {result['n_components']} components, "
+                          f"{result['preprocessing']} ({result['wall_s']:.1f}s)")
+                except Exception as e:
+                    result = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+                    print(f"   ❌ {crop} - {target}: {result['error']} (see {log_path})")
+                results[crop, target] = {**result, 'log': str(log_path)}
+        finally:
+            pool.shutdown()
+
+    for (crop, target), result in results.items():
+        if not result['ok'] and 'log' not in result:
+            print(f"   ❌ {crop} - {target}: {result['error']}")
+
+    failed = sum(not result['ok'] for result in results.values())
+    summary = {
+        'cores': args.cores,
+        'cores_per_job': args.cores_per_job,
+        'workers': workers,
+        'wall_s': time.perf_counter() - start,
+        'pairs': [{'crop': crop, 'target': target, **results[crop, target]}
+                  for crop, target in pairs if (crop, target) in results]
+    }
+    summary_path = models_dir / "train_all_summary.json"
+    write_summary(summary_path, summary)
+
+    print(f"\n📈 Trained {len(results) - failed}/{len(results)} models in {summary['wall_s']:.1f}s")
+    print(f"💾 Saved summary to {summary_path}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
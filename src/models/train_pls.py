@@ -3,198 +3,601 @@
 Train PLS regression models for nutrient prediction.
 
 This script trains Partial Least Squares (PLS) regression models
-using GroupKFold cross-validation to avoid data leakage.
+using GroupKFold cross-validation to avoid data leakage. The number of
+components is chosen either with GridSearchCV (``--search grid``) or from a
+single-pass component path fitted once per fold (``--search path``).
+
+``--preprocessing`` lists spectral preprocessing chains to search over
+alongside the number of components (e.g. ``none snv snv+sg1``; see
+src.models.preprocessing). The chosen preprocessing becomes the first
+step of the saved pipeline, so inference applies it too.
+
+Prediction intervals are calibrated from the out-of-fold predictions of
+the chosen model (see src.models.intervals) and stored with the model,
+so inference computes them without refitting. The Hotelling T² and
+Q-residual limits of the training spectra (see src.models.domain) are
+stored the same way, so inference can flag spectra outside the
+calibration domain.
+
+``--targets`` trains one multi-target (PLS2) model per crop instead,
+saved as ``{crop}__multi__pls2``, that predicts every listed nutrient
+from the same spectrum in one matrix product. Its metrics compare each
+target's CV scores with the single-target model's, where one was trained.
+
+Spectra are used in the dtype they were cleaned to (``--dtype`` overrides
+it). A float32 model is searched in float32 and its fused predictor stores
+float32 coefficients.
+
+The model, its fused predictor, metrics and plot are written to
+temporary files and renamed into place once all of them are written, so
+concurrent or interrupted runs never leave a half-written artifact.
+train_target is also used by src.models.train_all to train many crops
+and targets in parallel.
+
+sklearn, pandas, joblib and matplotlib are imported where they are used,
+so importing this module (e.g. for COMPONENT_GRID) stays cheap.
 """
 
 import argparse
 import json
+import os
 import sys
+from contextlib import contextmanager
 from pathlib import Path
 
-import joblib
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
-from sklearn.metrics import mean_squared_error, r2_score
-from sklearn.model_selection import GridSearchCV, GroupKFold
-from sklearn.pipeline import Pipeline
-from sklearn.preprocessing import StandardScaler
-from sklearn.cross_decomposition import PLSRegression
 
+from src.data.splits import load_folds, splits_file, splits_path
+from src.models.domain import DEFAULT_LEVEL as DEFAULT_DOMAIN_LEVEL, calibrate_domain
+from src.models.intervals import DEFAULT_LEVEL, calibrate
+from src.models.linear import export_linear, linear_path_for
+from src.models.pls_path import cv_path
+from src.models.preprocessing import SpectralPreprocessor, parse_method, split_preprocessing
 
-def main():
-    """Train PLS model with cross-validation."""
-    parser = argparse.ArgumentParser(description="Train PLS model")
-    parser.add_argument("--crop", default="carrots", help="Crop name")
-    parser.add_argument("--target", default="antioxidants", help="Target variable")
-    
-    args = parser.parse_args()
-    
-    print(f"🤖 Training PLS model for {args.crop} - {args.target}")
-    
-    # Load data
-    clean_dir = Path("data/clean")
-    X_path = clean_dir / f"{args.crop}__X.parquet"
-    y_path = clean_dir / f"{args.crop}__y__{args.target}.parquet"
-    splits_path = clean_dir / "splits.csv"
-    wavelengths_path = clean_dir / f"{args.crop}__wavelengths.json"
-    
-    # Check if files exist
-    for path in [X_path, y_path, splits_path, wavelengths_path]:
-        if not path.exists():
-            print(f"❌ Required file not found: {path}")
-            print("   Run: python -m src.data.clean_bi --crop {args.crop} --target {args.target}")
-            return 1
-    
-    # Load data
-    X = pd.read_parquet(X_path)
-    y = pd.read_parquet(y_path).iloc[:, 0]  # Get first column as series
-    
-    with open(wavelengths_path, 'r') as f:
-        wavelengths = json.load(f)
-    
-    splits_df = pd.read_csv(splits_path)
-    
-    print(f"📊 Data loaded: {X.shape[0]} samples, {X.shape[1]} features")
-    
-    # Ensure X has the correct columns in the right order
-    X = X[wavelengths]
-    
-    # Create pipeline
-    pipeline = Pipeline([
+
+# Candidate numbers of PLS components
+COMPONENT_GRID = range(4, 33, 2)  # 4 to 32 components
+
+# Target name of multi-target (PLS2) models: {crop}__multi__pls2
+MULTI_TARGET = "multi"
+
+
+def make_pipeline(n_components=2, preprocessing=None):
+    """
+    Create the StandardScaler + PLS pipeline, preceded by spectral
+    preprocessing when a method other than 'none' is given.
+    """
+    from sklearn.cross_decomposition import PLSRegression
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+    
+    steps = [
         ('scaler', StandardScaler()),
-        ('pls', PLSRegression())
-    ])
+        ('pls', PLSRegression(n_components=n_components))
+    ]
+    if preprocessing is not None:
+        steps.insert(0, ('preprocess', SpectralPreprocessor(preprocessing)))
+    return Pipeline(steps)
+
+
+def preprocessing_method(value):
+    """argparse type for a preprocessing chain such as 'snv+sg1'."""
+    try:
+        parse_method(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return value
+
+
+def fold_metrics(y_true, y_pred):
+    """R² and RMSE for one fold (averaged over targets for multi-target y)."""
+    from sklearn.metrics import mean_squared_error, r2_score
+    
+    return {
+        'r2': float(r2_score(y_true, y_pred)),
+        'rmse': float(np.sqrt(mean_squared_error(y_true, y_pred)))
+    }
+
+
+def grid_search_components(X, y, folds, preprocessing=('none',), n_jobs=-1):
+    """
+    Pick the number of components (and the spectral preprocessing, if more
+    than 'none' is offered) with GridSearchCV over the folds of the splits
+    manifest, then refit the best model on each of those folds.
+    
+    Multi-target y (a DataFrame) is scored by R² averaged over targets,
+    so targets on larger scales don't dominate the choice.
+    
+    Args:
+        folds: (train indices, validation indices) pairs of the splits
+            manifest, so scans of one sample never straddle a split
+        n_jobs: Parallel jobs of GridSearchCV (-1 for all cores; 1 when the
+            caller already runs several searches in parallel)
+    
+    Returns:
+        Tuple of (best model, best number of components, fold scores,
+        empty CV RMSE curve, out-of-fold predictions)
+    """
+    from sklearn.model_selection import GridSearchCV
     
     # Define parameter grid
     param_grid = {
-        'pls__n_components': range(4, 33, 2)  # 4 to 32 components
+        'pls__n_components': COMPONENT_GRID
     }
+    searched = list(preprocessing) != ['none']
+    if searched:
+        param_grid['preprocess__method'] = list(preprocessing)
     
-    # Create GroupKFold for cross-validation
-    gkf = GroupKFold(n_splits=5)
-    
-    # We need to create groups from sample_id
-    # For now, we'll use the splits we created during data cleaning
-    groups = np.arange(len(X))  # Placeholder groups
-    
-    print("🔍 Starting grid search with GroupKFold...")
+    print(f"🔍 Starting grid search over {len(folds)} manifest folds...")
     
     # Grid search
+    multi = y.ndim > 1
     grid_search = GridSearchCV(
-        pipeline,
+        make_pipeline(preprocessing='none' if searched else None),
         param_grid,
-        cv=gkf,
-        scoring='neg_mean_squared_error',
-        n_jobs=-1,
+        cv=folds,
+        scoring='r2' if multi else 'neg_mean_squared_error',
+        n_jobs=n_jobs,
         verbose=1
     )
     
     grid_search.fit(X, y)
     
+    best_n = grid_search.best_params_['pls__n_components']
+    best_method = grid_search.best_params_.get('preprocess__method')
     print(f"✅ Best parameters: {grid_search.best_params_}")
-    print(f"✅ Best CV score: {-grid_search.best_score_:.4f} RMSE")
-    
-    # Get best model
-    best_model = grid_search.best_estimator_
+    if multi:
+        print(f"✅ Best CV score: {grid_search.best_score_:.4f} mean R²")
+    else:
+        # best_score_ is the negated MSE averaged over folds
+        print(f"✅ Best CV score: {np.sqrt(-grid_search.best_score_):.4f} RMSE")
     
     # Evaluate on each fold
     print("\n📊 Cross-validation results:")
     fold_scores = []
+    oof = np.full(y.shape, np.nan)
     
-    for fold in range(5):
-        fold_data = splits_df.iloc[fold]
-        train_idx = fold_data['train_idx']
-        val_idx = fold_data['val_idx']
-        
-        # Get fold data
-        X_train_fold = X.iloc[train_idx]
-        y_train_fold = y.iloc[train_idx]
-        X_val_fold = X.iloc[val_idx]
-        y_val_fold = y.iloc[val_idx]
-        
+    for fold, (train_idx, val_idx) in enumerate(folds):
         # Train model on this fold
-        fold_model = Pipeline([
-            ('scaler', StandardScaler()),
-            ('pls', PLSRegression(n_components=grid_search.best_params_['pls__n_components']))
-        ])
-        
-        fold_model.fit(X_train_fold, y_train_fold)
-        y_pred_fold = fold_model.predict(X_val_fold)
-        
-        # Calculate metrics
-        r2 = r2_score(y_val_fold, y_pred_fold)
-        rmse = np.sqrt(mean_squared_error(y_val_fold, y_pred_fold))
-        
-        fold_scores.append({'r2': r2, 'rmse': rmse})
-        print(f"   Fold {fold + 1}: R² = {r2:.4f}, RMSE = {rmse:.4f}")
+        fold_model = make_pipeline(best_n, best_method)
+        fold_model.fit(X.iloc[train_idx], y.iloc[train_idx])
+        y_pred_fold = fold_model.predict(X.iloc[val_idx])
+        oof[val_idx] = np.asarray(y_pred_fold).reshape(len(val_idx), *y.shape[1:])
+    
+        scores = fold_metrics(y.iloc[val_idx], y_pred_fold)
+        fold_scores.append(scores)
+        print(f"   Fold {fold + 1}: R² = {scores['r2']:.4f}, RMSE = {scores['rmse']:.4f}")
+    
+    return grid_search.best_estimator_, best_n, fold_scores, {}, oof
+
+
+def path_search_components(X, y, folds, preprocessing=('none',)):
+    """
+    Pick the number of components from a single-pass PLS component path.
+    
+    PLS is fitted once per fold up to the largest candidate; predictions
+    for every smaller component count come from the same fit (see
+    src.models.pls_path). The fold scores of the chosen model reuse those
+    out-of-fold predictions instead of retraining.
+    
+    Each preprocessing chain is applied to the whole matrix once (the
+    methods are row-wise, so this doesn't leak across folds) and gets its
+    own component path; the chain with the lowest CV error wins.
+    
+    For multi-target y (a DataFrame), one path predicts every target and
+    the CV error is each target's MSE relative to its variance, averaged.
+    
+    Returns:
+        Tuple of (model refitted on all data, best number of components,
+        fold scores, CV RMSE per number of components, out-of-fold
+        predictions)
+    """
+    print("🔍 Fitting PLS component path on each fold...")
+    
+    searched = list(preprocessing) != ['none']
+    multi = y.ndim > 1
+    # Per-target MSE scale the candidates are compared on
+    scale = np.var(y.values, axis=0) if multi else np.ones(1)
+    results = {}
+    for method in preprocessing:
+        X_method = SpectralPreprocessor(method).fit_transform(X.values) if searched else X.values
+        cv = cv_path(X_method, y.values, folds, COMPONENT_GRID)
+        mean_mse = cv['fold_mse'].mean(axis=(0, 2))
+        criterion = (cv['fold_mse'] / scale).mean(axis=(0, 2))
+        results[method] = (cv, mean_mse, criterion, int(np.argmin(criterion)))
+        if searched:
+            print(f"   {method}: best CV RMSE {np.sqrt(mean_mse[results[method][3]]):.4f}")
+    
+    best_method = min(results, key=lambda method: results[method][2].min())
+    cv, mean_mse, _, best = results[best_method]
+    best_n = cv['components'][best]
+    cv_rmse = {int(k): float(np.sqrt(mse)) for k, mse in zip(cv['components'], mean_mse)}
+    
+    best_params = {'pls__n_components': int(best_n)}
+    if searched:
+        best_params['preprocess__method'] = best_method
+    print(f"✅ Best parameters: {best_params}")
+    if multi:
+        # R² of each target on each fold, averaged, as GridSearchCV's 'r2' scoring
+        r2 = [1.0 - cv['fold_mse'][i, best] / np.var(y.values[val_idx], axis=0)
+              for i, (_, val_idx) in enumerate(folds)]
+        print(f"✅ Best CV score: {np.mean(r2):.4f} mean R²")
+    else:
+        print(f"✅ Best CV score: {np.sqrt(mean_mse[best]):.4f} RMSE")
+    
+    # Evaluate on each fold from the out-of-fold predictions
+    print("\n📊 Cross-validation results:")
+    fold_scores = []
+    
+    for fold, (_, val_idx) in enumerate(folds):
+        y_pred_fold = cv['oof'][val_idx, best].reshape(len(val_idx), *y.shape[1:])
+        scores = fold_metrics(y.iloc[val_idx], y_pred_fold)
+        fold_scores.append(scores)
+        print(f"   Fold {fold + 1}: R² = {scores['r2']:.4f}, RMSE = {scores['rmse']:.4f}")
+    
+    best_model = make_pipeline(best_n, best_method if searched else None)
+    best_model.fit(X, y)
+    
+    return best_model, best_n, fold_scores, cv_rmse, cv['oof'][:, best].reshape(y.shape)
+
+
+def required_files(crop, target, clean_dir=Path("data/clean")):
+    """Cleaned inputs needed to train the model of one crop and target."""
+    return {
+        'X': clean_dir / f"{crop}__X.parquet",
+        'y': clean_dir / f"{crop}__y__{target}.parquet",
+        'folds': splits_path(clean_dir, crop) or clean_dir / splits_file(crop),
+        'wavelengths': clean_dir / f"{crop}__wavelengths.json"
+    }
+
+
+def load_spectra(X_path, wavelengths_path, dtype=None):
+    """
+    Load a crop's cleaned spectra with the columns in wavelength order.
+    
+    Args:
+        X_path: Cleaned spectra (.parquet)
+        wavelengths_path: JSON list of the spectral columns
+        dtype: Dtype to cast the spectra to (default: as stored by clean_bi)
+    
+    Returns:
+        DataFrame of spectra
+    """
+    import pandas as pd
+    
+    with open(wavelengths_path, 'r') as f:
+        wavelengths = json.load(f)
     
-    # Calculate mean and std
+    X = pd.read_parquet(X_path)[wavelengths]
+    if dtype:
+        X = X.astype(dtype)
+    return X
+
+
+@contextmanager
+def staged_artifacts(*paths):
+    """
+    Yield temporary paths to write a model's artifacts to, and move each
+    into place with an atomic rename once all of them have been written.
+    
+    The temporary files keep the artifacts' suffixes (np.savez and savefig
+    rely on them). If writing fails, they are removed and the previous
+    artifacts are left untouched.
+    """
+    staged = [path.with_name(f".{path.stem}.{os.getpid()}.tmp{path.suffix}") for path in paths]
+    try:
+        yield staged
+    except BaseException:
+        for tmp in staged:
+            tmp.unlink(missing_ok=True)
+        raise
+    for tmp, path in zip(staged, paths):
+        os.replace(tmp, path)
+
+
+def model_name_for(crop, target):
+    """Artifact name of a single-target PLS model or, for a list of targets, the crop's PLS2 model."""
+    if isinstance(target, str):
+        return f"{crop}__{target}__pls"
+    return f"{crop}__{MULTI_TARGET}__pls2"
+
+
+def cv_summary(fold_scores):
+    """Mean and std of the fold R² and RMSE."""
     r2_scores = [s['r2'] for s in fold_scores]
     rmse_scores = [s['rmse'] for s in fold_scores]
+    return {
+        'r2_mean': float(np.mean(r2_scores)),
+        'r2_std': float(np.std(r2_scores)),
+        'rmse_mean': float(np.mean(rmse_scores)),
+        'rmse_std': float(np.std(rmse_scores))
+    }
+
+
+def compare_single_target(models_dir, crop, cv_scores):
+    """
+    Compare a PLS2 model's per-target CV scores with the single-target
+    models' metrics files.
+    
+    Single-target models may have been trained on more rows (those with
+    only their own target measured), so their sample count is reported
+    alongside.
+    
+    Args:
+        models_dir: Directory with the ``{crop}__{target}__pls__metrics.json`` files
+        crop: Crop name
+        cv_scores: PLS2 CV scores per target (see cv_summary)
+    
+    Returns:
+        Dictionary per target with both models' R² and RMSE and the PLS2
+        minus single-target differences, or None without a metrics file
+    """
+    comparison = {}
+    for target, multi in cv_scores.items():
+        metrics_path = Path(models_dir) / f"{model_name_for(crop, target)}__metrics.json"
+        if not metrics_path.exists():
+            comparison[target] = None
+            continue
+        with open(metrics_path, 'r') as f:
+            single = json.load(f)
+        single_scores = single['cv_scores']
+        comparison[target] = {
+            'single_r2': single_scores['r2_mean'],
+            'single_rmse': single_scores['rmse_mean'],
+            'single_n_components': single['best_params']['pls__n_components'],
+            'single_n_samples': single.get('intervals', {}).get('n_train'),
+            'pls2_r2': multi['r2_mean'],
+            'pls2_rmse': multi['rmse_mean'],
+            'r2_delta': multi['r2_mean'] - single_scores['r2_mean'],
+            'rmse_delta': multi['rmse_mean'] - single_scores['rmse_mean']
+        }
+    return comparison
+
+
+def save_plot(path, model, X, y, crop, target):
+    """Save truth vs prediction scatter plots of the model on all data, one per target."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from sklearn.metrics import r2_score
     
-    print(f"\n📈 Final Results:")
-    print(f"   R²: {np.mean(r2_scores):.4f} ± {np.std(r2_scores):.4f}")
-    print(f"   RMSE: {np.mean(rmse_scores):.4f} ± {np.std(rmse_scores):.4f}")
+    targets = [target] if isinstance(target, str) else list(target)
+    y_true = np.asarray(y, dtype=float).reshape(len(y), -1)
     
-    # Save model and results
-    models_dir = Path("models")
-    models_dir.mkdir(exist_ok=True)
+    # Use the best model to predict on all data for visualization
+    y_pred = np.asarray(model.predict(X), dtype=float).reshape(len(y), -1)
+    
+    fig, axes = plt.subplots(1, len(targets), figsize=(8 * len(targets), 6), squeeze=False)
+    for j, (name, ax) in enumerate(zip(targets, axes[0])):
+        ax.scatter(y_true[:, j], y_pred[:, j], alpha=0.6)
+        ax.plot([y_true[:, j].min(), y_true[:, j].max()],
+                [y_true[:, j].min(), y_true[:, j].max()], 'r--', lw=2)
+        ax.set_xlabel(f'True {name}')
+        ax.set_ylabel(f'Predicted {name}')
+        ax.set_title(f'PLS Model: {crop} - {name}')
+        
+        # Add R² to plot
+        r2_all = r2_score(y_true[:, j], y_pred[:, j])
+        ax.text(0.05, 0.95, f'R² = {r2_all:.3f}', transform=ax.transAxes, 
+                bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
     
-    model_name = f"{args.crop}__{args.target}__pls"
-    model_path = models_dir / f"{model_name}.joblib"
+    fig.savefig(path, dpi=150, bbox_inches='tight')
+    plt.close(fig)
+
+
+def train_target(crop, target, X, y, folds_path, search="grid", preprocessing=('none',),
+                 interval_level=DEFAULT_LEVEL, domain_level=DEFAULT_DOMAIN_LEVEL,
+                 models_dir=Path("models"), n_jobs=-1):
+    """
+    Search, calibrate and save the PLS model of one crop and target.
+    
+    Given a list of targets and a DataFrame of them, a single multi-target
+    (PLS2) model predicting all of them is trained and saved as
+    ``{crop}__multi__pls2``; its metrics report per-target CV scores and
+    compare them with the single-target models' (see
+    compare_single_target).
+    
+    The model, its fused predictor, metrics and plot are written to
+    temporary files first and renamed into place together (see
+    staged_artifacts), so an interrupted run never leaves a model next to
+    another run's metrics.
+    
+    Args:
+        crop: Crop name
+        target: Target variable, or list of targets for a PLS2 model
+        X: Spectra with columns in wavelength order (DataFrame)
+        y: Target values (Series, or DataFrame with one column per target;
+            NaN where a target wasn't measured)
+        folds_path: Splits manifest of the crop
+        search: Component search, 'grid' or 'path'
+        preprocessing: Spectral preprocessing chains to search over
+        interval_level: Coverage of the calibrated prediction intervals
+        domain_level: Confidence level of the T² and Q residual limits
+        models_dir: Directory to save the artifacts to
+        n_jobs: Parallel jobs of GridSearchCV (-1 for all cores)
+    
+    Returns:
+        Metrics dictionary, as saved to the metrics file
+    """
+    multi = not isinstance(target, str)
+    targets = list(target) if multi else [target]
+    
+    # Crops cleaned with several targets keep NaN where this target wasn't
+    # measured; train on the rows that have it (all of them, for PLS2), with
+    # folds restricted to them
+    present = y.notna().to_numpy().reshape(len(y), -1).all(axis=1)
+    if present.all():
+        folds = load_folds(folds_path)
+    else:
+        folds = load_folds(folds_path, mask=present)
+        X = X[present].reset_index(drop=True)
+        y = y[present].reset_index(drop=True)
     
-    # Save model
-    joblib.dump(best_model, model_path)
-    print(f"💾 Saved model to {model_path}")
+    print(f"📊 Data loaded: {X.shape[0]} samples, {X.shape[1]} features")
+    
+    dtype = str(X.dtypes.iloc[0]) if X.shape[1] else "float64"
+    
+    if search == "path":
+        best_model, best_n, fold_scores, cv_rmse, oof = path_search_components(
+            X, y, folds, preprocessing)
+    else:
+        best_model, best_n, fold_scores, cv_rmse, oof = grid_search_components(
+            X, y, folds, preprocessing, n_jobs=n_jobs)
+    preprocessor, _ = split_preprocessing(best_model)
+    
+    # Calibrate prediction intervals from the out-of-fold residuals; they
+    # travel with the model into the .joblib and the fused .npz
+    intervals, interval_stats = calibrate(best_model, X.values, y.values, oof, interval_level)
+    best_model.intervals_ = intervals
+    domain, domain_stats = calibrate_domain(best_model, X.values, intervals.score_weights,
+                                            intervals.score_offset, domain_level)
+    best_model.domain_ = domain
+    
+    print(f"\n📈 Final Results:")
+    if multi:
+        best_model.targets_ = targets
+        
+        # Per-target fold scores from the out-of-fold predictions
+        Y, oof = y.to_numpy(dtype=float), np.asarray(oof).reshape(len(X), -1)
+        fold_scores = {
+            name: [fold_metrics(Y[val_idx, j], oof[val_idx, j]) for _, val_idx in folds]
+            for j, name in enumerate(targets)
+        }
+        cv_scores = {name: cv_summary(scores) for name, scores in fold_scores.items()}
+        for name, scores in cv_scores.items():
+            print(f"   {name}: R² = {scores['r2_mean']:.4f} ± {scores['r2_std']:.4f}, "
+                  f"RMSE = {scores['rmse_mean']:.4f} ± {scores['rmse_std']:.4f}")
+        print(f"   {intervals.level:.0%} intervals: "
+              f"{interval_stats['oof_coverage']:.1%} out-of-fold coverage")
+    else:
+        cv_scores = cv_summary(fold_scores)
+        print(f"   R²: {cv_scores['r2_mean']:.4f} ± {cv_scores['r2_std']:.4f}")
+        print(f"   RMSE: {cv_scores['rmse_mean']:.4f} ± {cv_scores['rmse_std']:.4f}")
+        print(f"   {intervals.level:.0%} interval: ±{interval_stats['mean_width'] / 2:.4f} on average, "
+              f"{interval_stats['oof_coverage']:.1%} out-of-fold coverage")
+    print(f"   {domain.level:.0%} domain limits: T² {domain.t2_limit:.2f} "
+          f"({domain_stats['t2_exceeded_fraction']:.1%} of training spectra above), "
+          f"Q {domain.q_limit:.4g} ({domain_stats['q_exceeded_fraction']:.1%} above)")
     
-    # Save metrics
     metrics = {
-        'crop': args.crop,
-        'target': args.target,
-        'best_params': grid_search.best_params_,
-        'cv_scores': {
-            'r2_mean': float(np.mean(r2_scores)),
-            'r2_std': float(np.std(r2_scores)),
-            'rmse_mean': float(np.mean(rmse_scores)),
-            'rmse_std': float(np.std(rmse_scores))
-        },
-        'fold_scores': fold_scores
+        'crop': crop,
+        'target': MULTI_TARGET if multi else target,
+        'search': search,
+        'dtype': dtype,
+        'best_params': {'pls__n_components': int(best_n)},
+        'preprocessing': preprocessor.get_params() if preprocessor is not None else None,
+        'cv_scores': cv_scores,
+        'fold_scores': fold_scores,
+        'intervals': {**intervals.summary(), **interval_stats},
+        'domain': {**domain.summary(), **domain_stats}
     }
+    if multi:
+        metrics['targets'] = targets
+        metrics['n_samples'] = len(X)
+    if cv_rmse:
+        metrics['cv_rmse_by_components'] = cv_rmse
+    
+    if multi:
+        comparison = compare_single_target(models_dir, crop, cv_scores)
+        metrics['single_target_comparison'] = comparison
+        
+        print(f"\n⚖️  PLS2 vs single-target models (CV, PLS2 minus single):")
+        for name, row in comparison.items():
+            if row is None:
+                print(f"   {name}: no single-target metrics; run train_pls --crop {crop} --target {name}")
+                continue
+            print(f"   {name}: R² {row['pls2_r2']:.4f} vs {row['single_r2']:.4f} ({row['r2_delta']:+.4f}), "
+                  f"RMSE {row['pls2_rmse']:.4f} vs {row['single_rmse']:.4f} ({row['rmse_delta']:+.4f})")
+    
+    # Save model and results
+    models_dir = Path(models_dir)
+    models_dir.mkdir(exist_ok=True)
     
+    model_name = model_name_for(crop, target)
+    model_path = models_dir / f"{model_name}.joblib"
+    linear_path = linear_path_for(model_path)
     metrics_path = models_dir / f"{model_name}__metrics.json"
-    with open(metrics_path, 'w') as f:
-        json.dump(metrics, f, indent=2)
+    plot_path = models_dir / f"{model_name}__truth_vs_pred.png"
     
+    import joblib
+    with staged_artifacts(model_path, linear_path, metrics_path, plot_path) as staged:
+        model_tmp, linear_tmp, metrics_tmp, plot_tmp = staged
+        joblib.dump(best_model, model_tmp)
+        
+        # Save fused linear predictor for fast inference
+        export_linear(best_model, model_path, X.shape[1], X_check=X.values[:256], dtype=dtype,
+                      output_path=linear_tmp)
+        
+        with open(metrics_tmp, 'w') as f:
+            json.dump(metrics, f, indent=2)
+        
+        # Create truth vs prediction plot
+        save_plot(plot_tmp, best_model, X, y, crop, target)
+    
+    print(f"💾 Saved model to {model_path}")
+    print(f"💾 Saved fused linear predictor to {linear_path}")
     print(f"💾 Saved metrics to {metrics_path}")
+    print(f"📊 Saved plot to {plot_path}")
+    
+    return metrics
+
+
+def main():
+    """Train PLS model with cross-validation."""
+    parser = argparse.ArgumentParser(description="Train PLS model")
+    parser.add_argument("--crop", default="carrots", help="Crop name")
+    parser.add_argument("--target", default="antioxidants", help="Target variable")
+    parser.add_argument("--targets", nargs="+",
+                        help="Train one multi-target (PLS2) model predicting all of these "
+                             "targets instead of a model for --target")
+    parser.add_argument("--search", choices=["grid", "path"], default="grid",
+                        help="Component search: GridSearchCV refits ('grid') or a "
+                             "single-pass PLS component path per fold ('path')")
+    parser.add_argument("--dtype", choices=["float64", "float32"],
+                        help="Dtype of the spectra (default: as stored by clean_bi)")
+    parser.add_argument("--preprocessing", nargs="+", type=preprocessing_method, default=["none"],
+                        help="Spectral preprocessing chains to search over, e.g. "
+                             "none snv snv+sg1 detrend (see src.models.preprocessing)")
+    parser.add_argument("--interval-level", type=float, default=DEFAULT_LEVEL,
+                        help="Coverage of the calibrated prediction intervals")
+    parser.add_argument("--domain-level", type=float, default=DEFAULT_DOMAIN_LEVEL,
+                        help="Confidence level of the T² and Q residual limits")
     
-    # Create truth vs prediction plot
-    plt.figure(figsize=(8, 6))
+    args = parser.parse_args()
     
-    # Use the best model to predict on all data for visualization
-    y_pred_all = best_model.predict(X)
+    targets = list(dict.fromkeys(args.targets or [args.target]))
+    if args.targets and len(targets) < 2:
+        print("❌ A multi-target model needs at least two --targets")
+        return 1
     
-    plt.scatter(y, y_pred_all, alpha=0.6)
-    plt.plot([y.min(), y.max()], [y.min(), y.max()], 'r--', lw=2)
-    plt.xlabel(f'True {args.target}')
-    plt.ylabel(f'Predicted {args.target}')
-    plt.title(f'PLS Model: {args.crop} - {args.target}')
+    if args.targets:
+        print(f"🤖 Training PLS2 model for {args.crop} - {', '.join(targets)}")
+    else:
+        print(f"🤖 Training PLS model for {args.crop} - {args.target}")
     
-    # Add R² to plot
-    r2_all = r2_score(y, y_pred_all)
-    plt.text(0.05, 0.95, f'R² = {r2_all:.3f}', transform=plt.gca().transAxes, 
-             bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
+    # Check if files exist
+    paths = {target: required_files(args.crop, target) for target in targets}
+    for target in targets:
+        for path in paths[target].values():
+            if not path.exists():
+                print(f"❌ Required file not found: {path}")
+                print(f"   Run: python -m src.data.clean_bi --crop {args.crop} --target {target}")
+                return 1
     
-    plot_path = models_dir / f"{model_name}__truth_vs_pred.png"
-    plt.savefig(plot_path, dpi=150, bbox_inches='tight')
-    plt.close()
+    # Load data
+    import pandas as pd
+    crop_paths = paths[targets[0]]
+    X = load_spectra(crop_paths['X'], crop_paths['wavelengths'], args.dtype)
+    y = pd.concat([pd.read_parquet(paths[target]['y']).iloc[:, 0].rename(target)
+                   for target in targets], axis=1)  # One column per target
+    if not args.targets:
+        y = y.iloc[:, 0]
     
-    print(f"📊 Saved plot to {plot_path}")
+    train_target(args.crop, targets if args.targets else args.target, X, y, crop_paths['folds'],
+                 args.search, args.preprocessing, args.interval_level, args.domain_level)
     
     return 0
 
 
 if __name__ == "__main__":
     sys.exit(main())
-
-
@@ -0,0 +1,76 @@
+"""Shared fixtures: small synthetic spectra with a linear target, and models trained on them."""
+
+import json
+
+import numpy as np
+import pytest
+
+
+# Wavelength list of the synthetic spectra, as clean_bi writes it
+WAVELENGTHS = [f"{1000 + 10 * i:.1f}" for i in range(60)]
+
+
+def make_spectra(n_samples, n_features=60, n_latent=4, noise=0.1, seed=0):
+    """Spectra driven by a few latent factors, and a target linear in them."""
+    rng = np.random.default_rng(seed)
+    latent = rng.normal(size=(n_samples, n_latent))
+    loadings = np.random.default_rng(1).normal(size=(n_latent, n_features))
+    X = latent @ loadings + 0.05 * rng.normal(size=(n_samples, n_features))
+    y = latent @ np.arange(1.0, n_latent + 1) + noise * rng.normal(size=n_samples)
+    return X, y
+
+
+@pytest.fixture
+def spectra():
+    return make_spectra
+
+
+@pytest.fixture
+def fitted_pipeline(spectra):
+    """A StandardScaler + PLS pipeline fitted on synthetic spectra."""
+    from src.models.train_pls import make_pipeline
+
+    X, y = spectra(300)
+    return make_pipeline(n_components=4).fit(X, y), X, y
+
+
+@pytest.fixture
+def save_model(fitted_pipeline):
+    """Save a model as ``{crop}__{target}__{version}.joblib`` with its crop's wavelength list."""
+    import joblib
+
+    def save(models_dir, crop='carrots', target='protein', version='pls', model=None):
+        models_dir.mkdir(parents=True, exist_ok=True)
+        path = models_dir / f"{crop}__{target}__{version}.joblib"
+        joblib.dump(model if model is not None else fitted_pipeline[0], path)
+        (models_dir / f"{crop}__wavelengths.json").write_text(json.dumps(WAVELENGTHS))
+        return path
+
+    return save
+
+
+@pytest.fixture
+def api_client(tmp_path, monkeypatch):
+    """
+    Start the API in a scratch directory and return a function giving a
+    TestClient for it; save models under ``models/`` before calling it.
+    """
+    from fastapi.testclient import TestClient
+
+    from src.api import main
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('CROP', 'carrots')
+    monkeypatch.setenv('TARGET', 'protein')
+    main.registry.clear()
+    clients = []
+
+    def start():
+        client = TestClient(main.app)
+        clients.append(client.__enter__())
+        return client
+
+    yield start
+    for client in clients:
+        client.__exit__(None, None, None)
+    main.registry.clear()
@@ -0,0 +1,131 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def spectrum(spectra):
+    return spectra(1, seed=5)[0][0].tolist()
+
+
+def test_default_and_routed_predictions(api_client, save_model, fitted_pipeline, spectrum):
+    save_model(Path("models"))
+    save_model(Path("models"), crop='kale', target='minerals')
+    client = api_client()
+
+    expected = float(fitted_pipeline[0].predict(np.array([spectrum])).ravel()[0])
+    for url in ("/predict", "/predict/carrots/protein", "/predict/kale/minerals",
+                "/predict/kale/minerals?version=pls"):
+        response = client.post(url, json={'spectrum': spectrum})
+        assert response.status_code == 200, url
+        assert response.json()['prediction'] == pytest.approx(expected)
+
+    assert response.json()['metadata']['model_path'].endswith("kale__minerals__pls.joblib")
+    assert {(m['crop'], m['target']) for m in client.get("/models").json()['loaded']} == {
+        ('carrots', 'protein'), ('kale', 'minerals')
+    }
+
+
+@pytest.mark.parametrize("url", [
+    "/predict/beets/protein",
+    "/predict/carrots/iron",
+    "/predict/carrots/protein?version=v9",
+    "/predict/beets/protein/batch",
+])
+def test_unknown_models_answer_404(api_client, save_model, spectrum, url):
+    save_model(Path("models"))
+    client = api_client()
+
+    body = {'spectra': [spectrum]} if url.endswith("/batch") else {'spectrum': spectrum}
+    assert client.post(url, json=body).status_code == 404
+
+
+@pytest.mark.parametrize("url", [
+    "/predict/carrots/protein?version=x/secret__protein__pls",
+    "/predict/carrots/protein?version=x/../../../secret",
+    "/predict/carrots/protein?version=..",
+    "/predict/carrots/protein?version=%2Fetc%2Fpasswd",
+    "/predict/carrots/prot*",
+    "/predict/.hidden/protein",
+    "/predict/carrots/protein/batch?version=x/../y",
+])
+def test_model_names_cannot_escape_the_models_directory(api_client, save_model, spectrum, url):
+    save_model(Path("models"))
+    # A model the first URL would load if names weren't checked
+    save_model(Path("models/carrots__protein__x"), crop='secret')
+    client = api_client()
+
+    body = {'spectra': [spectrum]} if "/batch" in url else {'spectrum': spectrum}
+    response = client.post(url, json=body)
+    assert response.status_code == 400
+    assert "Invalid" in response.json()['detail']
+
+
+def test_api_starts_without_the_default_model(api_client, save_model, spectrum):
+    save_model(Path("models"), crop='kale')
+    client = api_client()
+
+    assert client.post("/predict", json={'spectrum': spectrum}).status_code == 404
+    assert client.post("/predict/batch", json={'spectra': [spectrum]}).status_code == 404
+    assert client.post("/predict/kale/protein", json={'spectrum': spectrum}).status_code == 200
+    assert client.get("/info").json()['model_path'] is None
+
+
+def test_batch_predictions_match_single_ones(api_client, save_model, fitted_pipeline, spectra):
+    save_model(Path("models"))
+    client = api_client()
+    X = spectra(5, seed=6)[0]
+
+    response = client.post("/predict/batch", json={'spectra': X.tolist()})
+    assert response.status_code == 200
+    body = response.json()
+    expected = fitted_pipeline[0].predict(X).ravel()
+    assert [row['index'] for row in body['predictions']] == list(range(5))
+    assert [row['prediction'] for row in body['predictions']] == pytest.approx(expected)
+    assert body['metadata']['n_spectra'] == 5
+    assert body['metadata']['n_errors'] == 0
+
+    single = client.post("/predict/carrots/protein", json={'spectrum': X[2].tolist()}).json()
+    assert single['prediction'] == pytest.approx(body['predictions'][2]['prediction'])
+
+
+def test_bad_rows_fail_alone(api_client, save_model, spectra):
+    save_model(Path("models"))
+    client = api_client()
+    X = spectra(3, seed=7)[0]
+
+    rows = [X[0].tolist(), X[1, :10].tolist(), X[2].tolist()]
+    body = client.post("/predict/carrots/protein/batch", json={'spectra': rows}).json()
+    assert body['metadata']['n_errors'] == 1
+    assert "doesn't match" in body['predictions'][1]['error']
+    assert body['predictions'][1]['prediction'] is None
+    assert body['predictions'][0]['prediction'] is not None
+    assert body['predictions'][2]['prediction'] is not None
+
+
+def test_binary_batch_with_missing_values(api_client, save_model, fitted_pipeline, spectra):
+    import io
+
+    save_model(Path("models"))
+    client = api_client()
+    X = spectra(4, seed=8)[0]
+    X[1, 3] = np.nan
+    buffer = io.BytesIO()
+    np.save(buffer, X)
+
+    response = client.post("/predict/batch", content=buffer.getvalue(),
+                           headers={'content-type': 'application/x-npy'})
+    rows = response.json()['predictions']
+    assert "non-finite" in rows[1]['error']
+    expected = fitted_pipeline[0].predict(X[[0, 2, 3]]).ravel()
+    assert [rows[i]['prediction'] for i in (0, 2, 3)] == pytest.approx(expected)
+
+
+def test_empty_batch(api_client, save_model):
+    save_model(Path("models"))
+    client = api_client()
+
+    body = client.post("/predict/batch", json={'spectra': []}).json()
+    assert body['predictions'] == []
+    assert body['metadata']['n_spectra'] == 0
@@ -0,0 +1,97 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from src.api.batching import BatchStats, MicroBatcher
+
+
+def test_batch_stats():
+    stats = BatchStats()
+    stats.record(1, [0.2])
+    stats.record(3, [3.0, 1.0, 0.4])
+
+    summary = stats.as_dict()
+    assert summary['batches'] == 2
+    assert summary['requests'] == 4
+    assert summary['mean_batch_size'] == 2.0
+    assert summary['largest_batch'] == 3
+    assert summary['max_queue_delay_ms'] == 3.0
+    assert summary['mean_queue_delay_ms'] == pytest.approx(4.6 / 4)
+    assert summary['batch_size_histogram']['<=1'] == 1
+    assert summary['batch_size_histogram']['<=4'] == 1
+    assert summary['queue_delay_ms_histogram']['<=0.5'] == 2
+    assert summary['queue_delay_ms_histogram']['<=5.0'] == 1
+
+
+def test_batching_endpoint_keeps_the_configured_limit(api_client, save_model, spectra, monkeypatch):
+    from src.api.main import batcher
+
+    monkeypatch.setattr(batcher, 'max_batch_size', 32)
+    save_model(Path("models"))
+    client = api_client()
+    before = client.get("/metrics/batching").json()
+
+    response = client.post("/predict", json={'spectrum': spectra(1)[0][0].tolist()})
+    assert response.status_code == 200
+
+    summary = client.get("/metrics/batching").json()
+    assert summary['max_batch_size'] == 32
+    assert summary['largest_batch'] == max(before['largest_batch'], 1)
+    assert summary['requests'] == before['requests'] + 1
+
+
+@pytest.fixture
+def loaded(fitted_pipeline):
+    """The fitted pipeline as a registry model without a wavelength list."""
+    from src.models.registry import LoadedModel
+
+    return LoadedModel(Path("models/carrots__protein__pls.joblib"), fitted_pipeline[0], 0.0)
+
+
+def run_batcher(batcher, loaded, spectra):
+    """Submit spectra concurrently; returns each one's result or exception."""
+    async def main():
+        return await asyncio.gather(*(batcher.submit(loaded, s) for s in spectra),
+                                    return_exceptions=True)
+
+    return asyncio.run(main())
+
+
+def counting_scorer(sizes):
+    async def scorer(loaded, X):
+        sizes.append(len(X))
+        return loaded.predict_matrix(X)
+
+    return scorer
+
+
+def test_concurrent_submissions_are_coalesced(loaded, fitted_pipeline, spectra):
+    X = spectra(10, seed=9)[0]
+    sizes = []
+    batcher = MicroBatcher(max_batch_size=4, max_wait_ms=50, scorer=counting_scorer(sizes))
+
+    results = run_batcher(batcher, loaded, list(X))
+
+    # Two full batches flushed at once, the remainder after the wait
+    assert sizes == [4, 4, 2]
+    expected = fitted_pipeline[0].predict(X).ravel()
+    assert [row['prediction'] for row, _ in results] == pytest.approx(expected)
+    assert batcher.stats.batches == 3
+    assert batcher.stats.requests == 10
+    assert batcher.stats.largest_batch == 4
+
+
+def test_a_bad_spectrum_fails_alone(loaded, fitted_pipeline, spectra):
+    X = spectra(4, seed=10)[0]
+    sizes = []
+    batcher = MicroBatcher(max_batch_size=8, max_wait_ms=20, scorer=counting_scorer(sizes))
+
+    submitted = [X[0], X[1], X[2, :20], X[3]]
+    results = run_batcher(batcher, loaded, submitted)
+
+    assert isinstance(results[2], ValueError)
+    good = [results[i][0]['prediction'] for i in (0, 1, 3)]
+    assert good == pytest.approx(fitted_pipeline[0].predict(X[[0, 1, 3]]).ravel())
+    # The coalesced batch failed to stack, then each spectrum was scored alone
+    assert sorted(sizes) == [1, 1, 1, 1]
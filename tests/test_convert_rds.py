@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pyreadr = pytest.importorskip("pyreadr")
+
+from src.data.convert_rds import convert
+
+
+@pytest.fixture
+def rds_file(tmp_path, monkeypatch):
+    # Input digests are cached under data/interim
+    monkeypatch.chdir(tmp_path)
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.normal(size=(30, 4)), columns=["1000", "1002", "1004", "1006"])
+    df.insert(0, 'crop', np.where(np.arange(30) % 3 == 0, 'Carrots', 'Kale'))
+    path = tmp_path / "raw.Rds"
+    pyreadr.write_rds(path, df)
+    return path, df
+
+
+def read_sorted(path):
+    return pd.read_parquet(path).astype({'crop': str}).sort_values(['crop', '1000']).reset_index(drop=True)
+
+
+def test_reconversion_swaps_file_and_partitioned_outputs(rds_file, tmp_path):
+    path, df = rds_file
+    output = tmp_path / "out.parquet"
+    expected = df.sort_values(['crop', '1000']).reset_index(drop=True)
+
+    for partition_by in (None, 'crop', None):
+        stats = convert(path, output, partition_by=partition_by, force=True)
+        assert not stats['skipped']
+        assert output.is_dir() == bool(partition_by)
+        pd.testing.assert_frame_equal(read_sorted(output)[expected.columns], expected)
+
+    assert convert(path, output)['skipped']
+    # Neither the staged output nor the replaced one is left behind
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "data", "out.parquet", "out.parquet.manifest.json", "raw.Rds"
+    ]
+
+
+def test_failed_swap_keeps_the_old_output(rds_file, tmp_path, monkeypatch):
+    path, _ = rds_file
+    output = tmp_path / "out.parquet"
+    convert(path, output)
+    before = output.read_bytes()
+
+    real_replace = os.replace
+
+    def failing_replace(src, dst):
+        if ".tmp" in str(src):
+            raise OSError("disk full")
+        return real_replace(src, dst)
+
+    monkeypatch.setattr(os, 'replace', failing_replace)
+    with pytest.raises(OSError):
+        convert(path, output, partition_by='crop', force=True)
+    assert output.read_bytes() == before
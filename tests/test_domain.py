@@ -0,0 +1,112 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from src.models.domain import DomainLimits, calibrate_domain
+from src.models.intervals import calibrate, score_transform
+from src.models.linear import LinearPredictor, fuse_pipeline
+from src.models.train_pls import make_pipeline
+
+
+@pytest.fixture
+def calibrated(spectra):
+    """A pipeline with intervals and 95% domain limits attached, as train_pls does."""
+    X, y = spectra(400, seed=4)
+    model = make_pipeline(n_components=4).fit(X, y)
+    model.intervals_, _ = calibrate(model, X, y, model.predict(X).reshape(-1))
+    weights, offset = score_transform(model, X.shape[1])
+    model.domain_, stats = calibrate_domain(model, X, weights, offset, 0.95)
+    return model, X, stats
+
+
+def direct_statistics(model, X_train, X):
+    """T² from the training score covariance, Q from reconstructing the scaled spectra."""
+    scaler, pls = model[0], model[-1]
+    train_scores = pls.transform(scaler.transform(X_train))
+    precision = np.linalg.inv(train_scores.T @ train_scores / (len(X_train) - 1))
+
+    z = scaler.transform(X)
+    scores = pls.transform(z)
+    t2 = np.einsum('ij,jk,ik->i', scores, precision, scores)
+    q = ((z - pls.inverse_transform(scores)) ** 2).sum(axis=1)
+    return t2, q
+
+
+def shifted(X, seed=0):
+    """Spectra with a baseline shift the training set never saw."""
+    return X + 3.0 * np.random.default_rng(seed).normal(size=X.shape[1])
+
+
+def test_statistics_match_the_direct_computation(calibrated):
+    model, X, _ = calibrated
+    X_new = np.vstack([X[:20], shifted(X[:20])])
+    scores = model[-1].transform(model[0].transform(X_new))
+
+    t2, q = model.domain_.statistics(X_new, scores)
+    expected_t2, expected_q = direct_statistics(model, X, X_new)
+
+    np.testing.assert_allclose(t2, expected_t2, rtol=1e-8)
+    np.testing.assert_allclose(q, expected_q, rtol=1e-8, atol=1e-10)
+
+
+def test_limits_flag_few_training_and_all_shifted_spectra(calibrated):
+    model, X, stats = calibrated
+    domain = model.domain_
+
+    assert domain.level == 0.95
+    assert stats['t2_exceeded_fraction'] <= 0.1
+    assert stats['q_exceeded_fraction'] <= 0.1
+
+    X_out = shifted(X[:50])
+    scores = model[-1].transform(model[0].transform(X_out))
+    flags = domain.flags(*domain.statistics(X_out, scores))
+    assert (flags['q_exceeded'] | flags['t2_exceeded']).all()
+
+
+def test_fused_predictor_carries_the_limits(calibrated, tmp_path):
+    model, X, _ = calibrated
+    X_new = np.vstack([X[:10], shifted(X[:10])])
+    scores = model[-1].transform(model[0].transform(X_new))
+    expected_t2, expected_q = model.domain_.statistics(X_new, scores)
+
+    loaded = LinearPredictor.load(fuse_pipeline(model, X.shape[1]).save(tmp_path / "model.npz"))
+    _, _, statistics = loaded.predict_with_domain(X_new)
+
+    assert loaded.domain.summary() == model.domain_.summary()
+    np.testing.assert_allclose(statistics[0], expected_t2, rtol=1e-8)
+    np.testing.assert_allclose(statistics[1], expected_q, rtol=1e-6, atol=1e-8)
+
+
+def test_float32_statistics_keep_their_precision(calibrated):
+    model, X, _ = calibrated
+    X_new = shifted(X[:20])
+    expected_t2, expected_q = model.domain_.statistics(
+        X_new, model[-1].transform(model[0].transform(X_new))
+    )
+
+    _, _, (t2, q) = fuse_pipeline(model, X.shape[1], np.float32).predict_with_domain(
+        X_new.astype(np.float32)
+    )
+    np.testing.assert_allclose(t2, expected_t2, rtol=1e-3)
+    np.testing.assert_allclose(q, expected_q, rtol=1e-3)
+
+
+def test_limits_round_trip_through_arrays(calibrated):
+    domain = calibrated[0].domain_
+    restored = DomainLimits.from_arrays(domain.to_arrays())
+
+    assert restored.summary() == domain.summary()
+    np.testing.assert_array_equal(restored.projection_weights, domain.projection_weights)
+
+
+def test_api_reports_domain_flags(calibrated, api_client, save_model):
+    model, X, _ = calibrated
+    save_model(Path("models"), model=model)
+    client = api_client()
+
+    body = client.post("/predict/batch", json={'spectra': [X[0].tolist(), shifted(X[:1])[0].tolist()]}).json()
+    inside, outside = (row['domain'] for row in body['predictions'])
+    assert body['metadata']['domain_limits'] == model.domain_.summary()
+    assert not (inside['t2_exceeded'] or inside['q_exceeded'])
+    assert outside['q_exceeded']
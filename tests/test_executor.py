@@ -0,0 +1,67 @@
+import asyncio
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from src.api.executor import PredictionExecutor, QueueFullError
+
+
+def test_admission_is_bounded():
+    executor = PredictionExecutor(max_queue=2)
+
+    with executor.admit(), executor.admit():
+        assert executor.in_flight == 2
+        with pytest.raises(QueueFullError):
+            with executor.admit():
+                pass
+    assert executor.in_flight == 0
+    assert executor.rejected == 1
+    with executor.admit():
+        assert executor.stats()['in_flight'] == 1
+
+
+def test_full_queue_answers_503_with_retry_after(api_client, save_model, spectra, monkeypatch):
+    from src.api.main import executor
+
+    save_model(Path("models"))
+    client = api_client()
+    monkeypatch.setattr(executor, 'max_queue', 0)
+    monkeypatch.setattr(executor, 'retry_after', 7)
+    rejected = executor.rejected
+
+    spectrum = spectra(1)[0][0].tolist()
+    for url, body in (("/predict", {'spectrum': spectrum}),
+                      ("/predict/carrots/protein/batch", {'spectra': [spectrum]})):
+        response = client.post(url, json=body)
+        assert response.status_code == 503
+        assert response.headers['retry-after'] == "7"
+        assert "queue is full" in response.json()['detail']
+    assert executor.rejected == rejected + 2
+    assert client.get("/health").status_code == 200
+
+
+@pytest.mark.parametrize("kind", ["thread", "process"])
+def test_thread_and_process_pools_predict_the_same(kind, tmp_path, save_model, fitted_pipeline, spectra):
+    from src.models.registry import ModelRegistry
+
+    path = save_model(tmp_path)
+    loaded = ModelRegistry(tmp_path).load(path)
+    X = spectra(3, seed=11)[0]
+    executor = PredictionExecutor(kind=kind, workers=1)
+
+    async def predict():
+        aligned = await executor.prepare(loaded, X[0])
+        scored = await executor.score(loaded, X)
+        batch = await executor.predict_batch(loaded, X)
+        return aligned, scored, batch
+
+    try:
+        aligned, (predictions, lower, upper, _), batch = asyncio.run(predict())
+    finally:
+        executor.shutdown()
+
+    expected = fitted_pipeline[0].predict(X).ravel()
+    np.testing.assert_array_equal(aligned, X[0])
+    np.testing.assert_allclose(predictions, expected)
+    assert [row['prediction'] for row in batch['predictions']] == pytest.approx(expected)
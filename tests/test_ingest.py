@@ -0,0 +1,114 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data import clean_bi, ingest
+from src.data.ingest import file_digest, is_fresh, load_table, write_manifest
+
+
+def bump_mtime(path, seconds=10):
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime + seconds, stat.st_mtime + seconds))
+
+
+@pytest.fixture
+def raw_csv(tmp_path):
+    """A small raw export of two crops."""
+    rng = np.random.default_rng(0)
+    n = 40
+    df = pd.DataFrame(rng.normal(size=(n, 12)), columns=[str(1000 + 2 * i) for i in range(12)])
+    df.insert(0, 'sample_id', np.arange(n) // 2)
+    df.insert(1, 'crop', np.where(np.arange(n) % 4 < 2, 'Carrots', 'Kale'))
+    df.insert(2, 'protein', rng.random(n))
+    path = tmp_path / "data" / "raw" / "averaged_dataset.csv"
+    path.parent.mkdir(parents=True)
+    df.to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture
+def parse_calls(monkeypatch):
+    calls = []
+    real_parse = ingest.parse_table
+
+    def counting_parse(path):
+        calls.append(path)
+        return real_parse(path)
+
+    monkeypatch.setattr(ingest, 'parse_table', counting_parse)
+    return calls
+
+
+def test_digest_is_reused_until_the_file_changes(raw_csv, tmp_path):
+    cache = tmp_path / "cache"
+    digest = file_digest(raw_csv, cache)
+
+    # A stored digest is trusted while size and mtime match
+    index_path = cache / "digests.json"
+    index = json.loads(index_path.read_text())
+    index[str(raw_csv.resolve())]['sha256'] = 'stored'
+    index_path.write_text(json.dumps(index))
+    assert file_digest(raw_csv, cache) == 'stored'
+
+    bump_mtime(raw_csv)
+    assert file_digest(raw_csv, cache) == digest
+
+
+def test_tables_are_parsed_once_per_content(raw_csv, tmp_path, parse_calls):
+    cache = tmp_path / "cache"
+    first = load_table(raw_csv, cache)
+    second = load_table(raw_csv, cache)
+
+    assert len(parse_calls) == 1
+    pd.testing.assert_frame_equal(second, first)
+
+    with open(raw_csv, 'a') as f:
+        f.write("99,Carrots,0.5" + ",0.0" * 12 + "\n")
+    bump_mtime(raw_csv)
+    assert len(load_table(raw_csv, cache)) == len(first) + 1
+    assert len(parse_calls) == 2
+    # Opting out parses every time
+    load_table(raw_csv, cache, use_cache=False)
+    assert len(parse_calls) == 3
+
+
+def test_manifest_freshness(tmp_path):
+    output = tmp_path / "out.parquet"
+    output.write_bytes(b"")
+    manifest = tmp_path / "manifest.json"
+    inputs, params = {'dataset': 'abc'}, {'targets': ['protein'], 'dtype': 'float64'}
+
+    assert not is_fresh(manifest, inputs, params)
+    write_manifest(manifest, inputs, params, [output])
+    assert is_fresh(manifest, inputs, params)
+    assert not is_fresh(manifest, {'dataset': 'def'}, params)
+    assert not is_fresh(manifest, inputs, {**params, 'dtype': 'float32'})
+    output.unlink()
+    assert not is_fresh(manifest, inputs, params)
+
+
+def test_clean_bi_skips_unchanged_inputs(raw_csv, tmp_path, monkeypatch, capsys, parse_calls):
+    monkeypatch.chdir(tmp_path)
+    X_path = tmp_path / "data" / "clean" / "carrots__X.parquet"
+
+    def run(*flags):
+        monkeypatch.setattr(sys, 'argv', ["clean_bi", "--crop", "carrots", "--target", "protein", *flags])
+        assert clean_bi.main() == 0
+        return "up to date" in capsys.readouterr().out
+
+    assert not run()
+    built = X_path.stat().st_mtime_ns
+    assert run()
+    assert X_path.stat().st_mtime_ns == built
+
+    # Changed parameters, --force and a missing output each rebuild
+    assert not run("--dtype", "float32")
+    assert not run("--dtype", "float32", "--force")
+    X_path.unlink()
+    assert not run("--dtype", "float32")
+    # The raw file was parsed once; rebuilds read the parsed copy
+    assert len(parse_calls) == 1
@@ -0,0 +1,84 @@
+import math
+
+import numpy as np
+
+from src.models.intervals import calibrate, conformal_quantile
+from src.models.train_pls import make_pipeline
+
+
+def test_conformal_quantile_rank():
+    scores = np.arange(1.0, 100.0)[::-1]
+    # ceil((99 + 1) * 0.9) = 90th smallest score
+    assert conformal_quantile(scores, 0.9) == [90.0]
+    assert conformal_quantile(scores, 0.999) == [99.0]
+
+
+def test_conformal_quantile_per_column():
+    scores = np.column_stack([np.arange(10.0), 10 * np.arange(10.0)])
+    np.testing.assert_array_equal(conformal_quantile(scores, 0.5), [5.0, 50.0])
+    assert np.isnan(conformal_quantile(np.empty((0, 2)), 0.8)).all()
+
+
+def test_conformal_quantile_coverage():
+    # A new exchangeable score falls within the quantile at least `level` of the time
+    rng = np.random.default_rng(0)
+    level, n, trials = 0.8, 49, 4000
+    scores = rng.exponential(size=(trials, n + 1))
+    covered = [s[-1] <= conformal_quantile(s[:-1], level)[0] for s in scores]
+    assert np.mean(covered) >= level - 3 * math.sqrt(level * (1 - level) / trials)
+
+
+def test_calibrated_intervals_cover_new_samples(spectra):
+    from sklearn.model_selection import KFold, cross_val_predict
+
+    level = 0.9
+    X, y = spectra(600, noise=0.5, seed=2)
+    oof = cross_val_predict(make_pipeline(n_components=4), X, y,
+                            cv=KFold(5, shuffle=True, random_state=0))
+    model = make_pipeline(n_components=4).fit(X, y)
+
+    intervals, stats = calibrate(model, X, y, oof, level)
+    assert stats['n_calibration'] == len(X)
+    assert stats['oof_coverage'] >= level
+
+    X_new, y_new = spectra(4000, noise=0.5, seed=3)
+    prediction = model.predict(X_new).reshape(-1)
+    half_width = intervals.half_width(X_new)[:, 0]
+    coverage = np.mean(np.abs(y_new - prediction) <= half_width)
+    assert abs(coverage - level) < 0.03
+
+
+def test_calibrate_skips_unassigned_rows(fitted_pipeline):
+    model, X, y = fitted_pipeline
+    oof = model.predict(X).reshape(-1)
+    oof[:50] = np.nan
+
+    _, stats = calibrate(model, X, y, oof, 0.8)
+    assert stats['n_calibration'] == len(X) - 50
+
+
+def test_infer_reports_the_calibrated_level(fitted_pipeline, save_model, tmp_path, monkeypatch, capsys):
+    import json
+    import sys
+
+    from src.models import infer
+
+    model, X, y = fitted_pipeline
+    spectrum_path = tmp_path / "spectrum.json"
+    spectrum_path.write_text(json.dumps(X[0].tolist()))
+
+    def run(version):
+        monkeypatch.setattr(sys, 'argv', [
+            "infer", "--model", str(tmp_path / f"carrots__protein__{version}.joblib"),
+            "--spectrum", str(spectrum_path), "--wavelengths", str(tmp_path / "carrots__wavelengths.json")
+        ])
+        infer.main()
+        return capsys.readouterr().out
+
+    save_model(tmp_path, version='uncalibrated')
+    assert "Uncalibrated PI: [" in run('uncalibrated')
+
+    model.intervals_, _ = calibrate(model, X, y, model.predict(X).reshape(-1), 0.9)
+    save_model(tmp_path, version='calibrated', model=model)
+    assert "90% PI: [" in run('calibrated')
+    assert json.loads((tmp_path / "prediction_result.json").read_text())['metadata']['interval_level'] == 0.9
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from src.models.linear import LinearPredictor, check_parity, export_linear, fuse_pipeline, linear_path_for
+
+
+def test_parity_float64(fitted_pipeline):
+    model, X, _ = fitted_pipeline
+    linear = fuse_pipeline(model, X.shape[1])
+
+    assert linear.dtype == np.float64
+    assert check_parity(model, linear, X) < 1e-9
+    # Random spectra when none are given
+    assert check_parity(model, linear) < 1e-9
+
+
+def test_parity_float32(fitted_pipeline):
+    model, X, _ = fitted_pipeline
+    linear = fuse_pipeline(model, X.shape[1], np.float32)
+
+    assert linear.dtype == np.float32
+    assert linear.predict(X).dtype == np.float32
+    # float32 rounding of spectra and coefficients, as export_linear allows
+    assert check_parity(model, linear, X, rtol=1e-3, atol=1e-3) < 1e-3
+    with pytest.raises(ValueError, match="does not match"):
+        check_parity(model, linear, X, rtol=0, atol=1e-12)
+
+
+def test_parity_detects_a_wrong_predictor(fitted_pipeline):
+    model, X, _ = fitted_pipeline
+    linear = fuse_pipeline(model, X.shape[1])
+    broken = LinearPredictor(linear.coef, linear.intercept + 1e-3)
+
+    with pytest.raises(ValueError, match="does not match"):
+        check_parity(model, broken, X)
+
+
+def test_save_load_round_trip(fitted_pipeline, tmp_path):
+    model, X, _ = fitted_pipeline
+    for dtype in (np.float64, np.float32):
+        path = fuse_pipeline(model, X.shape[1], dtype).save(tmp_path / f"{np.dtype(dtype).name}.npz")
+        loaded = LinearPredictor.load(path)
+        assert loaded.dtype == dtype
+        check_parity(model, loaded, X, rtol=1e-3, atol=1e-3)
+
+
+def test_export_reports_the_path_written(fitted_pipeline, tmp_path, capsys):
+    model, X, _ = fitted_pipeline
+    model_path = tmp_path / "carrots__protein__pls.joblib"
+
+    assert export_linear(model, model_path, X.shape[1], X_check=X) == linear_path_for(model_path)
+    assert f"Saved fused linear predictor to {linear_path_for(model_path)}" in capsys.readouterr().out
+
+    # A staged export leaves reporting the final path to the caller
+    staged = tmp_path / ".staged.npz"
+    assert export_linear(model, model_path, X.shape[1], X_check=X, output_path=staged) == staged
+    out = capsys.readouterr().out
+    assert "Saved" not in out and "max parity diff" in out
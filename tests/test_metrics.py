@@ -0,0 +1,82 @@
+from pathlib import Path
+
+from src.api.metrics import UNKNOWN_MODEL, APIMetrics, Counter, Histogram
+
+
+def test_counter_renders_escaped_labels():
+    counter = Counter("hits_total", "Hits", ('crop', 'target'))
+    counter.inc(('kale', 'pro"tein'))
+    counter.inc(('carrots', 'protein'), 2)
+
+    assert list(counter.samples()) == [
+        'hits_total{crop="carrots",target="protein"} 2',
+        'hits_total{crop="kale",target="pro\\"tein"} 1',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Latency", ('stage',), buckets=(0.1, 1.0))
+    histogram.observe(('parse',), 0.05)
+    histogram.observe(('parse',), 0.5, count=2)
+    histogram.observe(('parse',), 5.0)
+
+    assert histogram.count(('parse',)) == 4
+    assert list(histogram.samples()) == [
+        'latency_seconds_bucket{stage="parse",le="0.1"} 1',
+        'latency_seconds_bucket{stage="parse",le="1.0"} 3',
+        'latency_seconds_bucket{stage="parse",le="+Inf"} 4',
+        'latency_seconds_sum{stage="parse"} 6.05',
+        'latency_seconds_count{stage="parse"} 4',
+    ]
+
+
+def test_errors_are_counted_with_requests():
+    metrics = APIMetrics(prefix="test")
+    model = ('carrots', 'protein', 'pls')
+    metrics.observe_request('predict', model, 200, 0.01, n_spectra=1)
+    metrics.observe_request('predict', model, 422, 0.01)
+
+    text = metrics.render()
+    assert 'test_requests_total{endpoint="predict",crop="carrots",target="protein",version="pls",status="422"} 1' in text
+    assert 'test_request_errors_total{endpoint="predict",crop="carrots",target="protein",version="pls",status="422"} 1' in text
+    assert metrics.errors.value(('predict',) + model + ('200',)) == 0
+    assert metrics.spectra.value(('predict',) + model) == 1
+    assert '# TYPE test_request_duration_seconds histogram' in text
+
+
+def test_api_requests_are_labeled_by_resolved_model(api_client, save_model, spectra):
+    from src.api import main
+
+    save_model(Path("models"))
+    client = api_client()
+    X, _ = spectra(3)
+    model = ('carrots', 'protein', 'pls')
+
+    def requests(endpoint, labels, status):
+        return main.metrics.requests.value((endpoint,) + labels + (str(status),))
+
+    before = {
+        'ok': requests('predict', model, 200),
+        'batch': requests('predict_batch', model, 200),
+        'unknown': requests('predict', UNKNOWN_MODEL, 404),
+        'parse': main.metrics.stages.count(('parse',) + model),
+        'spectra': main.metrics.spectra.value(('predict_batch',) + model),
+    }
+    assert client.post("/predict/carrots/protein", json={'spectrum': X[0].tolist()}).status_code == 200
+    assert client.post("/predict/carrots/protein/batch", json={'spectra': X.tolist()}).status_code == 200
+    assert client.post("/predict/beets/protein", json={'spectrum': X[0].tolist()}).status_code == 404
+
+    assert requests('predict', model, 200) == before['ok'] + 1
+    assert requests('predict_batch', model, 200) == before['batch'] + 1
+    # Requests matching no model share one label set, whatever the path said
+    assert requests('predict', UNKNOWN_MODEL, 404) == before['unknown'] + 1
+    assert not any('beets' in labels for labels in main.metrics.requests._values)
+    assert main.metrics.stages.count(('parse',) + model) == before['parse'] + 2
+    assert main.metrics.spectra.value(('predict_batch',) + model) == before['spectra'] + 3
+
+    response = client.get("/metrics")
+    assert response.headers['content-type'].startswith("text/plain")
+    for stage in ('parse', 'validate', 'model', 'predict', 'serialize'):
+        assert f'nutrient_stage_duration_seconds_count{{stage="{stage}",crop="carrots"' in response.text
+    assert 'nutrient_request_errors_total{endpoint="predict",crop="unknown"' in response.text
+    assert "nutrient_loaded_models 1" in response.text
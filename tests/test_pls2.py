@@ -0,0 +1,83 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data.clean_bi import save_splits
+from src.models.linear import LinearPredictor, linear_path_for
+from src.models.registry import ModelRegistry
+from src.models.train_pls import train_target
+
+
+@pytest.fixture
+def trained(tmp_path, spectra):
+    """Single-target and PLS2 models of two targets, one with unmeasured rows, under models/."""
+    models_dir = tmp_path / "models"
+    models_dir.mkdir()
+    X, protein = spectra(240)
+    rng = np.random.default_rng(3)
+    y = pd.DataFrame({'protein': protein, 'fat': 0.01 * protein + 0.002 * rng.normal(size=len(protein))})
+    y.loc[:19, 'fat'] = np.nan
+    X = pd.DataFrame(X, columns=[str(1000 + 10 * i) for i in range(X.shape[1])])
+    folds_path = save_splits(tmp_path, 'carrots', np.arange(len(X)) // 2)
+    (models_dir / "carrots__wavelengths.json").write_text(json.dumps(list(X.columns)))
+
+    train_target('carrots', 'protein', X, y['protein'], folds_path, search='path', models_dir=models_dir)
+    metrics = train_target('carrots', ['protein', 'fat'], X, y, folds_path, search='path',
+                           models_dir=models_dir)
+    return models_dir, X, y, metrics
+
+
+def test_pls2_metrics_report_every_target(trained):
+    models_dir, X, _, metrics = trained
+
+    assert metrics['target'] == 'multi'
+    assert metrics['targets'] == ['protein', 'fat']
+    # Rows without every target are left out
+    assert metrics['n_samples'] == len(X) - 20
+    assert set(metrics['cv_scores']) == {'protein', 'fat'}
+    assert all(scores['r2_mean'] > 0.9 for scores in metrics['cv_scores'].values())
+    # Compared with the single-target model where one was trained
+    comparison = metrics['single_target_comparison']
+    assert comparison['fat'] is None
+    single = json.loads((models_dir / "carrots__protein__pls__metrics.json").read_text())
+    assert comparison['protein']['single_r2'] == pytest.approx(single['cv_scores']['r2_mean'])
+
+
+def test_pls2_predicts_every_target_in_one_product(trained):
+    models_dir, X, _, _ = trained
+    registry = ModelRegistry(models_dir)
+    pipeline = registry.get('carrots', 'multi', 'pls2')
+    fused = LinearPredictor.load(linear_path_for(pipeline.model_path))
+
+    assert fused.targets == ['protein', 'fat']
+    assert fused.predict(X.values[:5]).shape == (5, 2)
+
+    result = pipeline.predict_batch(X.values[:3].tolist())
+    for row, expected in zip(result['predictions'], fused.predict(X.values[:3])):
+        assert row['prediction'] is None and row['confidence_interval'] is None
+        assert list(row['targets']) == ['protein', 'fat']
+        for j, name in enumerate(('protein', 'fat')):
+            target = row['targets'][name]
+            assert target['prediction'] == pytest.approx(expected[j], rel=1e-9)
+            interval = target['confidence_interval']
+            assert interval['lower'] < target['prediction'] < interval['upper']
+    assert result['metadata']['targets'] == ['protein', 'fat']
+
+
+def test_multi_endpoints(trained, api_client):
+    _, X, _, _ = trained
+    client = api_client()
+
+    single = client.post("/predict/carrots/multi", json={'spectrum': X.values[0].tolist()}).json()
+    assert single['prediction'] is None
+    assert set(single['targets']) == {'protein', 'fat'}
+
+    batch = client.post("/predict/carrots/multi/batch", json={'spectra': X.values[:2].tolist()}).json()
+    for name, row in batch['predictions'][0]['targets'].items():
+        assert row['prediction'] == pytest.approx(single['targets'][name]['prediction'], rel=1e-9)
+    # Single-target models answer as before
+    protein = client.post("/predict/carrots/protein", json={'spectrum': X.values[0].tolist()}).json()
+    assert protein['targets'] is None
+    assert protein['prediction'] == pytest.approx(single['targets']['protein']['prediction'], rel=0.05)
@@ -0,0 +1,73 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.models.pls_path import cv_path, fit_path, predict_path
+from src.models.train_pls import grid_search_components, make_pipeline, path_search_components
+
+
+def multi_target(spectra, n_samples, seed=0):
+    X, y = spectra(n_samples, seed=seed)
+    rng = np.random.default_rng(seed + 100)
+    Y = np.column_stack([y, 0.5 * y + X[:, :4].sum(axis=1), rng.normal(size=n_samples)])
+    return X, Y
+
+
+def sklearn_predictions(X, Y, X_new, n_components):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        model = make_pipeline(n_components).fit(X, Y)
+    return np.asarray(model.predict(X_new)).reshape(len(X_new), -1)
+
+
+@pytest.mark.parametrize("n_targets", [1, 3])
+def test_path_matches_sklearn_for_every_component_count(spectra, n_targets):
+    X, Y = multi_target(spectra, 150)
+    Y = Y[:, :n_targets]
+    X_new = spectra(20, seed=1)[0]
+
+    predictions = predict_path(fit_path(X, Y, 12), X_new)
+    assert predictions.shape == (20, 12, n_targets)
+    for k in (1, 2, 5, 12):
+        np.testing.assert_allclose(predictions[:, k - 1], sklearn_predictions(X, Y, X_new, k),
+                                   rtol=0, atol=1e-10)
+
+
+def test_float32_path(spectra):
+    X, Y = multi_target(spectra, 150)
+    X_new = spectra(20, seed=1)[0]
+
+    path = fit_path(X.astype(np.float32), Y, 6)
+    assert path['rotations'].dtype == np.float32
+    np.testing.assert_allclose(predict_path(path, X_new)[:, 5], sklearn_predictions(X, Y, X_new, 6),
+                               atol=1e-3)
+
+
+def test_cv_path_scores_every_candidate_on_the_folds(spectra):
+    X, y = spectra(120)
+    folds = [(np.setdiff1d(np.arange(120), val), val) for val in np.array_split(np.arange(120), 4)]
+
+    cv = cv_path(X, y, folds, [5, 1, 3, 500])
+    # Candidates beyond what every fold can fit are dropped
+    assert cv['components'] == [1, 3, 5]
+    for j, k in enumerate(cv['components']):
+        for i, (train, val) in enumerate(folds):
+            expected = sklearn_predictions(X[train], y[train], X[val], k)[:, 0]
+            np.testing.assert_allclose(cv['oof'][val, j, 0], expected, atol=1e-10)
+            assert cv['fold_mse'][i, j, 0] == pytest.approx(np.mean((expected - y[val]) ** 2))
+
+
+def test_grid_and_path_search_agree_on_the_manifest_folds(spectra):
+    X, y = spectra(200, noise=0.3)
+    X, y = pd.DataFrame(X), pd.Series(y)
+    folds = [(np.setdiff1d(np.arange(200), val), val) for val in np.array_split(np.arange(200), 5)]
+
+    _, grid_n, grid_scores, _, grid_oof = grid_search_components(X, y, folds, n_jobs=1)
+    _, path_n, path_scores, cv_rmse, path_oof = path_search_components(X, y, folds)
+
+    assert grid_n == path_n
+    np.testing.assert_allclose(grid_oof, path_oof, atol=1e-10)
+    assert [s['rmse'] for s in grid_scores] == pytest.approx([s['rmse'] for s in path_scores])
+    assert min(cv_rmse, key=cv_rmse.get) == path_n
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from src.models.linear import LinearPredictor, check_parity, fuse_pipeline
+from src.models.preprocessing import (
+    SpectralPreprocessor,
+    detrend,
+    parse_method,
+    savgol,
+    snv,
+    split_preprocessing,
+)
+from src.models.train_pls import make_pipeline
+
+
+@pytest.fixture
+def X(spectra):
+    X, _ = spectra(25)
+    # A sloped, offset baseline like real reflectance spectra
+    return X + 5.0 + np.linspace(0, 2, X.shape[1])
+
+
+def test_snv_rows_have_zero_mean_and_unit_std(X):
+    Z = snv(X)
+    np.testing.assert_allclose(Z.mean(axis=1), 0, atol=1e-12)
+    np.testing.assert_allclose(Z.std(axis=1, ddof=1), 1)
+    # A flat spectrum is centred, not divided by zero
+    np.testing.assert_array_equal(snv(np.full((1, 5), 3.0)), np.zeros((1, 5)))
+
+
+def test_detrend_matches_polyfit_residuals(X):
+    positions = np.linspace(-1, 1, X.shape[1])
+    expected = np.array([row - np.polyval(np.polyfit(positions, row, 2), positions) for row in X])
+    np.testing.assert_allclose(detrend(X, 2), expected, atol=1e-10)
+
+
+@pytest.mark.parametrize("deriv", [0, 1, 2])
+def test_savgol_matches_scipy(X, deriv):
+    signal = pytest.importorskip("scipy.signal")
+
+    expected = signal.savgol_filter(X, 11, 2, deriv=deriv, axis=1, mode='nearest')
+    np.testing.assert_allclose(savgol(X, 11, 2, deriv), expected, atol=1e-10)
+
+
+def test_chain_is_row_wise_and_keeps_float32(X):
+    preprocessor = SpectralPreprocessor('snv+detrend+sg1', window=7)
+    batch = preprocessor.fit_transform(X)
+
+    np.testing.assert_allclose(np.vstack([preprocessor.transform(row[None]) for row in X]), batch)
+    np.testing.assert_allclose(batch, savgol(detrend(snv(X)), 7, 2, 1))
+    assert preprocessor.transform(X.astype(np.float32)).dtype == np.float32
+    np.testing.assert_array_equal(SpectralPreprocessor('none').transform(X), X)
+
+
+def test_invalid_methods_and_parameters():
+    assert parse_method('none') == []
+    with pytest.raises(ValueError, match="Unknown"):
+        parse_method('snv+msc')
+    with pytest.raises(ValueError, match="odd"):
+        SpectralPreprocessor('sg', window=10).fit(np.zeros((2, 20)))
+    with pytest.raises(ValueError, match="polyorder"):
+        SpectralPreprocessor('sg2', polyorder=1).fit(np.zeros((2, 20)))
+
+
+def test_params_clone_and_round_trip():
+    from sklearn.base import clone
+
+    preprocessor = SpectralPreprocessor('snv+sg1', window=9)
+    assert repr(clone(preprocessor)) == repr(preprocessor)
+    pipeline = clone(make_pipeline(3, 'snv')).set_params(preprocess__method='sg')
+    assert pipeline.get_params()['preprocess__method'] == 'sg'
+    assert repr(SpectralPreprocessor.from_arrays(preprocessor.to_arrays())) == repr(preprocessor)
+
+
+def test_split_preprocessing(fitted_pipeline):
+    model = fitted_pipeline[0]
+    assert split_preprocessing(model) == (None, model)
+
+    with_snv = make_pipeline(3, 'snv')
+    preprocessor, rest = split_preprocessing(with_snv)
+    assert preprocessor is with_snv[0]
+    assert [name for name, _ in rest.steps] == ['scaler', 'pls']
+    assert split_preprocessing(make_pipeline(3, 'none'))[0] is None
+
+
+@pytest.mark.parametrize("method", ['snv', 'detrend+sg1'])
+def test_fused_predictor_applies_the_preprocessing(spectra, tmp_path, method):
+    X, y = spectra(300)
+    X = X + 5.0
+    model = make_pipeline(n_components=3, preprocessing=method).fit(X, y)
+
+    linear = fuse_pipeline(model, X.shape[1])
+    assert check_parity(model, linear, X) < 1e-9
+    loaded = LinearPredictor.load(linear.save(tmp_path / "model.npz"))
+    assert check_parity(model, loaded, X) < 1e-9
@@ -0,0 +1,157 @@
+import os
+import threading
+
+import joblib
+import pytest
+
+from src.models.linear import LinearPredictor, fuse_pipeline, linear_path_for
+from src.models.registry import ModelRegistry
+
+
+@pytest.fixture
+def load_calls(monkeypatch):
+    """Count joblib.load calls made by the registry."""
+    calls = []
+    real_load = joblib.load
+
+    def counting_load(path, *args, **kwargs):
+        calls.append(path)
+        return real_load(path, *args, **kwargs)
+
+    monkeypatch.setattr(joblib, 'load', counting_load)
+    return calls
+
+
+def bump_mtime(path, seconds=10):
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime + seconds, stat.st_mtime + seconds))
+
+
+def test_models_are_cached_until_the_file_changes(tmp_path, save_model, load_calls):
+    path = save_model(tmp_path)
+    registry = ModelRegistry(tmp_path)
+
+    first = registry.get('carrots', 'protein')
+    assert registry.get('carrots', 'protein') is first
+    assert registry.load(path) is first
+    assert len(load_calls) == 1
+    assert first.key == ('carrots', 'protein', 'pls')
+    assert first.n_wavelengths == 60
+
+    bump_mtime(path)
+    assert registry.get('carrots', 'protein') is not first
+    assert len(load_calls) == 2
+
+
+def test_fused_predictor_is_preferred_unless_older(tmp_path, save_model, fitted_pipeline, load_calls):
+    path = save_model(tmp_path)
+    fuse_pipeline(fitted_pipeline[0], 60).save(linear_path_for(path))
+    bump_mtime(linear_path_for(path))
+    registry = ModelRegistry(tmp_path)
+
+    assert isinstance(registry.get('carrots', 'protein').model, LinearPredictor)
+    assert load_calls == []
+
+    # A retrained .joblib whose .npz hasn't been replaced yet
+    bump_mtime(path, 20)
+    assert not isinstance(registry.get('carrots', 'protein').model, LinearPredictor)
+    bump_mtime(linear_path_for(path), 20)
+    assert isinstance(registry.get('carrots', 'protein').model, LinearPredictor)
+
+
+def test_latest_version_and_available(tmp_path, save_model):
+    save_model(tmp_path, version='v1')
+    bump_mtime(save_model(tmp_path, version='v2'))
+    save_model(tmp_path, crop='kale')
+    # A staging file still being written
+    (tmp_path / ".carrots__protein__v3.1234.tmp.joblib").write_bytes(b"")
+    registry = ModelRegistry(tmp_path)
+
+    assert registry.get('carrots', 'protein').version == 'v2'
+    assert registry.get('carrots', 'protein', 'v1').version == 'v1'
+    assert registry.available() == [
+        ('carrots', 'protein', 'v1'), ('carrots', 'protein', 'v2'), ('kale', 'protein', 'pls')
+    ]
+    with pytest.raises(FileNotFoundError):
+        registry.get('beets', 'protein')
+
+
+def test_least_recently_used_models_are_evicted_over_budget(tmp_path, save_model):
+    path = save_model(tmp_path)
+    for crop in ('kale', 'spinach'):
+        save_model(tmp_path, crop=crop)
+    registry = ModelRegistry(tmp_path, max_bytes=int(2.5 * path.stat().st_size))
+
+    registry.get('carrots', 'protein')
+    registry.get('kale', 'protein')
+    registry.get('carrots', 'protein')
+    registry.get('spinach', 'protein')
+    assert [m.crop for m in registry.loaded()] == ['carrots', 'spinach']
+
+
+def test_idle_models_are_evicted(tmp_path, save_model):
+    save_model(tmp_path)
+    save_model(tmp_path, crop='kale')
+    registry = ModelRegistry(tmp_path, idle_seconds=0.0)
+
+    registry.get('carrots', 'protein')
+    registry.get('kale', 'protein')
+    # The model just used is kept
+    assert [m.crop for m in registry.loaded()] == ['kale']
+    assert registry.evict_idle() == [('kale', 'protein', 'pls')]
+    assert registry.loaded() == []
+
+
+def test_cold_load_does_not_block_cached_lookups(tmp_path, save_model, monkeypatch):
+    save_model(tmp_path)
+    save_model(tmp_path, crop='kale')
+    registry = ModelRegistry(tmp_path)
+    registry.get('carrots', 'protein')
+
+    started, release = threading.Event(), threading.Event()
+    real_load = joblib.load
+
+    def slow_load(path, *args, **kwargs):
+        started.set()
+        release.wait(10)
+        return real_load(path, *args, **kwargs)
+
+    monkeypatch.setattr(joblib, 'load', slow_load)
+    loader = threading.Thread(target=registry.get, args=('kale', 'protein'))
+    loader.start()
+    try:
+        assert started.wait(10)
+        cached = []
+        lookup = threading.Thread(target=lambda: cached.append(registry.get('carrots', 'protein')))
+        lookup.start()
+        lookup.join(5)
+        assert cached, "a cached lookup waited for another model's cold load"
+    finally:
+        release.set()
+        loader.join()
+    assert {m.crop for m in registry.loaded()} == {'carrots', 'kale'}
+
+
+def test_concurrent_cold_loads_of_one_model_load_it_once(tmp_path, save_model, monkeypatch):
+    save_model(tmp_path)
+    registry = ModelRegistry(tmp_path)
+
+    calls = []
+    real_load = joblib.load
+
+    def slow_load(path, *args, **kwargs):
+        calls.append(path)
+        threading.Event().wait(0.2)
+        return real_load(path, *args, **kwargs)
+
+    monkeypatch.setattr(joblib, 'load', slow_load)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get('carrots', 'protein')))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
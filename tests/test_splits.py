@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data.clean_bi import save_splits
+from src.data.splits import (
+    fold_ids_from_splits,
+    folds_from_ids,
+    load_fold_ids,
+    load_folds,
+    save_fold_ids,
+    splits_file,
+    splits_path,
+)
+
+
+def test_fold_ids_round_trip():
+    val_indices = [np.array([0, 4]), np.array([2, 3]), np.array([5])]
+    fold_ids = fold_ids_from_splits(7, val_indices)
+
+    assert fold_ids.dtype == np.int8
+    np.testing.assert_array_equal(fold_ids, [0, -1, 1, 1, 0, 2, -1])
+    folds = folds_from_ids(fold_ids)
+    for (train_idx, val_idx), expected in zip(folds, val_indices):
+        np.testing.assert_array_equal(val_idx, expected)
+        # Unassigned samples are in no training set either
+        np.testing.assert_array_equal(train_idx, np.setdiff1d([0, 2, 3, 4, 5], expected))
+    assert folds_from_ids(np.full(3, -1)) == []
+
+
+def test_saved_fold_ids_load_memory_mapped(tmp_path):
+    path = save_fold_ids(tmp_path / splits_file('kale'), np.array([1, 0, 1, 0]))
+
+    assert isinstance(load_fold_ids(path), np.memmap)
+    folds = load_folds(path, mask=np.array([True, True, False, True]))
+    np.testing.assert_array_equal(folds[0][1], [1, 2])
+    np.testing.assert_array_equal(folds[1][1], [0])
+    with pytest.raises(ValueError):
+        load_folds(path, mask=np.ones(3, dtype=bool))
+
+
+def test_clean_bi_splits_keep_samples_together(tmp_path):
+    groups = np.repeat(np.arange(40), 3)
+    fold_ids = load_fold_ids(save_splits(tmp_path, 'kale', groups))
+
+    assert set(fold_ids.tolist()) == set(range(5))
+    for group in range(40):
+        assert len(set(fold_ids[groups == group].tolist())) == 1
+
+
+def test_legacy_csv_manifest(tmp_path):
+    # As written by the original cleaning script: one row of stringified lists per fold
+    val_indices = [[0, 3], [1, 4], [2, 5]]
+    pd.DataFrame([
+        {'fold': i, 'train_idx': sorted(set(range(6)) - set(val)), 'val_idx': val}
+        for i, val in enumerate(val_indices)
+    ]).to_csv(tmp_path / "splits.csv", index=False)
+
+    path = splits_path(tmp_path, 'kale')
+    assert path == tmp_path / "splits.csv"
+    for (train_idx, val_idx), val in zip(load_folds(path), val_indices):
+        np.testing.assert_array_equal(val_idx, val)
+        np.testing.assert_array_equal(train_idx, sorted(set(range(6)) - set(val)))
+    np.testing.assert_array_equal(load_folds(path, mask=np.arange(6) < 4)[0][1], [0, 3])
+
+
+def test_splits_path_prefers_the_crop_manifest(tmp_path):
+    assert splits_path(tmp_path, 'kale') is None
+    (tmp_path / "splits.csv").write_text("fold,train_idx,val_idx\n")
+    # A shared splits.npy is not a manifest format
+    np.save(tmp_path / "splits.npy", np.zeros(3, dtype=np.int8))
+    assert splits_path(tmp_path, 'kale') == tmp_path / "splits.csv"
+    save_fold_ids(tmp_path / splits_file('kale'), np.zeros(3))
+    assert splits_path(tmp_path, 'kale') == tmp_path / "kale__splits.npy"
@@ -0,0 +1,118 @@
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data import clean_bi, streaming
+from src.data.streaming import StreamingCleaner
+
+
+pytest.importorskip("pyarrow")
+
+WAVELENGTHS = [str(w) for w in range(1000, 1040, 2)]
+
+
+@pytest.fixture
+def raw_dataset(tmp_path):
+    """Raw scans of two crops with missing values and many tied readings."""
+    rng = np.random.default_rng(0)
+    n = 501
+    spectra = rng.normal(size=(n, len(WAVELENGTHS)))
+    # Coarse values make ties (and equal values across histogram bins) common
+    spectra[:, :5] = rng.integers(0, 4, size=(n, 5))
+    spectra[:, 5] = 1e6 * rng.random(n)
+    spectra[rng.random(spectra.shape) < 0.05] = np.nan
+    spectra[:, 6] = np.nan
+    spectra[:3, 6] = [4.0, -2.0, 7.5]
+
+    df = pd.DataFrame(spectra, columns=WAVELENGTHS)
+    df.insert(0, 'sample_id', np.arange(n) // 3)
+    df.insert(1, 'crop', rng.choice(['Carrots', 'kale'], size=n))
+    df.insert(2, 'protein', np.where(rng.random(n) < 0.1, np.nan, rng.random(n)))
+
+    path = tmp_path / "raw.parquet"
+    df.to_parquet(path, index=False)
+    return path, df
+
+
+def in_memory_rows(df, crop='carrots'):
+    return df[(df['crop'].str.lower() == crop) & df['protein'].notna()]
+
+
+def streaming_medians(path, batch_rows=50):
+    cleaner = StreamingCleaner(path, 'carrots', 'protein', batch_rows=batch_rows)
+    stats = cleaner.scan_stats()
+    counts = len(stats['y']) - stats['missing']
+    # Columns without any value are dropped by run() before imputing
+    measured = counts > 0
+    columns = [col for col, m in zip(cleaner.nir_cols, measured) if m]
+    medians = cleaner.medians(columns, counts[measured], stats['lo'][measured], stats['hi'][measured])
+    return columns, medians
+
+
+@pytest.mark.parametrize("batch_rows", [1, 17, 10_000])
+def test_streaming_medians_match_pandas(raw_dataset, batch_rows):
+    path, df = raw_dataset
+    expected = in_memory_rows(df)[WAVELENGTHS]
+
+    columns, medians = streaming_medians(path, batch_rows)
+
+    np.testing.assert_array_equal(medians, expected[columns].median().to_numpy())
+
+
+def test_clustered_columns_are_rebinned_within_the_buffer(raw_dataset, monkeypatch):
+    path, df = raw_dataset
+    expected = in_memory_rows(df)[WAVELENGTHS]
+    # Far fewer values than the median bins of the tied columns hold
+    monkeypatch.setattr(streaming, 'MEDIAN_BUFFER', 8)
+    collected = []
+    real_scan = StreamingCleaner._scan_windows
+
+    def recording_scan(self, *args):
+        result = real_scan(self, *args)
+        collected.extend(len(np.concatenate(v)) for v in result[-1] if v)
+        return result
+
+    monkeypatch.setattr(StreamingCleaner, '_scan_windows', recording_scan)
+    columns, medians = streaming_medians(path)
+
+    np.testing.assert_array_equal(medians, expected[columns].median().to_numpy())
+    assert collected and max(collected) <= 8
+
+
+def test_streaming_clean_matches_in_memory(raw_dataset, tmp_path):
+    path, df = raw_dataset
+    rows = in_memory_rows(df)
+    # Columns missing more than 10% are dropped, the rest imputed with the median
+    kept = [col for col in WAVELENGTHS if rows[col].isna().mean() * 100 <= 10.0]
+    expected = rows[kept].fillna(rows[kept].median())
+
+    result = StreamingCleaner(path, 'carrots', 'protein', batch_rows=50).run(tmp_path / "X.parquet")
+    written = pd.read_parquet(tmp_path / "X.parquet")
+
+    assert result['nir_cols'] == kept
+    assert result['dropped_cols'] == len(WAVELENGTHS) - len(kept)
+    np.testing.assert_array_equal(result['y'], rows['protein'].to_numpy())
+    np.testing.assert_array_equal(written.to_numpy(), expected.to_numpy())
+
+
+def test_clean_bi_stream_matches_in_memory_clean(raw_dataset, tmp_path, monkeypatch):
+    path, _ = raw_dataset
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data" / "raw").mkdir(parents=True)
+    path.rename(tmp_path / "data" / "raw" / "averaged_dataset.parquet")
+    clean = tmp_path / "data" / "clean"
+
+    outputs = {}
+    for flags in ([], ["--stream", "--batch-rows", "50"]):
+        monkeypatch.setattr(sys, 'argv', ["clean_bi", "--crop", "carrots", "--target", "protein",
+                                          "--force", *flags])
+        assert clean_bi.main() == 0
+        outputs[bool(flags)] = {
+            name: pd.read_parquet(clean / name)
+            for name in ("carrots__X.parquet", "carrots__y__protein.parquet")
+        }
+
+    for name, frame in outputs[False].items():
+        pd.testing.assert_frame_equal(outputs[True][name], frame)
@@ -0,0 +1,128 @@
+import io
+
+import numpy as np
+import pytest
+
+from src.api.wire import (
+    ARROW_FILE,
+    ARROW_STREAM,
+    NPY,
+    OCTET_STREAM,
+    UnsupportedMediaTypeError,
+    decode_arrow,
+    decode_npy,
+    decode_raw,
+    decode_spectra,
+)
+
+
+def npy_bytes(array, **kwargs):
+    buffer = io.BytesIO()
+    np.save(buffer, array, **kwargs)
+    return buffer.getvalue()
+
+
+def arrow_bytes(table, file_format=False):
+    import pyarrow as pa
+
+    sink = pa.BufferOutputStream()
+    writer = pa.ipc.new_file if file_format else pa.ipc.new_stream
+    with writer(sink, table.schema) as w:
+        w.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+@pytest.fixture
+def batch():
+    return np.random.default_rng(0).normal(size=(3, 7))
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32, np.int16])
+def test_npy_round_trip(batch, dtype):
+    X = (batch * 100).astype(dtype)
+    decoded = decode_npy(npy_bytes(X))
+    assert decoded.dtype == dtype
+    np.testing.assert_array_equal(decoded, X)
+
+
+def test_npy_one_spectrum_and_fortran_order(batch):
+    np.testing.assert_array_equal(decode_npy(npy_bytes(batch[0])), batch[:1])
+    np.testing.assert_array_equal(decode_npy(npy_bytes(np.asfortranarray(batch))), batch)
+
+
+def test_npy_big_endian(batch):
+    np.testing.assert_array_equal(decode_npy(npy_bytes(batch.astype('>f8'))), batch)
+
+
+@pytest.mark.parametrize("body", [
+    b"",
+    b"not a numpy file",
+    npy_bytes(np.zeros((2, 3)))[:-8],
+    npy_bytes(np.zeros((2, 3, 4))),
+    npy_bytes(np.array(['a', 'b'])),
+    npy_bytes(np.array([1.0, None], dtype=object), allow_pickle=True),
+])
+def test_npy_rejects_malformed(body):
+    with pytest.raises(ValueError):
+        decode_npy(body)
+
+
+@pytest.mark.parametrize("file_format", [False, True])
+def test_arrow_fixed_size_list_round_trip(batch, file_format):
+    pa = pytest.importorskip("pyarrow")
+
+    values = pa.array(batch.reshape(-1))
+    table = pa.table({'spectrum': pa.FixedSizeListArray.from_arrays(values, batch.shape[1])})
+    decoded = decode_arrow(arrow_bytes(table, file_format), file_format=file_format)
+    np.testing.assert_array_equal(decoded, batch)
+
+
+def test_arrow_column_per_wavelength_round_trip(batch):
+    pa = pytest.importorskip("pyarrow")
+
+    table = pa.table({f"{1000 + 2 * i}": batch[:, i] for i in range(batch.shape[1])})
+    np.testing.assert_array_equal(decode_arrow(arrow_bytes(table)), batch)
+
+
+@pytest.mark.parametrize("file_format", [False, True])
+def test_arrow_rejects_malformed(batch, file_format):
+    pa = pytest.importorskip("pyarrow")
+
+    table = pa.table({'a': batch[:, 0]})
+    with pytest.raises(ValueError):
+        decode_arrow(b"not arrow", file_format=file_format)
+    with pytest.raises(ValueError):
+        decode_arrow(arrow_bytes(table, file_format)[:-16], file_format=file_format)
+    # A stream body is not a file body
+    with pytest.raises(ValueError):
+        decode_arrow(arrow_bytes(table, file_format=False), file_format=True)
+
+
+def test_raw_round_trip_and_length_check(batch):
+    X = batch.astype(np.float32)
+    np.testing.assert_array_equal(decode_raw(X.tobytes(), n_wavelengths=7), X)
+    np.testing.assert_array_equal(decode_raw(batch.tobytes(), "float64"), batch.reshape(1, -1))
+    with pytest.raises(ValueError):
+        decode_raw(X.tobytes(), n_wavelengths=5)
+    with pytest.raises(ValueError):
+        decode_raw(X.tobytes()[:-1])
+    with pytest.raises(ValueError):
+        decode_raw(X.tobytes(), "float16")
+
+
+def test_decode_spectra_dispatch(batch):
+    np.testing.assert_array_equal(decode_spectra(npy_bytes(batch), NPY), batch)
+    np.testing.assert_array_equal(
+        decode_spectra(batch.tobytes(), f"{OCTET_STREAM}; charset=binary", 7, "float64"), batch
+    )
+    with pytest.raises(UnsupportedMediaTypeError):
+        decode_spectra(b"1,2,3", "text/csv")
+
+
+def test_decode_spectra_arrow(batch):
+    pa = pytest.importorskip("pyarrow")
+
+    table = pa.table({f"w{i}": batch[:, i] for i in range(batch.shape[1])})
+    for content_type, file_format in ((ARROW_STREAM, False), (ARROW_FILE, True)):
+        decoded = decode_spectra(arrow_bytes(table, file_format), content_type)
+        np.testing.assert_array_equal(decoded, batch)